@@ -0,0 +1,13 @@
+"""
+Benchmarks of the stages of the Tonal Pitch Step Distance (TPSD) algorithm as
+presented in:
+
+De Haas, W.B., Veltkamp, R.C., Wiering, F.: Tonal pitch step distance: a
+similarity measure for chord progressions.
+In: ISMIR. pp. 51–56 (2008)
+
+Author: Andrea Poltronieri (University of Bologna) and Jacopo de Berardinis
+(King's College of London)
+Copyright: 2022 Andrea Poltronieri and Jacopo de Berardinis
+License: MIT license
+"""
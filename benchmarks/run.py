@@ -0,0 +1,323 @@
+"""
+This script times each stage of the Tonal Pitch Step Distance (TPSD)
+algorithm over a synthetic corpus, writes the timings as JSON and compares
+them with a stored baseline. The algorithm is presented in:
+
+De Haas, W.B., Veltkamp, R.C., Wiering, F.: Tonal pitch step distance: a
+similarity measure for chord progressions.
+In: ISMIR. pp. 51–56 (2008)
+
+Usage (from the root of the repository):
+
+    python -m benchmarks.run --output results.json
+    python -m benchmarks.run --baseline benchmarks/baseline.json
+
+Author: Andrea Poltronieri (University of Bologna) and Jacopo de Berardinis
+(King's College of London)
+Copyright: 2022 Andrea Poltronieri and Jacopo de Berardinis
+License: MIT license
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from typing import Callable, Optional
+
+import numpy as np
+
+from benchmarks.synthetic import generate_corpus, write_harte_files
+from tpsd.cache import DEFAULT_CACHE, TpsCache
+from tpsd.ingest import IngestReport, ingest
+from tpsd.tps import Tps
+from tpsd.tps_comparison import TpsComparison
+from tpsd.tpsd_comparison import TpsdComparison
+from tpsd.tpsd_core import Tpsd
+from tpsd.util import open_harte, parse_mgu
+
+TESTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..',
+                          'tests')
+DATASET_PATH = os.path.join(TESTS_PATH, 'dump_dataset')
+ANNOTATIONS_PATH = os.path.join(TESTS_PATH, 'test_data')
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             'baseline.json')
+
+# a benchmark gets the corpus, the options and a temporary directory, and
+# returns the function to be timed and the number of operations it performs
+Benchmark = Callable[[list, argparse.Namespace, str], tuple[Callable, int]]
+BENCHMARKS = {}
+
+
+def benchmark(name: str) -> Callable[[Benchmark], Benchmark]:
+    """
+    Registers a benchmark.
+    :param name: the name of the benchmark in the results
+    :return: the decorator registering the benchmark.
+    """
+    def register(function: Benchmark) -> Benchmark:
+        BENCHMARKS[name] = function
+        return function
+    return register
+
+
+def chord_items(corpus: list, limit: int) -> list[tuple[str, str]]:
+    """
+    Lists the (chord, key) pairs of the corpus, in order of appearance.
+    """
+    items = []
+    for chords, keys, _ in corpus:
+        keys = [keys] * len(chords) if isinstance(keys, str) else keys
+        items.extend(zip(chords, keys))
+    return items[:limit]
+
+
+@benchmark('tps')
+def bench_tps(corpus, options, _):
+    """
+    Parses the chords and encodes their TPS levels.
+    """
+    items = chord_items(corpus, options.chord_items)
+    return lambda: [Tps(chord, key) for chord, key in items], len(items)
+
+
+@benchmark('tps_distance')
+def bench_tps_distance(corpus, options, _):
+    """
+    Computes the TPS distance of the chords from their keys without caching.
+    """
+    items = chord_items(corpus, options.chord_items)
+    return lambda: [TpsComparison(chord, key, key, key).distance()
+                    for chord, key in items], len(items)
+
+
+@benchmark('sequence_area')
+def bench_sequence_area(corpus, _, __):
+    """
+    Computes the step function of each song, starting from an empty cache.
+    """
+    def run():
+        cache = TpsCache()
+        return [Tpsd(chords, keys, timings, cache).sequence_area()
+                for chords, keys, timings in corpus]
+    return run, len(corpus)
+
+
+@benchmark('minimum_area')
+def bench_minimum_area(corpus, options, _):
+    """
+    Compares pairs of songs, with the TPS distances already cached.
+    """
+    pairs = [(corpus[index % len(corpus)], corpus[(index + 1) % len(corpus)])
+             for index in range(options.pairs)]
+    cache = TpsCache()
+
+    def run():
+        return [TpsdComparison(song_a[0], song_b[0], song_a[1], song_b[1],
+                               song_a[2], song_b[2], cache).minimum_area()
+                for song_a, song_b in pairs]
+    run()
+    return run, len(pairs)
+
+
+@benchmark('open_harte')
+def bench_open_harte(corpus, _, directory):
+    """
+    Reads the annotation files of the corpus.
+    """
+    single_key = [(chords, keys if isinstance(keys, str) else keys[0], timings)
+                  for chords, keys, timings in corpus]
+    paths = write_harte_files(single_key, directory)
+    return lambda: [open_harte(path) for path in paths], len(paths)
+
+
+@benchmark('parse_mgu')
+def bench_parse_mgu(_, options, __):
+    """
+    Parses the Band-in-a-Box files of the test dataset.
+    """
+    paths = sorted(glob.glob(os.path.join(DATASET_PATH, '*.MG*')))
+    paths = paths * options.copies
+    return lambda: [parse_mgu(path) for path in paths], len(paths)
+
+
+@benchmark('ingest')
+def bench_ingest(_, options, directory):
+    """
+    Ingests copies of the annotated songs of the test dataset, end to end,
+    starting from an empty cache.
+    """
+    dataset = os.path.join(directory, 'dataset')
+    os.makedirs(dataset)
+    annotations = []
+    for copy in range(options.copies):
+        for path in sorted(glob.glob(os.path.join(ANNOTATIONS_PATH,
+                                                  '*.MGU.txt'))):
+            name = os.path.basename(path)
+            biab = os.path.join(DATASET_PATH, name[:-len('.txt')])
+            if not os.path.exists(biab):
+                continue
+            copy_name = f'{copy:04d}_{name}'
+            shutil.copy(path, os.path.join(dataset, copy_name))
+            shutil.copy(biab, os.path.join(dataset, copy_name[:-len('.txt')]))
+            annotations.append(os.path.join(dataset, copy_name))
+
+    def run():
+        DEFAULT_CACHE.clear()
+        report = IngestReport()
+        songs = list(ingest(annotations, dataset, workers=1, report=report))
+        if report.errors:
+            raise RuntimeError(f'Ingestion failed: {report.summary()}')
+        return songs
+    return run, len(annotations)
+
+
+def time_function(function: Callable, repeat: int) -> list[float]:
+    """
+    Times a function several times.
+    :param function: the function to be timed
+    :param repeat: the number of runs
+    :return: the duration (in seconds) of each run.
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def run_benchmarks(options: argparse.Namespace) -> dict:
+    """
+    Runs the selected benchmarks over a synthetic corpus.
+    :param options: the options of the benchmarks
+    :return: a dictionary containing the parameters, the environment and the
+    timings of each benchmark.
+    """
+    corpus = generate_corpus(options.songs, options.chords, options.seed,
+                             modulation=options.modulation)
+    names = options.only if options.only else list(BENCHMARKS)
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for name in names:
+            workspace = os.path.join(directory, name)
+            os.makedirs(workspace)
+            function, operations = BENCHMARKS[name](corpus, options,
+                                                    workspace)
+            timings = time_function(function, options.repeat)
+            results[name] = {'best': min(timings),
+                             'mean': float(np.mean(timings)),
+                             'operations': operations,
+                             'per_operation': min(timings) / operations}
+    return {'parameters': parameters(options),
+            'environment': {'python': platform.python_version(),
+                            'numpy': np.__version__,
+                            'platform': platform.platform(),
+                            'machine': platform.machine()},
+            'results': results}
+
+
+def parameters(options: argparse.Namespace) -> dict:
+    """
+    Gets the parameters determining the workload of the benchmarks.
+    """
+    return {name: getattr(options, name) for name in
+            ('songs', 'chords', 'seed', 'modulation', 'chord_items', 'pairs',
+             'copies')}
+
+
+def compare(report: dict, baseline: dict,
+            tolerance: float = 0.25) -> dict[str, dict]:
+    """
+    Compares the timings of the benchmarks with a baseline, by the time per
+    operation of the best run.
+    :param report: the report of the current run
+    :param baseline: the report of the baseline run
+    :param tolerance: the relative slowdown above which a benchmark is
+    considered a regression
+    :return: a dictionary containing, for each benchmark in both reports, the
+    baseline and current time per operation, their ratio and whether it is a
+    regression.
+    """
+    comparison = {}
+    for name, result in report['results'].items():
+        reference = baseline['results'].get(name)
+        if reference is None:
+            continue
+        ratio = result['per_operation'] / reference['per_operation']
+        comparison[name] = {'baseline': reference['per_operation'],
+                            'current': result['per_operation'],
+                            'ratio': ratio,
+                            'regression': ratio > 1 + tolerance}
+    return comparison
+
+
+def parse_arguments(arguments: Optional[list[str]] = None
+                    ) -> argparse.Namespace:
+    """
+    Parses the command line arguments.
+    """
+    parser = argparse.ArgumentParser(
+        description=__doc__.split('\n\n', maxsplit=1)[0])
+    parser.add_argument('--songs', type=int, default=200)
+    parser.add_argument('--chords', type=int, default=60,
+                        help='mean number of chords of each song')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--modulation', type=float, default=0.0,
+                        help='probability of a key change at each chord')
+    parser.add_argument('--chord-items', type=int, default=500,
+                        help='number of chords parsed by the TPS benchmarks')
+    parser.add_argument('--pairs', type=int, default=200,
+                        help='number of pairs of songs compared')
+    parser.add_argument('--copies', type=int, default=50,
+                        help='copies of the test dataset to be ingested')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--only', nargs='+', choices=list(BENCHMARKS))
+    parser.add_argument('--output', help='path of the JSON report')
+    parser.add_argument('--baseline', default=None,
+                        help='path of the JSON report to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='relative slowdown reported as a regression')
+    parser.add_argument('--update-baseline', action='store_true',
+                        help=f'overwrite {BASELINE_PATH} with the results')
+    return parser.parse_args(arguments)
+
+
+def main(arguments: Optional[list[str]] = None) -> int:
+    """
+    Runs the benchmarks, writes the report and compares it with the baseline.
+    :return: the exit status, 1 if a regression was found.
+    """
+    options = parse_arguments(arguments)
+    report = run_benchmarks(options)
+    for name, result in report['results'].items():
+        print(f'{name:<16}{result["best"]:>10.4f}s  '
+              f'{result["per_operation"] * 1e6:>12.1f}us/op')
+
+    status = 0
+    if options.baseline is not None:
+        with open(options.baseline, 'r', encoding='utf-8') as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline['parameters'] != report['parameters']:
+            print('The baseline was run with different parameters: '
+                  f'{baseline["parameters"]}', file=sys.stderr)
+        report['comparison'] = compare(report, baseline, options.tolerance)
+        for name, result in report['comparison'].items():
+            flag = 'REGRESSION' if result['regression'] else 'ok'
+            print(f'{name:<16}{result["ratio"]:>10.2f}x  {flag}')
+            status = 1 if result['regression'] else status
+
+    outputs = [options.output] if options.output else []
+    if options.update_baseline:
+        outputs.append(BASELINE_PATH)
+    for output in outputs:
+        with open(output, 'w', encoding='utf-8') as output_file:
+            json.dump(report, output_file, indent=2)
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
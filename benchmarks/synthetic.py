@@ -0,0 +1,122 @@
+"""
+This file contains a seeded generator of synthetic corpora of chord sequences,
+used to benchmark the Tonal Pitch Step Distance (TPSD) algorithm as presented
+in:
+
+De Haas, W.B., Veltkamp, R.C., Wiering, F.: Tonal pitch step distance: a
+similarity measure for chord progressions.
+In: ISMIR. pp. 51–56 (2008)
+
+Author: Andrea Poltronieri (University of Bologna) and Jacopo de Berardinis
+(King's College of London)
+Copyright: 2022 Andrea Poltronieri and Jacopo de Berardinis
+License: MIT license
+"""
+import os
+import random
+from typing import Optional
+
+from tpsd.corpus import Song
+from tpsd.tps import KEYS
+
+NOTES = ['C', 'C#', 'D', 'Eb', 'E', 'F', 'F#', 'G', 'Ab', 'A', 'Bb', 'B']
+# qualities of the chords built on each grade of the major and minor scales
+GRADE_QUALITIES = {
+    'maj': [['maj', 'maj7', '6'], ['min', 'min7'], ['min', 'min7'],
+            ['maj', 'maj7'], ['maj', '7', '9', 'sus4'], ['min', 'min7'],
+            ['dim', 'hdim7']],
+    'min': [['min', 'min7', 'min6'], ['dim', 'hdim7'], ['maj', 'maj7'],
+            ['min', 'min7'], ['7', 'min7', '7(b9)'], ['maj', 'maj7'],
+            ['7', 'dim7']],
+}
+CHROMATIC_QUALITIES = ['maj', 'min', '7', 'dim7', 'aug', 'min(9)']
+INVERSIONS = ['3', '5', 'b7']
+DURATIONS = [1, 2, 2, 4, 4, 4, 8]
+
+
+def scale_grades(tonic: int, mode: str) -> list[int]:
+    """
+    Gets the pitch classes of the diatonic scale of a key.
+    :param tonic: the pitch class of the tonic
+    :param mode: the mode of the key ("maj" or "min")
+    :return: the pitch class of each grade of the scale.
+    """
+    grades = [tonic]
+    for step in KEYS[mode][:-1]:
+        grades.append((grades[-1] + step) % 12)
+    return grades
+
+
+def generate_song(generator: random.Random, chords: int,
+                  chromatic: float = 0.1,
+                  modulation: float = 0.0) -> Song:
+    """
+    Generates a chord sequence made mostly of the diatonic chords of a key.
+    :param generator: the random generator
+    :param chords: the number of chords of the song
+    :param chromatic: the probability of each chord being chromatic
+    :param modulation: the probability of the key changing at each chord, in
+    which case a key is given for each chord
+    :return: a song, made of the chord sequence, the key(s) and the duration
+    of each chord.
+    """
+    tonic, mode = generator.randrange(12), generator.choice(['maj', 'min'])
+    sequence, keys = [], []
+    for _ in range(chords):
+        if generator.random() < modulation:
+            tonic = (tonic + generator.choice([5, 7, 9])) % 12
+        if generator.random() < chromatic:
+            root = generator.randrange(12)
+            quality = generator.choice(CHROMATIC_QUALITIES)
+        else:
+            grade = generator.randrange(7)
+            root = scale_grades(tonic, mode)[grade]
+            quality = generator.choice(GRADE_QUALITIES[mode][grade])
+        chord = f'{NOTES[root]}:{quality}'
+        if generator.random() < 0.05:
+            chord += f'/{generator.choice(INVERSIONS)}'
+        sequence.append(chord)
+        keys.append(f'{NOTES[tonic]}:{mode}')
+    durations = [generator.choice(DURATIONS) for _ in range(chords)]
+    return sequence, keys if modulation else keys[0], durations
+
+
+def generate_corpus(songs: int, chords: int, seed: int = 0,
+                    length_spread: float = 0.5,
+                    modulation: float = 0.0) -> list[Song]:
+    """
+    Generates a corpus of synthetic songs, the same for the same arguments.
+    :param songs: the number of songs
+    :param chords: the mean number of chords of each song
+    :param seed: the seed of the random generator
+    :param length_spread: the maximum relative deviation of the number of
+    chords of each song from the mean
+    :param modulation: the probability of the key changing at each chord
+    :return: a list of songs.
+    """
+    generator = random.Random(seed)
+    spread = int(chords * length_spread)
+    return [generate_song(generator, max(1, chords + generator.randint(
+        -spread, spread)), modulation=modulation) for _ in range(songs)]
+
+
+def write_harte_files(corpus: list[Song], directory: str,
+                      prefix: Optional[str] = 'song') -> list[str]:
+    """
+    Writes the songs of a corpus as annotation files, readable by open_harte:
+    the key on the first line followed by a chord per line. Half-diminished
+    chords are written as "hdim", which open_harte reads as "hdim7".
+    :param corpus: the songs, each one having a single key
+    :param directory: the directory in which the files are written
+    :param prefix: the prefix of the names of the files
+    :return: the paths of the files.
+    """
+    paths = []
+    for number, (chords, key, _) in enumerate(corpus):
+        path = os.path.join(directory, f'{prefix}_{number:05d}.txt')
+        with open(path, 'w', encoding='utf-8') as harte_file:
+            harte_file.write('\n'.join(
+                [key] + [chord.replace('hdim7', 'hdim') for chord in chords]) +
+                '\n')
+        paths.append(path)
+    return paths
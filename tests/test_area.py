@@ -0,0 +1,135 @@
+"""
+Test for the vectorised computation of the areas between step functions.
+"""
+import math
+import unittest
+
+import numpy as np
+
+from tpsd import area
+from tpsd.instrumentation import INSTRUMENTATION
+
+
+class TestArea(unittest.TestCase):
+    """
+    Tests the functions computing the areas between two step functions.
+    """
+
+    shortest = np.array([1.0, 3.5, 3.5, 0.0])
+    longest = np.array([2.0, 2.0, 13.0, 0.5, 3.5, 3.5, 0.5, 4.0])
+
+    def test_shift_areas(self):
+        """
+        Tests the area between the shortest sequence and each shift.
+        """
+        expected = [sum(abs(value - self.longest[offset + beat])
+                        for beat, value in enumerate(self.shortest))
+                    for offset in range(5)]
+        self.assertEqual(area.shift_areas(self.shortest, self.longest).tolist(),
+                         expected, "Areas of the shifts do not correspond")
+
+    def test_minimum_area(self):
+        """
+        Tests the minimum area and the offset at which it is reached.
+        """
+        self.assertEqual(area.minimum_area(self.shortest, self.longest),
+                         (1.0, 3), "Minimum area should be 1.0 at beat 3")
+
+    def test_fft_shift_areas(self):
+        """
+        Tests that the FFT method gives exactly the same areas.
+        """
+        generator = np.random.default_rng(0)
+        shortest = generator.integers(0, 27, 300) / 2
+        longest = generator.integers(0, 27, 1000) / 2
+        self.assertTrue(np.array_equal(
+            area.fft_shift_areas(shortest, longest),
+            area.shift_areas(shortest, longest)),
+            "FFT areas should be equal to the sliding ones")
+        self.assertEqual(area.minimum_area(shortest, longest, 'fft'),
+                         area.minimum_area(shortest, longest, 'sliding'),
+                         "FFT minimum area should be equal to the sliding one")
+
+    def test_runs_shift_areas(self):
+        """
+        Tests that the run-length method gives exactly the same areas.
+        """
+        generator = np.random.default_rng(2)
+        shortest = np.repeat(generator.integers(0, 27, 60) / 2,
+                             generator.integers(1, 5, 60))
+        longest = np.repeat(generator.integers(0, 27, 300) / 2,
+                            generator.integers(1, 5, 300))
+        self.assertTrue(np.array_equal(
+            area.runs_shift_areas(shortest, longest),
+            area.shift_areas(shortest, longest)),
+            "Run-length areas should be equal to the sliding ones")
+
+    def test_bounded_minimum_area(self):
+        """
+        Tests the minimum area when abandoning the shifts above a bound.
+        """
+        generator = np.random.default_rng(1)
+        shortest = generator.integers(0, 27, 200) / 2
+        longest = generator.integers(0, 27, 700) / 2
+        minimum = area.minimum_area(shortest, longest, 'sliding')
+        self.assertEqual(area.bounded_minimum_area(shortest, longest,
+                                                   minimum[0]), minimum,
+                         "Minimum area within the bound should be found")
+        self.assertEqual(area.bounded_minimum_area(shortest, longest,
+                                                   minimum[0] - 0.5),
+                         (math.inf, -1),
+                         "Minimum area above the bound should be discarded")
+
+    def test_bounded_engine_selection(self):
+        """
+        Tests that a bound does not prevent the automatic choice of the
+        run-length engine on long profiles.
+        """
+        generator = np.random.default_rng(2)
+        shortest = np.repeat(generator.integers(0, 27, 150) / 2, 4)
+        longest = np.repeat(generator.integers(0, 27, 300) / 2, 4)
+        self.assertEqual(area.select_method(shortest, longest), 'runs')
+        minimum = area.minimum_area(shortest, longest, 'sliding')
+        INSTRUMENTATION.enable()
+        try:
+            self.assertEqual(area.minimum_area(shortest, longest, 'auto',
+                                               minimum[0]), minimum)
+            self.assertEqual(area.minimum_area(shortest, longest, 'auto',
+                                               minimum[0] - 0.5),
+                             (math.inf, -1))
+            stages = INSTRUMENTATION.snapshot()['stages']
+        finally:
+            INSTRUMENTATION.disable()
+            INSTRUMENTATION.reset()
+        self.assertEqual(stages['shift_areas_runs']['calls'], 2)
+        self.assertNotIn('shift_areas_sliding', stages)
+
+    def test_coarse_to_fine_minimum_area(self):
+        """
+        Tests the coarse-to-fine minimum area and its error bound.
+        """
+        generator = np.random.default_rng(3)
+        shortest = np.repeat(generator.integers(0, 27, 50) / 2,
+                             generator.integers(1, 5, 50))
+        longest = np.repeat(generator.integers(0, 27, 250) / 2,
+                            generator.integers(1, 5, 250))
+        exact = area.shift_areas(shortest, longest)
+        for resolution in (1, 2, 4, 8):
+            self.assertTrue(np.all(area.cell_lower_bounds(
+                shortest, longest, resolution) <= exact),
+                "Cell bounds should not exceed the exact areas")
+            self.assertEqual(
+                area.coarse_to_fine_minimum_area(shortest, longest,
+                                                 resolution),
+                area.minimum_area(shortest, longest, 'sliding') + (0.0,),
+                "Refining all the candidates should give the exact result")
+            minimum, offset, error = area.coarse_to_fine_minimum_area(
+                shortest, longest, resolution, candidates=2)
+            self.assertEqual(minimum, exact[offset],
+                             "Area should be the one of its offset")
+            self.assertLessEqual(minimum - error, exact.min(),
+                                 "Error should bound the exact result")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+"""
+Test for the synthetic corpus generator and the benchmark runner.
+"""
+import json
+import os
+import tempfile
+import unittest
+
+from benchmarks import run
+from benchmarks.synthetic import generate_corpus, write_harte_files
+from tpsd.tpsd_core import Tpsd
+from tpsd.util import open_harte
+
+
+class TestBenchmarks(unittest.TestCase):
+    """
+    Tests the generator of synthetic songs and the benchmark reports.
+    """
+
+    def test_generate_corpus(self):
+        """
+        Tests that the corpus is reproducible and made of valid songs.
+        """
+        corpus = generate_corpus(20, 30, seed=3, modulation=0.1)
+        self.assertEqual(corpus, generate_corpus(20, 30, seed=3,
+                                                 modulation=0.1))
+        self.assertNotEqual(corpus, generate_corpus(20, 30, seed=4,
+                                                    modulation=0.1))
+        for chords, keys, timings in corpus:
+            self.assertTrue(15 <= len(chords) <= 45)
+            self.assertEqual(len(Tpsd(chords, keys, timings).sequence_area()),
+                             sum(timings))
+
+    def test_write_harte_files(self):
+        """
+        Tests that the annotation files are read back by open_harte.
+        """
+        corpus = generate_corpus(5, 20, seed=1)
+        with tempfile.TemporaryDirectory() as directory:
+            for path, (chords, key, _) in zip(
+                    write_harte_files(corpus, directory), corpus):
+                self.assertEqual(open_harte(path), (chords, key))
+
+    def test_report(self):
+        """
+        Tests the report of a run and its comparison with itself.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'report.json')
+            arguments = ['--songs', '10', '--chords', '10', '--copies', '1',
+                         '--repeat', '1', '--only', 'sequence_area',
+                         'open_harte', 'ingest']
+            self.assertEqual(run.main(arguments + ['--output', output]), 0)
+            with open(output, 'r', encoding='utf-8') as report_file:
+                report = json.load(report_file)
+        self.assertEqual(list(report['results']),
+                         ['sequence_area', 'open_harte', 'ingest'])
+        self.assertEqual(report['results']['sequence_area']['operations'], 10)
+        comparison = run.compare(report, report)
+        self.assertFalse(any(result['regression'] for result in
+                             comparison.values()))
+        slower = json.loads(json.dumps(report))
+        slower['results']['ingest']['per_operation'] *= 2
+        self.assertTrue(run.compare(slower, report)['ingest']['regression'])
+
+
+if __name__ == '__main__':
+    unittest.main()
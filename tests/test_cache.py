@@ -0,0 +1,74 @@
+"""
+Test for the cache of the TPS distances.
+"""
+import unittest
+
+from tpsd.cache import TpsCache
+from tpsd.tps_comparison import TpsComparison
+
+
+class TestTpsCache(unittest.TestCase):
+    """
+    Tests the TpsCache class and some of its methods.
+    """
+
+    def test_distance(self):
+        """
+        Tests that cached distances correspond to the TPS distances.
+        """
+        cache = TpsCache()
+        for chord in ['G:7', 'D:min7', 'C:maj7', 'G:7']:
+            expected = TpsComparison(chord, 'C:maj', 'C:maj', 'C:maj')
+            self.assertEqual(cache.distance(chord, 'C:maj'),
+                             expected.distance(),
+                             f"Cached distance of {chord} in C:maj is wrong")
+        self.assertEqual(cache.stats()['hits'], 1, "G:7 should be a hit")
+        self.assertEqual(cache.stats()['misses'], 3,
+                         "Three distinct chords should be misses")
+
+    def test_normalisation(self):
+        """
+        Tests that equivalent labels share the same entry.
+        """
+        cache = TpsCache()
+        cache.distance('A:min', 'C')
+        cache.distance(' A:min', 'C:maj')
+        self.assertEqual(len(cache), 1, "Labels should be normalised")
+
+    def test_eviction(self):
+        """
+        Tests that the least recently used entries are evicted.
+        """
+        cache = TpsCache(maxsize=2)
+        cache.distance('C', 'C:maj')
+        cache.distance('F', 'C:maj')
+        cache.distance('C', 'C:maj')
+        cache.distance('G', 'C:maj')
+        self.assertEqual(cache.stats()['evictions'], 1,
+                         "One entry should have been evicted")
+        cache.distance('C', 'C:maj')
+        self.assertEqual(cache.stats()['hits'], 2,
+                         "The most recently used entry should be kept")
+
+    def test_parsed_labels(self):
+        """
+        Tests that each label is parsed once and that clear() also removes
+        the parsed labels.
+        """
+        cache = TpsCache(maxsize=2)
+        for _ in range(3):
+            cache.distance('G:7', 'C')
+        stats = cache.stats()
+        self.assertEqual((stats['labels'], stats['parses']), (1, 1),
+                         "The label should be parsed once")
+        cache.distance('A:7', 'D:maj')
+        cache.distance('C', 'C:maj')
+        self.assertEqual(cache.stats()['label_evictions'], 1,
+                         "The parsed labels should be bounded by maxsize")
+        cache.clear()
+        self.assertEqual((len(cache), cache.stats()['labels']), (0, 0),
+                         "The cache should be empty after clear()")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+"""
+Test for the transposition-invariant encoding of the chords.
+"""
+import unittest
+
+from tpsd.cache import TpsCache
+from tpsd.canonical import canonical_chord, canonical_distance, \
+    transpose_mask
+from tpsd.corpus import TpsdCorpus
+from tpsd.tps import NOTE_MAP
+from tpsd.tps_comparison import TpsComparison
+
+
+class TestCanonical(unittest.TestCase):
+    """
+    Tests the canonical encoding of the chords and its use by the caches.
+    """
+
+    def test_transpose_mask(self):
+        """
+        Tests the transposition of the masks of pitch classes.
+        """
+        self.assertEqual(transpose_mask(0b100010010001, 1), 0b000100100011)
+        self.assertEqual(transpose_mask(0b000100100011, -1), 0b100010010001)
+
+    def test_canonical_distance(self):
+        """
+        Tests that the canonical distance is the TPS distance in all keys.
+        """
+        for names in NOTE_MAP:
+            for key in [f'{names[0]}:maj', f'{names[0]}:min']:
+                for chord in ['C:maj', 'D:min7', 'Eb:dim7', 'F#:7/3', 'G:7',
+                              'A:hdim7', 'Bb:sus4', 'B:maj(9)']:
+                    self.assertEqual(
+                        canonical_distance(canonical_chord(chord, key)),
+                        TpsComparison(chord, key, key, key).distance(),
+                        f"Distance of {chord} in {key} is wrong")
+
+    def test_transposition(self):
+        """
+        Tests that transposed chords share the same cache entry.
+        """
+        self.assertEqual(canonical_chord('G:7', 'C:maj'),
+                         canonical_chord('A:7', 'D:maj'))
+        cache = TpsCache()
+        cache.distance('G:7', 'C:maj')
+        cache.distance('A:7', 'D')
+        self.assertEqual(len(cache), 1, "Transposed chords should be shared")
+        self.assertEqual(cache.stats()['hits'], 1)
+
+    def test_corpus(self):
+        """
+        Tests that the transposed versions of a song share the same profile.
+        """
+        corpus = TpsdCorpus([(['C:maj', 'A:min', 'G:7'], 'C:maj', [4, 4, 4]),
+                             (['D:maj', 'B:min', 'A:7'], 'D:maj', [4, 4, 4]),
+                             (['D:maj', 'B:min', 'A:7'], 'D:maj', [4, 4, 2])])
+        self.assertIs(corpus.profiles[0], corpus.profiles[1])
+        self.assertIsNot(corpus.profiles[0], corpus.profiles[2])
+
+
+if __name__ == '__main__':
+    unittest.main()
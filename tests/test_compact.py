@@ -0,0 +1,101 @@
+"""
+Test for the compact representation of the songs.
+"""
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from tpsd import area
+from tpsd.compact import CompactSong, LabelVocabulary, compact_minimum_area, \
+    integer_shift_areas
+from tpsd.tpsd_comparison import TpsdComparison
+from tpsd.tpsd_core import Tpsd
+
+
+class TestCompactSong(unittest.TestCase):
+    """
+    Tests the CompactSong class and its use by Tpsd and TpsdComparison.
+    """
+    SONG_A = (['C:maj', 'A:min', 'D:min7', 'G:7', 'C:maj', 'E:7'],
+              ['C:maj'] * 4 + ['A:min'] * 2, [4, 4, 2, 2, 4, 4])
+    SONG_B = (['F:maj', 'G:7', 'C:maj'], 'C:maj', [2, 2, 4])
+
+    def test_encoding(self):
+        """
+        Tests that the song is decoded as it was encoded.
+        """
+        vocabulary = LabelVocabulary()
+        song = CompactSong(*self.SONG_A, vocabulary)
+        self.assertEqual(song.chord_sequence, self.SONG_A[0])
+        self.assertEqual(song.keys, self.SONG_A[1])
+        self.assertEqual(song.timing_information, self.SONG_A[2])
+        self.assertEqual(song.key_starts.tolist(), [0, 4],
+                         "Keys should be stored as run-length segments")
+        self.assertEqual(len(vocabulary), 5,
+                         "Keys and chords should share the vocabulary")
+        self.assertRaises(ValueError, CompactSong, ['C:maj'], 'C:maj', [4, 4])
+
+    def test_tpsd(self):
+        """
+        Tests that Tpsd computes the same profile from a compact song.
+        """
+        song = CompactSong(*self.SONG_A)
+        self.assertEqual(Tpsd(song).profile(), Tpsd(*self.SONG_A).profile())
+        self.assertEqual(song.doubled_distances().tolist(),
+                         [int(distance * 2) for distance in
+                          Tpsd(*self.SONG_A).distances()])
+
+    def test_lazy_decoding(self):
+        """
+        Tests that Tpsd keeps the compact song, decoding its labels only when
+        they are requested.
+        """
+        song = CompactSong(*self.SONG_A)
+        tpsd = Tpsd(song)
+        decoded = {name: mock.PropertyMock(side_effect=AssertionError(
+            f'{name} should not be decoded')) for name in (
+            'chord_sequence', 'keys', 'timing_information')}
+        with mock.patch.multiple(CompactSong, **decoded):
+            tpsd.profile()
+            TpsdComparison(song, CompactSong(*self.SONG_B)).minimum_area()
+        self.assertIs(tpsd.compact, song)
+        self.assertEqual(tpsd.chord_sequence, self.SONG_A[0])
+        tpsd.append('A:min', 'A:min', 4)
+        self.assertIsNone(tpsd.compact)
+        self.assertEqual(tpsd.profile(), Tpsd(
+            self.SONG_A[0] + ['A:min'], self.SONG_A[1] + ['A:min'],
+            self.SONG_A[2] + [4]).profile())
+
+    def test_integer_shift_areas(self):
+        """
+        Tests the integer areas, beat by beat and run by run.
+        """
+        generator = np.random.default_rng(4)
+        longest = generator.integers(0, 27, 500)
+        for durations in (generator.integers(1, 3, 40),
+                          generator.integers(4, 12, 40)):
+            values = generator.integers(0, 27, 40)
+            expected = area.shift_areas(np.repeat(values, durations), longest)
+            areas = integer_shift_areas(values, durations, longest)
+            self.assertEqual(areas.dtype, np.int64)
+            self.assertTrue(np.array_equal(areas, expected))
+
+    def test_comparison(self):
+        """
+        Tests that compact songs give the same minimum area.
+        """
+        song_a, song_b = CompactSong(*self.SONG_A), CompactSong(*self.SONG_B)
+        expected = TpsdComparison(
+            self.SONG_A[0], self.SONG_B[0], self.SONG_A[1], self.SONG_B[1],
+            self.SONG_A[2], self.SONG_B[2]).minimum_area(return_offset=True)
+        self.assertEqual(TpsdComparison(song_a, song_b).minimum_area(
+            return_offset=True), expected)
+        self.assertEqual(compact_minimum_area(song_a, song_b), expected)
+        for method in area.METHODS:
+            self.assertEqual(compact_minimum_area(song_b, song_a, method),
+                             expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+"""
+Test for the pairwise comparison of a corpus of chord sequences.
+"""
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from tpsd import corpus
+from tpsd.corpus import TpsdCorpus
+from tpsd.matrix_store import DistanceMatrixStore
+from tpsd.result_cache import ResultCache
+from tpsd.tpsd_comparison import TpsdComparison
+
+
+class TestTpsdCorpus(unittest.TestCase):
+    """
+    Tests the TpsdCorpus class and some of its methods.
+    """
+    songs = [
+        (['C:maj', 'A:min7', 'D:min7', 'G:7'], 'C:maj', [4, 4, 4, 4]),
+        (['E:7(b9)', 'A:min7', 'D:7', 'G:7', 'C:maj7'], 'C:maj',
+         [2, 2, 4, 4, 8]),
+        (['F:maj7', 'Bb:7'], 'F:maj', [8, 8]),
+        (['D:min7', 'G:7', 'C:maj7'], 'C:maj', [2, 2, 4]),
+        (['A:min', 'E:7'], 'A:min', [4, 4]),
+    ]
+
+    def expected_matrix(self):
+        """
+        Computes the matrix comparing each pair with TpsdComparison.
+        """
+        return np.array([[TpsdComparison(chords_a, chords_b, key_a, key_b,
+                                         timings_a, timings_b).minimum_area()
+                          if row != column else 0.0
+                          for column, (chords_b, key_b, timings_b) in
+                          enumerate(self.songs)]
+                         for row, (chords_a, key_a, timings_a) in
+                         enumerate(self.songs)])
+
+    def test_distance_matrix(self):
+        """
+        Tests the matrix computed in the current process, tile by tile.
+        """
+        songs = TpsdCorpus(self.songs)
+        progress = []
+        matrix = songs.distance_matrix(
+            tile_size=2, workers=1,
+            progress=lambda done, total: progress.append((done, total)))
+        self.assertTrue(np.array_equal(matrix, self.expected_matrix()),
+                        "Matrix does not correspond to TpsdComparison")
+        self.assertEqual(progress[-1], (6, 6), "All tiles should be reported")
+        self.assertIsNone(corpus._WORKER_PROFILES,  # pylint: disable=protected-access
+                          "The profiles should be released")
+
+    def test_distance_matrix_pool(self):
+        """
+        Tests the full matrix computed by a pool of processes.
+        """
+        with mock.patch.object(corpus, 'wait', wraps=corpus.wait) as waiting:
+            matrix = TpsdCorpus(self.songs).distance_matrix(
+                symmetric=False, tile_size=2, workers=2)
+        self.assertTrue(np.array_equal(matrix, self.expected_matrix()),
+                        "Matrix does not correspond to TpsdComparison")
+        self.assertLessEqual(max(len(call.args[0]) for call in
+                                 waiting.call_args_list), 4,
+                             "At most two tiles per worker should be pending")
+
+    def test_result_cache(self):
+        """
+        Tests that the identical profiles are compared once and that a repeated
+        run reads all the pairs from the cache, tile by tile.
+        """
+        songs = self.songs + [self.songs[0], self.songs[2]]
+        expected = self.expected_matrix()[np.ix_(*[[0, 1, 2, 3, 4, 0, 2]] * 2)]
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'results.sqlite')
+            with ResultCache(path) as cache:
+                store = TpsdCorpus(songs).fill_store(
+                    DistanceMatrixStore.create(
+                        os.path.join(directory, 'cold.npy'), len(songs), 3),
+                    workers=2, result_cache=cache)
+                self.assertTrue(np.allclose(store.read(), expected),
+                                "Matrix does not correspond to TpsdComparison")
+                self.assertEqual(cache.stats()['entries'], 10,
+                                 "Only the 5 distinct profiles are compared")
+            with ResultCache(path) as cache:
+                with mock.patch.object(corpus, '_compare_pairs') as compare:
+                    matrix = TpsdCorpus(songs).distance_matrix(
+                        tile_size=3, workers=1, result_cache=cache)
+                compare.assert_not_called()
+                self.assertTrue(np.array_equal(matrix, expected))
+                self.assertEqual(cache.stats()['hit_rate'], 1.0)
+                self.assertIsNone(corpus._WORKER_PROFILES,  # pylint: disable=protected-access
+                                  "Profiles should be released")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+"""
+Test for the persistent cache of parsed datasets.
+"""
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from tpsd import corpus_cache
+from tpsd.corpus_cache import CorpusCache
+from tpsd.tpsd_core import Tpsd
+from tpsd.util import get_corresponding_biab, open_harte, parse_mgu
+
+
+class TestCorpusCache(unittest.TestCase):
+    """
+    Tests the CorpusCache class and some of its methods.
+    """
+    # pylint: disable=line-too-long
+    TEST_DATASET = './dump_dataset'
+
+    test_files = ['./test_data/All The Things You Are_id_07051_allanah.MGU.txt',
+                  './test_data/All The Things You Are_id_00123_community.MGU.txt']
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache_path = os.path.join(self.directory, 'cache')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_build(self):
+        """
+        Tests that the cached songs correspond to the parsed files.
+        """
+        cache = CorpusCache.build(self.test_files, self.TEST_DATASET,
+                                  self.cache_path)
+        cache = CorpusCache(self.cache_path)
+        for index, test_file in enumerate(self.test_files):
+            chords, key = open_harte(test_file)
+            timings = parse_mgu(get_corresponding_biab(test_file,
+                                                       self.TEST_DATASET))
+            self.assertEqual(cache.song(index)[:3], (chords, key, timings),
+                             "Cached song does not correspond")
+            self.assertEqual(cache.profile(index).expand(),
+                             Tpsd(chords, key, timings).sequence_area(),
+                             "Cached profile does not correspond")
+
+    def test_invalidation(self):
+        """
+        Tests that only the modified files are parsed again.
+        """
+        annotation = os.path.join(self.directory, os.path.basename(
+            self.test_files[0]))
+        shutil.copy(self.test_files[0], annotation)
+        files = [annotation, self.test_files[1]]
+        CorpusCache.build(files, self.TEST_DATASET, self.cache_path)
+        with open(annotation, 'r', encoding='utf-8') as file:
+            lines = file.readlines()
+        lines[1] = 'E:min7\n'
+        with open(annotation, 'w', encoding='utf-8') as file:
+            file.writelines(lines)
+        with mock.patch.object(corpus_cache, 'open_harte',
+                               wraps=open_harte) as parse:
+            cache = CorpusCache.build(files, self.TEST_DATASET,
+                                      self.cache_path)
+        parse.assert_called_once_with(annotation)
+        self.assertEqual(cache.song(0)[0][0], 'E:min7',
+                         "Modified song should be parsed again")
+        self.assertEqual(cache.song(1)[:2], open_harte(self.test_files[1]),
+                         "Unchanged song should be reused")
+        self.assertEqual(len([name for name in os.listdir(self.cache_path)
+                              if name.endswith('.npy')]), 3,
+                         "Arrays of the previous build should be removed")
+
+    def test_interrupted_build(self):
+        """
+        Tests that an interrupted build leaves the previous cache intact.
+        """
+        CorpusCache.build(self.test_files, self.TEST_DATASET, self.cache_path)
+        expected = CorpusCache(self.cache_path).song(0)
+        replace_file = corpus_cache._replace_file  # pylint: disable=protected-access
+        calls = []
+
+        def interrupted(path, write):
+            calls.append(path)
+            if len(calls) > 2:
+                raise KeyboardInterrupt
+            replace_file(path, write)
+
+        with mock.patch.object(corpus_cache, '_replace_file',
+                               side_effect=interrupted):
+            with self.assertRaises(KeyboardInterrupt):
+                CorpusCache.build(self.test_files[::-1], self.TEST_DATASET,
+                                  self.cache_path)
+        self.assertEqual(CorpusCache(self.cache_path).song(0), expected,
+                         "Previous cache should be loaded unchanged")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+"""
+Test for the comparison of songs having repeated choruses.
+"""
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from tpsd import area
+from tpsd.form import FormedProfile, SongForm, formed_minimum_area
+from tpsd.ireal import iter_ireal_csv
+from tpsd.profile import TpsdProfile
+from tpsd.tpsd_comparison import TpsdComparison
+from tpsd.tpsd_core import Tpsd
+
+
+class TestFormedProfile(unittest.TestCase):
+    """
+    Tests the FormedProfile class and the comparison of formed profiles.
+    """
+    TEST_CORPUS = '../examples/all_the_things_versions.csv'
+
+    def random_profile(self, generator, chords):
+        """
+        Generates a random profile with the given number of chords.
+        """
+        return TpsdProfile((generator.integers(0, 9, chords) / 2).tolist(),
+                           generator.integers(1, 4, chords).tolist())
+
+    def test_cumulative(self):
+        """
+        Tests the cumulative sums computed without expanding the repetitions.
+        """
+        formed = FormedProfile(TpsdProfile([1.0, 3.0], [2, 1]), 3,
+                               TpsdProfile([0.5], [2]),
+                               TpsdProfile([7.0], [1]))
+        expanded = formed.expand().to_array()
+        self.assertEqual(len(formed), len(expanded))
+        positions = np.arange(len(expanded) + 1)
+        self.assertEqual(formed.cumulative(2.0, positions).tolist(),
+                         [0.0] + np.cumsum(np.abs(2.0 - expanded)).tolist())
+
+    def test_formed_minimum_area(self):
+        """
+        Tests that the minimum area is the same as the one of the expanded
+        profiles.
+        """
+        generator = np.random.default_rng(0)
+        for _ in range(200):
+            formed = [FormedProfile(
+                self.random_profile(generator, generator.integers(1, 6)),
+                int(generator.integers(0, 5)),
+                self.random_profile(generator, generator.integers(0, 4)),
+                self.random_profile(generator, generator.integers(0, 4)))
+                for _ in range(2)]
+            formed.append(FormedProfile.from_profile(
+                self.random_profile(generator, generator.integers(1, 8))))
+            for first, second in ((0, 1), (0, 2), (2, 1)):
+                profile_a, profile_b = formed[first], formed[second]
+                if not profile_a or not profile_b:
+                    continue
+                longest, shortest = (profile_a, profile_b) if len(
+                    profile_a) >= len(profile_b) else (profile_b, profile_a)
+                self.assertEqual(
+                    formed_minimum_area(longest, shortest),
+                    area.sequence_minimum_area(
+                        profile_a.expand().to_array(),
+                        profile_b.expand().to_array(), 'sliding'))
+
+    def test_tpsd_form(self):
+        """
+        Tests that the profile of a song having a form is the expanded one.
+        """
+        chords, key, timings = ['G:7', 'C:maj', 'A:min', 'F:maj', 'G:7'], \
+            'C:maj', [2, 4, 4, 4, 4]
+        tpsd = Tpsd(chords, key, timings, form=SongForm(1, 3, 2))
+        expanded = Tpsd(chords[:1] + chords[1:4] * 2 + chords[4:], key,
+                        timings[:1] + timings[1:4] * 2 + timings[4:])
+        self.assertEqual(tpsd.profile(), expanded.profile())
+        self.assertEqual(tpsd.formed_profile().expand(), expanded.profile())
+
+    def test_comparison_form(self):
+        """
+        Tests the comparison of repeated iReal songs with the expanded one,
+        which is not built when the repetitions are not expanded.
+        """
+        song_a, _, song_b = list(iter_ireal_csv(self.TEST_CORPUS))[:3]
+        with mock.patch.object(Tpsd, 'profile', side_effect=AssertionError(
+                'the expanded profile should not be built')):
+            comparison = TpsdComparison(
+                song_a.chords, song_b.chords, song_a.key, song_b.key,
+                song_a.durations, song_b.durations, form_a=song_a.form(),
+                form_b=song_b.form())
+            formed = comparison.minimum_area(return_offset=True)
+        self.assertEqual(len(comparison.profile_a),
+                         sum(song_a.durations) * song_a.repeats)
+        self.assertEqual(formed, comparison.minimum_area(return_offset=True,
+                                                         method='sliding'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+"""
+Test for the imports of the numeric core, without plotting libraries.
+"""
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+# modules of the numeric core, used by the batch workers
+CORE_MODULES = ['tpsd', 'tpsd.tpsd_comparison', 'tpsd.corpus', 'tpsd.search',
+                'tpsd.index', 'tpsd.online', 'tpsd.compact']
+# libraries loaded on first use by the plotting and printing methods
+LAZY_MODULES = ['matplotlib', 'tabulate', 'termcolor']
+# root of the repository, from which the package is imported
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCRIPT = f'''
+import json, sys
+for module in {CORE_MODULES!r}:
+    __import__(module)
+print(json.dumps([module for module in {LAZY_MODULES!r}
+                  if module in sys.modules]))
+'''
+
+
+class TestImports(unittest.TestCase):
+    """
+    Tests that the numeric core is imported without plotting libraries.
+    """
+
+    def test_lazy_imports(self):
+        """
+        Tests that importing the numeric core in a new process does not load
+        the plotting and printing libraries.
+        """
+        result = subprocess.run([sys.executable, '-c', SCRIPT], cwd=ROOT,
+                                capture_output=True, text=True, check=True)
+        loaded = json.loads(result.stdout.splitlines()[-1])
+        self.assertEqual(loaded, [],
+                         "Plotting libraries should be loaded on first use")
+
+
+if __name__ == '__main__':
+    unittest.main()
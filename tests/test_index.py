@@ -0,0 +1,155 @@
+"""
+Test for the nearest-neighbour search index over TPSD profiles.
+"""
+import unittest
+
+import numpy as np
+
+from tpsd import area
+from tpsd.index import ProfileStatistics, TpsdIndex
+from tpsd.profile import TpsdProfile
+from tpsd.tpsd_comparison import TpsdComparison
+from tpsd.tpsd_core import Tpsd
+
+
+class TestTpsdIndex(unittest.TestCase):
+    """
+    Tests the TpsdIndex class and some of its methods.
+    """
+
+    def setUp(self):
+        generator = np.random.default_rng(0)
+        self.profiles = []
+        for _ in range(200):
+            base = generator.integers(0, 27)
+            segments = generator.integers(1, 12)
+            values = np.clip(base + generator.integers(-4, 5, segments), 0, 26)
+            self.profiles.append(TpsdProfile(list(values / 2), list(
+                generator.integers(1, 9, segments))))
+        self.index = TpsdIndex()
+        for position, profile in enumerate(self.profiles[10:]):
+            self.index.add(profile, f'song_{position}')
+
+    def test_lower_bounds(self):
+        """
+        Tests that the bounds never exceed the minimum area.
+        """
+        for query in self.profiles[:10]:
+            range_bounds, histogram_bounds = self.index.lower_bounds(
+                ProfileStatistics(query.to_array()))
+            for position, sequence in enumerate(self.index.sequences):
+                minimum = area.sequence_minimum_area(query.to_array(),
+                                                     sequence)[0]
+                shortest = min(len(query), len(sequence))
+                self.assertLessEqual(range_bounds[position],
+                                     histogram_bounds[position],
+                                     "Histogram bound should be tighter")
+                self.assertLessEqual(histogram_bounds[position] / 2 / shortest,
+                                     minimum,
+                                     "Bound should not exceed the minimum area")
+
+    def test_query(self):
+        """
+        Tests that the results are identical to the brute force search.
+        """
+        for query in self.profiles[:10]:
+            self.assertEqual(self.index.query(query, 5),
+                             self.index.brute_force(query, 5),
+                             "Results should be identical to brute force")
+            stats = self.index.last_stats
+            self.assertEqual(stats['pruned_range'] +
+                             stats['pruned_histogram'] + stats['compared'],
+                             190, "Each candidate should be counted once")
+
+    def test_resolution(self):
+        """
+        Tests an index comparing the profiles bar by bar.
+        """
+        index = TpsdIndex(resolution='bar')
+        for profile in self.profiles[10:]:
+            index.add(profile)
+        for query in self.profiles[:5]:
+            results = index.query(query, 5)
+            self.assertEqual(results, index.brute_force(query, 5))
+            self.assertEqual(results[0][1], min(
+                area.sequence_minimum_area(query.resample(4).to_array(),
+                                           profile.resample(4).to_array())[0]
+                for profile in self.profiles[10:]))
+
+    def test_resolution_comparison(self):
+        """
+        Tests that an index comparing the songs bar by bar ranks and scores
+        them as TpsdComparison at the same resolution.
+        """
+        generator = np.random.default_rng(1)
+        chords = ['C:maj', 'A:min', 'D:min7', 'G:7', 'E:7', 'F:maj7',
+                  'Bb:7', 'Db:maj']
+        songs = []
+        for _ in range(30):
+            size = generator.integers(3, 10)
+            songs.append(([chords[i] for i in generator.integers(
+                0, len(chords), size)], 'C:maj',
+                          [int(beats) for beats in
+                           generator.integers(1, 7, size)]))
+        index = TpsdIndex(resolution='bar')
+        for position, song in enumerate(songs[5:]):
+            index.add(Tpsd(*song).profile(), position)
+        for query in songs[:5]:
+            areas = sorted((TpsdComparison(
+                query[0], song[0], query[1], song[1], query[2], song[2],
+                resolution='bar').minimum_area(), position)
+                for position, song in enumerate(songs[5:]))
+            self.assertEqual(index.query(Tpsd(*query).profile(), 5),
+                             [(position, minimum) for minimum, position in
+                              areas[:5]])
+
+    def test_distant_chords(self):
+        """
+        Tests profiles containing chords farther than 13 from their key.
+        """
+        distant = Tpsd(['C#:(b2,2,3,4,5,b6,6,b7)', 'C:maj'], 'C:maj',
+                       [2, 2]).profile()
+        self.assertGreater(max(distant.values), 13)
+        position = self.index.add(distant, 'distant')
+        for query in self.profiles[:3] + [distant, TpsdProfile([20.0], [3])]:
+            self.assertEqual(self.index.query(query, 5),
+                             self.index.brute_force(query, 5))
+        self.assertEqual(self.index.query(distant, 1), [('distant', 0.0)])
+        self.assertEqual(len(self.index), position + 1)
+
+    def test_empty_profile(self):
+        """
+        Tests that empty profiles are rejected, leaving the index unchanged.
+        """
+        empty = TpsdProfile([], [])
+        with self.assertRaisesRegex(ValueError, 'Empty profiles'):
+            self.index.add(empty, 'empty')
+        with self.assertRaisesRegex(ValueError, 'Empty profiles'):
+            self.index.query(empty, 5)
+        self.assertEqual(len(self.index.sequences), 190)
+        self.assertEqual(self.index.query(self.profiles[0], 5),
+                         self.index.brute_force(self.profiles[0], 5))
+
+    def test_query_batch(self):
+        """
+        Tests that a batch is answered as its queries one by one, computing
+        the bounds of all the distinct queries together.
+        """
+        queries = self.profiles[:10] + self.profiles[:3]
+        results = self.index.query_batch(queries, 5)
+        self.assertEqual(self.index.last_stats['distinct'], 10)
+        self.assertEqual(self.index.last_stats['candidates'], 1900)
+        range_bounds, histogram_bounds = self.index.batch_lower_bounds(
+            [ProfileStatistics(query.to_array()) for query in queries[:10]])
+        for row, query in enumerate(queries):
+            self.assertEqual(results[row], self.index.query(query, 5))
+            if row < 10:
+                expected = self.index.lower_bounds(
+                    ProfileStatistics(query.to_array()))
+                self.assertTrue(np.array_equal(range_bounds[row], expected[0]))
+                self.assertTrue(np.array_equal(histogram_bounds[row],
+                                               expected[1]))
+
+
+if __name__ == '__main__':
+    unittest.main()
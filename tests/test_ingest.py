@@ -0,0 +1,131 @@
+"""
+Test for the ingestion of datasets.
+"""
+import multiprocessing
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from tpsd import ingest as ingest_module
+from tpsd.cache import TpsCache
+from tpsd.ingest import IngestReport, IngestedSong, ingest, ingest_file
+from tpsd.instrumentation import INSTRUMENTATION
+from tpsd.tpsd_core import Tpsd
+from tpsd.util import get_corresponding_biab, open_harte, parse_mgu
+
+
+class TestIngest(unittest.TestCase):
+    """
+    Tests the ingestion pipeline.
+    """
+    # pylint: disable=line-too-long
+    TEST_DATASET = './dump_dataset'
+
+    test_files = ['./test_data/All The Things You Are_id_07051_allanah.MGU.txt',
+                  './test_data/All The Things You Are_id_00123_community.MGU.txt']
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.malformed = os.path.join(self.directory, os.path.basename(
+            self.test_files[0]))
+        shutil.copy(self.test_files[0], self.malformed)
+        with open(self.malformed, 'a', encoding='utf-8') as file:
+            file.write('C:maj\n')
+        self.files = self.test_files + [self.malformed, 'missing.MGU.txt']
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def check(self, workers):
+        """
+        Ingests the test files and checks the songs and the report.
+        """
+        report = IngestReport()
+        INSTRUMENTATION.reset()
+        INSTRUMENTATION.enable()
+        try:
+            songs = sorted(ingest(self.files, self.TEST_DATASET,
+                                  workers=workers, chunk_size=1, report=report))
+            counters = INSTRUMENTATION.snapshot()['counters']
+        finally:
+            INSTRUMENTATION.disable()
+            INSTRUMENTATION.reset()
+        self.assertEqual(counters['harte_files'], 3,
+                         "Files read by the workers should be counted")
+        self.assertEqual([song.harte_path for song in songs],
+                         sorted(self.test_files), "Valid files should be ingested")
+        for song in songs:
+            chords, key = open_harte(song.harte_path)
+            timings = parse_mgu(get_corresponding_biab(song.harte_path,
+                                                       self.TEST_DATASET))
+            self.assertEqual(song.profile().expand(),
+                             Tpsd(chords, key, timings).sequence_area(),
+                             "Ingested profile does not correspond")
+        self.assertEqual(report.summary(),
+                         {'ingested': 2, 'failed': 2,
+                          'stages': {'resolve': 1, 'timing': 1}},
+                         "Errors should be reported")
+
+    def test_ingest(self):
+        """
+        Tests the ingestion in the current process.
+        """
+        self.check(workers=1)
+
+    def test_ingest_pool(self):
+        """
+        Tests the ingestion in a pool of processes.
+        """
+        self.check(workers=2)
+
+    def test_cache(self):
+        """
+        Tests that the distances are computed with the given cache.
+        """
+        cache = TpsCache()
+        biab_path = get_corresponding_biab(self.test_files[0],
+                                           self.TEST_DATASET)
+        song = ingest_file(self.test_files[0], biab_path, cache)
+        self.assertIsInstance(song, IngestedSong)
+        self.assertGreater(cache.misses, 0, "The given cache should be used")
+        self.assertEqual(ingest_file(self.test_files[0], biab_path, None),
+                         song, "Distances should not depend on the cache")
+        list(ingest(self.test_files, self.TEST_DATASET, workers=1,
+                    cache=cache))
+        self.assertGreater(cache.hits, 0, "The given cache should be reused")
+
+    @unittest.skipUnless(multiprocessing.get_start_method() == 'fork',
+                         "The workers must inherit the patched parser")
+    def test_worker_crash(self):
+        """
+        Tests that the files lost with a crashed worker are reported, and that
+        the ingestion goes on in a new pool.
+        """
+        crashing = os.path.join(self.directory, 'crash', os.path.basename(
+            self.test_files[0]))
+        os.makedirs(os.path.dirname(crashing))
+        shutil.copy(self.test_files[0], crashing)
+
+        def open_or_crash(harte_path):
+            if harte_path == crashing:
+                os._exit(1)  # pylint: disable=protected-access
+            return open_harte(harte_path)
+
+        report = IngestReport()
+        files = [crashing] + self.test_files * 5
+        with mock.patch.object(ingest_module, 'open_harte', open_or_crash):
+            songs = list(ingest(files, self.TEST_DATASET, workers=2,
+                                chunk_size=1, report=report))
+        self.assertEqual(len(report), len(files), "All files should be reported")
+        self.assertEqual(len(songs), report.ingested)
+        self.assertIn(crashing, [error.harte_path for error in report.errors
+                                 if error.stage == 'worker'])
+        self.assertEqual({error.stage for error in report.errors}, {'worker'})
+        self.assertGreaterEqual(report.ingested, len(files) - 2 * 2,
+                                "Files after the crash should be ingested")
+
+
+if __name__ == '__main__':
+    unittest.main()
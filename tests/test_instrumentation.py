@@ -0,0 +1,127 @@
+"""
+Test for the instrumentation of the hot paths.
+"""
+import unittest
+
+import numpy as np
+
+from tpsd import area
+from tpsd.canonical import canonical_chord, canonical_distance
+from tpsd.corpus import TpsdCorpus
+from tpsd.instrumentation import INSTRUMENTATION, InstrumentationHook
+from tpsd.tps_comparison import TpsComparison
+from tpsd.tpsd_comparison import TpsdComparison
+
+
+class RecordingHook(InstrumentationHook):
+    """
+    Hook recording the events it receives.
+    """
+
+    def __init__(self):
+        self.events = []
+
+    def on_count(self, name, amount):
+        self.events.append(('count', name, amount))
+
+    def on_stage_start(self, name):
+        self.events.append(('start', name))
+
+    def on_stage_end(self, name, elapsed):
+        self.events.append(('end', name))
+
+
+class TestInstrumentation(unittest.TestCase):
+    """
+    Tests the counters, the stage timers and the hooks.
+    """
+
+    def setUp(self):
+        INSTRUMENTATION.reset()
+
+    def tearDown(self):
+        INSTRUMENTATION.disable()
+        INSTRUMENTATION.reset()
+
+    def test_disabled(self):
+        """
+        Tests that nothing is recorded while disabled.
+        """
+        TpsComparison('G:7', 'C:maj', 'C:maj', 'C:maj').distance()
+        self.assertEqual(INSTRUMENTATION.snapshot(),
+                         {'counters': {}, 'stages': {}})
+
+    def test_counters(self):
+        """
+        Tests the counters and the stages of a comparison.
+        """
+        INSTRUMENTATION.enable()
+        comparison = TpsComparison('G:7', 'C:maj', 'C:maj', 'C:maj')
+        comparison.distance()
+        area.minimum_area(np.zeros(3), np.ones(10), 'sliding')
+        snapshot = INSTRUMENTATION.snapshot()
+        self.assertEqual(snapshot['counters'], {
+            'chords_parsed': 2, 'tps_evaluations': 1, 'shifts_evaluated': 8,
+            'beats_compared': 24})
+        self.assertEqual(snapshot['stages']['harte_parsing']['calls'], 2)
+        self.assertEqual(snapshot['stages']['minimum_area']['calls'], 1)
+
+    def test_bounded_counters(self):
+        """
+        Tests that abandoned shifts are not counted as compared beats.
+        """
+        INSTRUMENTATION.enable()
+        shortest = np.zeros(area.ABANDON_BLOCK * 3)
+        longest = np.concatenate((np.full(10, 13.0), shortest))
+        self.assertEqual(area.bounded_minimum_area(shortest, longest, 0.0),
+                         (0.0, 10))
+        counters = INSTRUMENTATION.snapshot()['counters']
+        self.assertEqual(counters['shifts_evaluated'], 11)
+        self.assertLess(counters['beats_compared'], 11 * len(shortest))
+
+    def test_canonical_counters(self):
+        """
+        Tests that the triad of the key is not counted as a parsed chord.
+        """
+        INSTRUMENTATION.enable()
+        canonical_distance(canonical_chord('G:7', 'C:maj'))
+        self.assertEqual(INSTRUMENTATION.snapshot()['counters'],
+                         {'chords_parsed': 1, 'tps_evaluations': 1})
+
+    def test_workers(self):
+        """
+        Tests that the work of the worker processes is merged in the parent.
+        """
+        songs = [(['C:maj', 'A:min7', 'D:min7', 'G:7'], 'C:maj', [4, 4, 4, 4]),
+                 (['F:maj7', 'Bb:7'], 'F:maj', [8, 8]),
+                 (['D:min7', 'G:7', 'C:maj7'], 'C:maj', [2, 2, 4])]
+        corpus = TpsdCorpus(songs)
+        INSTRUMENTATION.enable()
+        snapshots = []
+        for workers in (1, 2):
+            INSTRUMENTATION.reset()
+            corpus.distance_matrix(tile_size=1, workers=workers)
+            snapshots.append(INSTRUMENTATION.snapshot())
+        self.assertGreater(snapshots[1]['counters']['shifts_evaluated'], 0)
+        self.assertEqual(snapshots[1]['counters'], snapshots[0]['counters'])
+        self.assertEqual(snapshots[1]['stages']['minimum_area']['calls'], 3)
+
+    def test_hooks(self):
+        """
+        Tests that the hooks receive the events.
+        """
+        hook = RecordingHook()
+        INSTRUMENTATION.add_hook(hook)
+        INSTRUMENTATION.enable()
+        try:
+            TpsdComparison(['C:maj', 'G:7'], ['C:maj'], 'C:maj', 'C:maj',
+                           [2, 2], [2]).minimum_area()
+        finally:
+            INSTRUMENTATION.remove_hook(hook)
+        self.assertIn(('start', 'minimum_area'), hook.events)
+        self.assertIn(('end', 'minimum_area'), hook.events)
+        self.assertIn(('count', 'shifts_evaluated', 3), hook.events)
+
+
+if __name__ == '__main__':
+    unittest.main()
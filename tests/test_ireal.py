@@ -0,0 +1,93 @@
+"""
+Test for the reader of iReal Pro CSV corpora.
+"""
+import csv
+import os
+import tempfile
+import unittest
+
+from tpsd.ireal import (iter_ireal_chunks, iter_ireal_csv, ireal_key,
+                        ireal_to_harte, parse_chords)
+
+
+class TestIReal(unittest.TestCase):
+    """
+    Tests the conversion of iReal Pro corpora.
+    """
+    TEST_CORPUS = '../examples/all_the_things_versions.csv'
+
+    def test_ireal_to_harte(self):
+        """
+        Tests the conversion of chords to the Harte notation.
+        """
+        self.assertEqual(ireal_to_harte('Ab'), 'Ab:maj')
+        self.assertEqual(ireal_to_harte('F-7'), 'F:min7')
+        self.assertEqual(ireal_to_harte('Eb^7'), 'Eb:maj7')
+        self.assertEqual(ireal_to_harte('Dh7'), 'D:hdim7')
+        self.assertEqual(ireal_to_harte('Bo7'), 'B:dim7')
+        self.assertEqual(ireal_to_harte('G#sus'), 'G#:sus4')
+        self.assertEqual(ireal_to_harte('C7#9'), 'C:(3,5,b7,#9)')
+        self.assertEqual(ireal_to_harte('Ab^7/Eb'), 'Ab:maj7/5')
+        self.assertEqual(ireal_to_harte('F-^9'), 'F:(b3,5,7,9)')
+        self.assertEqual(ireal_to_harte('C-b6'), 'C:(b3,5,#5)')
+        self.assertEqual(ireal_to_harte('G7susadd3'), 'G:(3,4,5,b7)')
+        for token in ('Czz', 'C7x', 'C-7q'):
+            with self.assertRaises(ValueError):
+                ireal_to_harte(token)
+
+    def test_ireal_key(self):
+        """
+        Tests the conversion of keys to the Harte notation.
+        """
+        self.assertEqual(ireal_key('Ab'), 'Ab:maj')
+        self.assertEqual(ireal_key('C-'), 'C:min')
+
+    def test_parse_chords(self):
+        """
+        Tests the conversion of bars, repetitions and chords without root.
+        """
+        chords, durations = parse_chords(
+            'n Bb7 W7b9 Db69Ab^7 x n UW/C N2C', 4)
+        self.assertEqual(chords, ['Bb:7', 'Bb:(3,5,b7,b9)', 'Db:(3,5,6,9)',
+                                  'Ab:maj7', 'Db:(3,5,6,9)', 'Ab:maj7',
+                                  'Ab:maj7/3', 'C:maj'])
+        self.assertEqual(durations, [4, 4, 2, 2, 2, 6, 4, 4])
+
+    def test_iter_ireal_csv(self):
+        """
+        Tests that all the songs of the example corpus can be compared.
+        """
+        songs = list(iter_ireal_csv(self.TEST_CORPUS))
+        with open(self.TEST_CORPUS, 'r', encoding='utf-8') as csv_file:
+            self.assertEqual(len(songs), sum(1 for _ in csv.DictReader(
+                csv_file)))
+        for song in songs:
+            self.assertEqual(len(song.chords), len(song.durations))
+            self.assertEqual(len(song.tpsd().sequence_area()),
+                             sum(song.durations))
+        chunks = list(iter_ireal_chunks(self.TEST_CORPUS, chunk_size=4))
+        self.assertEqual([len(chunk) for chunk in chunks], [4, len(songs) - 4])
+        self.assertEqual([song for chunk in chunks for song in chunk], songs)
+
+    def test_skip_invalid(self):
+        """
+        Tests that songs containing invalid chords are skipped on request.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'corpus.csv')
+            with open(path, 'w', encoding='utf-8', newline='') as csv_file:
+                writer = csv.writer(csv_file)
+                writer.writerow(['title', 'key', 'time_signature', 'chords'])
+                writer.writerow(['Invalid', 'C', '(4, 4)', 'W7 C'])
+                writer.writerow(['Unknown', 'C', '(4, 4)', 'C7zz C'])
+                writer.writerow(['Valid', 'C-', '(3, 4)', 'C- G7'])
+            with self.assertRaises(ValueError):
+                list(iter_ireal_csv(path))
+            songs = list(iter_ireal_csv(path, skip_invalid=True))
+            self.assertEqual([song.title for song in songs], ['Valid'])
+            self.assertEqual(songs[0].as_song(),
+                             (['C:min', 'G:7'], 'C:min', [3, 3]))
+
+
+if __name__ == '__main__':
+    unittest.main()
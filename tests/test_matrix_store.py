@@ -0,0 +1,66 @@
+"""
+Test for the on-disk storage of distance matrices.
+"""
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from tpsd.corpus import TpsdCorpus
+from tpsd.matrix_store import DistanceMatrixStore, decode, open_matrix
+from tpsd.profile import TpsdProfile
+
+
+class TestDistanceMatrixStore(unittest.TestCase):
+    """
+    Tests the DistanceMatrixStore class and some of its methods.
+    """
+    corpus = TpsdCorpus.from_profiles(
+        TpsdProfile.from_sequence(sequence) for sequence in
+        [[0.0, 0.0, 7.5, 7.5], [10.0, 6.5, 6.5], [0.5, 0.5, 0.5, 8.5, 8.5],
+         [7.5, 7.5, 0.0], [13.0, 0.0, 9.5, 9.5, 9.5, 1.0], [6.5, 6.5]])
+
+    def setUp(self):
+        # pylint: disable=consider-using-with
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'matrix.npy')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_resume(self):
+        """
+        Tests that an interrupted computation only resumes the pending tiles.
+        """
+        expected = self.corpus.distance_matrix(tile_size=2, workers=1)
+        store = DistanceMatrixStore.create(self.path, len(self.corpus), 2)
+        tiles = self.corpus.compute_tiles(store.pending_tiles(), workers=1)
+        for _ in range(2):
+            store.write_tile(*next(tiles))
+        del store
+
+        store = DistanceMatrixStore.create(self.path, len(self.corpus), 2)
+        self.assertEqual(len(store.pending_tiles()), 4,
+                         "Only 4 of the 6 tiles should be pending")
+        self.corpus.fill_store(store, workers=1)
+        self.assertTrue(store.is_complete(), "All tiles should be completed")
+        self.assertTrue(np.array_equal(open_matrix(self.path),
+                                       expected.astype(np.float32)),
+                        "Stored matrix does not correspond")
+
+    def test_uint16(self):
+        """
+        Tests the fixed-point encoding of the matrix.
+        """
+        expected = self.corpus.distance_matrix(workers=1)
+        store = DistanceMatrixStore.create(self.path, len(self.corpus),
+                                           encoding='uint16')
+        self.corpus.fill_store(store, workers=1)
+        self.assertTrue(np.allclose(decode(open_matrix(self.path)), expected,
+                                    atol=1 / 8192),
+                        "Decoded matrix does not correspond")
+
+
+if __name__ == '__main__':
+    unittest.main()
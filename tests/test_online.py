@@ -0,0 +1,74 @@
+"""
+Test for the online comparison of chord sequences.
+"""
+import random
+import unittest
+
+from tpsd import area
+from tpsd.online import OnlineTpsdComparison
+from tpsd.tpsd_core import Tpsd
+
+
+class TestOnlineTpsdComparison(unittest.TestCase):
+    """
+    Tests the OnlineTpsdComparison class.
+    """
+    CHORDS = ['C:maj', 'G:7', 'A:min', 'F:maj7', 'D:min7', 'E:7', 'Bb:maj',
+              'F#:hdim7']
+
+    def test_append(self):
+        """
+        Tests that appending chords to a Tpsd updates its profile.
+        """
+        chords, keys, beats = ['C:maj', 'G:7', 'G:7', 'Bb:maj'], \
+            ['C:maj', 'C:maj', 'C:maj', 'F:maj'], [4, 2, 2, 4]
+        tpsd = Tpsd(chords[:1], keys[:1], beats[:1])
+        tpsd.profile()
+        for chord, key, duration in zip(chords[1:], keys[1:], beats[1:]):
+            tpsd.append(chord, key, duration)
+        self.assertEqual(tpsd.profile(), Tpsd(chords, keys, beats).profile(),
+                         "Appended chords should update the profile")
+
+    def test_read_only(self):
+        """
+        Tests that the sequence of a Tpsd can only be changed by append(), so
+        that its profile does not become stale.
+        """
+        tpsd = Tpsd(['C:maj', 'G:7'], 'C:maj', [4, 4])
+        profile = tpsd.profile()
+        with self.assertRaises(AttributeError):
+            tpsd.chord_sequence = ['C:maj']
+        with self.assertRaises(AttributeError):
+            tpsd.timing_information = [8, 8]
+        tpsd.chord_sequence[1] = 'F#:7'
+        tpsd.keys.append('G:maj')
+        tpsd.timing_information[0] = 1
+        self.assertEqual(tpsd.chord_sequence, ['C:maj', 'G:7'])
+        self.assertEqual(tpsd.keys, ['C:maj', 'C:maj'])
+        self.assertEqual(tpsd.timing_information, [4, 4])
+        self.assertEqual(tpsd.profile(), profile)
+
+    def test_minimum_area(self):
+        """
+        Tests that the minimum area is the same as the offline one after each
+        chord, for queries both shorter and longer than the reference.
+        """
+        rng = random.Random(0)
+        reference = Tpsd([rng.choice(self.CHORDS) for _ in range(6)], 'C:maj',
+                         [rng.randint(1, 4) for _ in range(6)])
+        comparison = OnlineTpsdComparison(reference)
+        self.assertEqual(comparison.minimum_area(return_offset=True),
+                         (float('inf'), -1))
+        for _ in range(20):
+            comparison.append(rng.choice(self.CHORDS), 'C:maj',
+                              rng.randint(1, 4))
+            expected = area.sequence_minimum_area(
+                comparison.query.profile().to_array(),
+                reference.profile().to_array())
+            self.assertEqual(comparison.minimum_area(return_offset=True),
+                             expected, "Online and offline areas differ")
+        self.assertGreater(len(comparison), len(reference.profile()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+"""
+Test for the run-length TPSD profiles.
+"""
+import unittest
+
+from tpsd import area
+from tpsd.compact import CompactSong
+from tpsd.profile import TpsdProfile, resolution_beats
+from tpsd.tpsd_comparison import TpsdComparison
+from tpsd.tpsd_core import Tpsd
+
+
+class TestTpsdProfile(unittest.TestCase):
+    """
+    Tests the TpsdProfile class and some of its methods.
+    """
+
+    def test_segments(self):
+        """
+        Tests that equal consecutive values and empty chords are merged.
+        """
+        profile = TpsdProfile([7.5, 7.5, 0.5, 10.0], [2, 4, 0, 1])
+        self.assertEqual(profile.segments, [(7.5, 6), (10.0, 1)],
+                         "Segments should be merged")
+        self.assertEqual(len(profile), 7, "The profile should last 7 beats")
+
+    def test_expand(self):
+        """
+        Tests the expansion of a profile into one value per beat.
+        """
+        sequence = [6.5, 6.5, 8.5, 0.5, 0.5, 0.5, 8.5]
+        self.assertEqual(TpsdProfile.from_sequence(sequence).expand(), sequence,
+                         "Expanded profile should match the sequence")
+
+    def test_append(self):
+        """
+        Tests that appending chords gives the same profile as building it.
+        """
+        values, durations = [7.5, 7.5, 0.5, 10.0, 10.0], [2, 4, 0, 1, 3]
+        profile = TpsdProfile([], [])
+        for value, duration in zip(values, durations):
+            profile.append(value, duration)
+        self.assertEqual(profile, TpsdProfile(values, durations),
+                         "Appended profile should match the built one")
+        self.assertEqual(profile.ends, [6, 10], "Ends should be updated")
+
+    def test_area(self):
+        """
+        Tests the area between two profiles at every offset.
+        """
+        short = [1.0, 3.5, 3.5, 0.0]
+        long = [2.0, 2.0, 13.0, 0.5, 0.5, 0.5, 4.0]
+        for offset in range(len(long) - len(short) + 1):
+            expected = sum(abs(value - long[offset + beat])
+                           for beat, value in enumerate(short))
+            self.assertEqual(TpsdProfile.from_sequence(short).area(
+                TpsdProfile.from_sequence(long), offset), expected,
+                f"Area at offset {offset} does not correspond")
+
+    def test_resample(self):
+        """
+        Tests the resampling of a profile at a coarser resolution.
+        """
+        profile = TpsdProfile([1.0, 3.0, 0.5], [3, 2, 4])
+        self.assertEqual(profile.resample(4),
+                         TpsdProfile([1.5, 1.125, 0.5], [1, 1, 1]),
+                         "Each sample should be the mean of its beats")
+        self.assertEqual(profile.resample(1), profile,
+                         "Beat resolution should not change the profile")
+        self.assertEqual(resolution_beats('half-bar', 4), 2)
+        self.assertEqual(resolution_beats('bar', 3), 3)
+        self.assertRaises(ValueError, resolution_beats, 'half-bar', 3)
+
+    def test_comparison_resolution(self):
+        """
+        Tests the comparison of two sequences at a coarser resolution.
+        """
+        song_a = (['C:maj', 'A:min', 'D:min7', 'G:7', 'C:maj', 'E:7'], 'C:maj',
+                  [4, 3, 2, 2, 5, 4])
+        song_b = (['F:maj', 'G:7', 'C:maj'], 'C:maj', [3, 2, 4])
+        expected = area.sequence_minimum_area(
+            Tpsd(*song_a).profile('bar').to_array(),
+            Tpsd(*song_b).profile('bar').to_array())
+        comparison = TpsdComparison(song_a[0], song_b[0], song_a[1],
+                                    song_b[1], song_a[2], song_b[2],
+                                    resolution='bar')
+        self.assertEqual((comparison.length_a, comparison.length_b), (5, 3))
+        self.assertEqual(comparison.minimum_area(return_offset=True),
+                         expected)
+        self.assertEqual(TpsdComparison(
+            CompactSong(*song_a), CompactSong(*song_b), resolution='bar'
+        ).minimum_area(return_offset=True), expected,
+            "Compact songs should be resampled too")
+
+
+if __name__ == '__main__':
+    unittest.main()
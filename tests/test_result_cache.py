@@ -0,0 +1,68 @@
+"""
+Test for the persistent cache of the minimum areas.
+"""
+import os
+import tempfile
+import unittest
+
+from tpsd.profile import TpsdProfile
+from tpsd.result_cache import ResultCache, profile_hash
+
+
+class TestResultCache(unittest.TestCase):
+    """
+    Tests the ResultCache class and the hashing of the profiles.
+    """
+
+    def setUp(self):
+        # pylint: disable=consider-using-with
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'results.sqlite')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_profile_hash(self):
+        """
+        Tests that the hash only depends on the step function of the profile.
+        """
+        merged = TpsdProfile([1.0, 1.0, 2.5], [2, 2, 4])
+        self.assertEqual(profile_hash(merged),
+                         profile_hash(TpsdProfile([1.0, 2.5], [4, 4])))
+        self.assertNotEqual(profile_hash(merged),
+                            profile_hash(TpsdProfile([1.0, 2.5], [4, 5])))
+        self.assertNotEqual(profile_hash(merged),
+                            profile_hash(TpsdProfile([1.0, 2.0], [4, 4])))
+
+    def test_lookup(self):
+        """
+        Tests that the results are found regardless of the order of the pair,
+        and counted as hits or misses.
+        """
+        with ResultCache(self.path) as cache:
+            cache.put('b', 'a', 1.5)
+            cache.put_many([('a', 'c', 0.25), ('c', 'b', 3.0)])
+            self.assertEqual(cache.get('a', 'b'), 1.5)
+            self.assertEqual(cache.get_many([('b', 'c'), ('c', 'a'),
+                                             ('a', 'd')]),
+                             {('b', 'c'): 3.0, ('a', 'c'): 0.25})
+            stats = cache.stats()
+        self.assertEqual((stats['entries'], stats['hits'], stats['misses']),
+                         (3, 3, 1))
+        self.assertEqual(stats['hit_rate'], 0.75)
+        self.assertGreater(stats['bytes'], 0)
+
+    def test_version(self):
+        """
+        Tests that the results of other versions of the algorithm are ignored.
+        """
+        with ResultCache(self.path, version=1) as cache:
+            cache.put('a', 'b', 1.5)
+        with ResultCache(self.path, version=2) as cache:
+            self.assertIsNone(cache.get('a', 'b'))
+            self.assertEqual(len(cache), 0)
+            self.assertEqual(cache.stats()['all_entries'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+"""
+Test for the search of chord progressions within songs.
+"""
+import unittest
+
+from tpsd.corpus import TpsdCorpus
+from tpsd.profile import TpsdProfile
+from tpsd.search import SubsequenceSearch, select_matches
+from tpsd.tpsd_comparison import TpsdComparison
+
+
+class TestSubsequenceSearch(unittest.TestCase):
+    """
+    Tests the SubsequenceSearch class.
+    """
+    songs = [(['C:maj', 'A:min', 'D:min', 'G:7', 'C:maj', 'A:min', 'D:min',
+               'G:7'], 'C:maj', [4, 4, 4, 4, 4, 4, 4, 4]),
+             (['F:maj', 'Bb:maj'], 'F:maj', [2, 2]),
+             (['E:min', 'A:7', 'D:maj', 'G:maj', 'C#:hdim7', 'F#:7', 'B:min'],
+              'D:maj', [4, 4, 8, 4, 2, 2, 8])]
+    pattern = (['D:min', 'G:7', 'C:maj'], 'C:maj', [4, 4, 4])
+
+    def test_select_matches(self):
+        """
+        Tests that overlapping matches are suppressed.
+        """
+        areas = TpsdProfile.from_sequence([3.0, 1.0, 0.5, 2.0, 4.0, 0.0,
+                                           1.0]).to_array()
+        self.assertEqual(select_matches(areas, 3, 3), [(5, 0.0), (2, 0.5)])
+        self.assertEqual(select_matches(areas, 3, 1), [(5, 0.0), (2, 0.5),
+                                                       (1, 1.0)])
+        self.assertEqual(select_matches(areas, 3, 3, max_area=0.0), [(5, 0.0)])
+
+    def test_search(self):
+        """
+        Tests that the best match of each song corresponds to TpsdComparison.
+        """
+        corpus = TpsdCorpus(self.songs)
+        matches = SubsequenceSearch(corpus, labels=['a', 'b', 'c']).search(
+            TpsdCorpus([self.pattern]).profiles[0], k=2)
+        self.assertEqual([match.label for match in matches], ['a', 'a', 'c', 'c'],
+                         "Songs shorter than the pattern should be skipped")
+        self.assertEqual(matches[0].offset, 8, "ii-V-I should be at beat 8")
+        self.assertGreaterEqual(abs(matches[1].offset - matches[0].offset), 12,
+                                "Matches should not overlap")
+        for label, song in (('a', self.songs[0]), ('c', self.songs[2])):
+            comparison = TpsdComparison(self.pattern[0], song[0],
+                                        self.pattern[1], song[1],
+                                        self.pattern[2], song[2])
+            best = [match for match in matches if match.label == label][0]
+            self.assertEqual((best.area, best.offset),
+                             comparison.minimum_area(return_offset=True))
+            self.assertEqual(comparison.shift_areas()[best.offset], best.area)
+
+
+if __name__ == '__main__':
+    unittest.main()
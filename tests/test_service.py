@@ -0,0 +1,210 @@
+"""
+Test for the query service.
+"""
+import asyncio
+import json
+import os
+import unittest
+from unittest import mock
+
+from tpsd import service as service_module
+from tpsd.service import QueryService, load_index, parse_query
+from tpsd.tpsd_core import Tpsd
+
+EXAMPLE = os.path.join(os.path.dirname(__file__), '..', 'examples',
+                       'all_the_things_versions.csv')
+QUERIES = [
+    (['C:maj', 'A:min', 'D:min7', 'G:7'], 'C:maj', [4, 4, 4, 4]),
+    (['F:min7', 'Bb:min7', 'Eb:7', 'Ab:maj7'], 'Ab:maj', [4, 4, 4, 4]),
+    (['D:min7', 'G:7', 'C:maj7'], 'C:maj', [2, 2, 4]),
+]
+
+
+async def request(port, method, path, payload=None):
+    """
+    Sends an HTTP request to the service and decodes its JSON response.
+    """
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    body = b'' if payload is None else json.dumps(payload).encode('utf-8')
+    writer.write(f'{method} {path} HTTP/1.1\r\nHost: localhost\r\n'
+                 f'Content-Length: {len(body)}\r\n\r\n'.encode('latin-1') +
+                 body)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, content = response.partition(b'\r\n\r\n')
+    return int(head.split()[1]), json.loads(content)
+
+
+class TestQueryService(unittest.TestCase):
+    """
+    Tests the QueryService class and its endpoints.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.index = load_index([EXAMPLE], [])
+
+    def serve(self, scenario, **options):
+        """
+        Runs a scenario against a service listening on a free port.
+        """
+        async def run():
+            service = QueryService(self.index, **options)
+            server = await service.serve('127.0.0.1', 0)
+            try:
+                return await scenario(service,
+                                      server.sockets[0].getsockname()[1])
+            finally:
+                server.close()
+                await server.wait_closed()
+                await service.close()
+
+        return asyncio.run(run())
+
+    def expected(self, chords, key, durations, k):
+        """
+        Gets the results of a query answered directly by the index.
+        """
+        return [{'label': label, 'area': minimum} for label, minimum in
+                self.index.query(Tpsd(chords, key, durations).profile(), k)]
+
+    def test_concurrent_queries(self):
+        """
+        Tests that concurrent queries are batched and answered as the index.
+        """
+        queries = [{'chords': chords, 'key': key, 'durations': durations,
+                    'k': 3} for chords, key, durations in QUERIES * 10]
+
+        async def scenario(service, port):
+            responses = await asyncio.gather(*[
+                request(port, 'POST', '/query', query) for query in queries])
+            return responses, service.stats()
+
+        responses, stats = self.serve(scenario, window=0.05, workers=0)
+        for query, (status, payload) in zip(queries, responses):
+            self.assertEqual(status, 200)
+            self.assertEqual(payload['results'], self.expected(
+                query['chords'], query['key'], query['durations'], 3))
+        self.assertEqual(stats['batched_queries'], len(queries))
+        self.assertLess(stats['batches'], len(queries))
+        self.assertEqual(stats['latency'].keys(),
+                         {'mean', 'p50', 'p95', 'p99', 'max'})
+
+    def test_worker_processes(self):
+        """
+        Tests the answers of a pool of worker processes.
+        """
+        chords, key, durations = QUERIES[0]
+
+        async def scenario(_, port):
+            return await request(port, 'POST', '/query', {
+                'chords': chords, 'key': key, 'durations': durations})
+
+        status, payload = self.serve(scenario, workers=1)
+        self.assertEqual(status, 200)
+        self.assertEqual(payload['results'],
+                         self.expected(chords, key, durations, 10))
+
+    def test_worker_crash(self):
+        """
+        Tests that the pool is replaced when a worker dies.
+        """
+        query = dict(zip(('chords', 'key', 'durations'), QUERIES[0]))
+
+        async def scenario(service, port):
+            statuses = [(await request(port, 'POST', '/query', query))[0]]
+            # pylint: disable=protected-access
+            for process in list(service._executor._processes.values()):
+                process.kill()
+                process.join()
+            statuses.append((await request(port, 'POST', '/query', query))[0])
+            statuses.append((await request(port, 'POST', '/query', query))[0])
+            return statuses, service.stats()
+
+        statuses, stats = self.serve(scenario, workers=1)
+        self.assertEqual(statuses, [200, 500, 200])
+        self.assertEqual(stats['pool_restarts'], 1)
+
+    def test_content_length(self):
+        """
+        Tests that an invalid Content-Length is a client error.
+        """
+        async def scenario(_, port):
+            statuses = []
+            for length in ('-1', 'abc'):
+                reader, writer = await asyncio.open_connection('127.0.0.1',
+                                                               port)
+                writer.write(f'POST /query HTTP/1.1\r\nContent-Length: '
+                             f'{length}\r\n\r\n'.encode('latin-1'))
+                await writer.drain()
+                statuses.append(int((await reader.read()).split()[1]))
+                writer.close()
+            return statuses
+
+        self.assertEqual(self.serve(scenario, workers=0), [400, 400])
+
+    def test_errors(self):
+        """
+        Tests that invalid requests are answered with an error, without
+        failing the other queries of the batch.
+        """
+        chords, key, durations = QUERIES[0]
+
+        async def scenario(service, port):
+            responses = await asyncio.gather(
+                request(port, 'POST', '/query', {
+                    'chords': chords, 'key': key, 'durations': durations}),
+                request(port, 'POST', '/query', {
+                    'chords': ['X:foo'], 'key': key, 'durations': [4]}),
+                request(port, 'POST', '/query', {
+                    'chords': chords, 'key': key, 'durations': [4]}),
+                request(port, 'GET', '/query'),
+                request(port, 'GET', '/missing'),
+                request(port, 'GET', '/health'))
+            return [status for status, _ in responses], service.stats()
+
+        statuses, stats = self.serve(scenario, window=0.05, workers=0)
+        self.assertEqual(statuses, [200, 400, 400, 405, 404, 200])
+        self.assertEqual(stats['requests'], 6)
+        self.assertEqual(stats['errors'], 4)
+
+    def test_batch_failure(self):
+        """
+        Tests that a query failing in the search of the batch does not fail
+        the other queries.
+        """
+        search = self.index.query_batch
+
+        def failing(profiles, k):
+            if any(len(profile) == 3 for profile in profiles):
+                raise ValueError('search failed')
+            return search(profiles, k)
+
+        queries = [(*QUERIES[0], 5), (['C:maj'], 'C:maj', [3], 5),
+                   (*QUERIES[2], 5)]
+        with mock.patch.object(self.index, 'query_batch', failing):
+            answers = service_module._answer_batch(  # pylint: disable=protected-access
+                queries, self.index)
+        self.assertEqual(answers[1], 'ValueError: search failed')
+        for position in (0, 2):
+            self.assertEqual(answers[position], self.index.query(
+                Tpsd(*queries[position][:3]).profile(), 5))
+
+    def test_parse_query(self):
+        """
+        Tests that booleans and durations not longer than a beat are rejected.
+        """
+        chords, key, durations = QUERIES[2]
+        self.assertEqual(parse_query({'chords': chords, 'key': key,
+                                      'durations': durations, 'k': 3}),
+                         (chords, key, durations, 3))
+        for durations, k in (([2, 0, 4], 3), ([2, -2, 4], 3),
+                             ([2, True, 4], 3), (durations, True)):
+            with self.assertRaises(ValueError):
+                parse_query({'chords': chords, 'key': key,
+                             'durations': durations, 'k': k})
+
+
+if __name__ == '__main__':
+    unittest.main()
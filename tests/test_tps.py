@@ -3,7 +3,7 @@ Test for TPS.
 """
 import unittest
 
-from tpsd.tps import Tps
+from tpsd.tps import Tps, mask_to_list
 
 
 class TestTps(unittest.TestCase):
@@ -27,6 +27,15 @@ class TestTps(unittest.TestCase):
         self.assertEqual(chord.triadic_level(), [0, 4, 7, 10],
                          "Diatonic level of C:7 should be [0, 4, 7, 9]")
 
+    def test_level_masks(self):
+        """
+        Tests that the masks of the levels encode the same grades as the lists.
+        """
+        chord = Tps('A:min7', 'F:maj')
+        self.assertEqual([mask_to_list(mask) for mask in chord.level_masks()],
+                         [sorted(level) for level in chord.get_levels()],
+                         "Masks of A:min7 should encode the levels of the TPS")
+
 
 if __name__ == '__main__':
     unittest.main()
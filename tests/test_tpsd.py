@@ -3,6 +3,7 @@ Test for TPSD.
 """
 import unittest
 
+from tpsd.tpsd_comparison import TpsdComparison
 from tpsd.tpsd_core import Tpsd
 from tpsd.util import open_harte, parse_mgu, get_corresponding_biab
 
@@ -82,3 +83,13 @@ class TestTpsComparison(unittest.TestCase):
                           10.0, 10.0, 10.0, 8.5, 8.5, 8.5, 8.5, 7.5, 7.5, 7.5,
                           7.5, 0.5, 0.5, 0.5, 0.5],
                          "Area values do not correspond")
+
+    def test_minimum_area_same_length(self):
+        """
+        Tests the minimum area between two different sequences having the same
+        length.
+        """
+        comparison = TpsdComparison(['C:maj', 'G:7'], ['C:maj', 'F#:7'],
+                                    'C:maj', 'C:maj', [2, 2], [2, 2])
+        self.assertEqual(comparison.minimum_area(), 1.25,
+                         "Minimum area should be 1.25")
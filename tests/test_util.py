@@ -0,0 +1,103 @@
+"""
+Test for the utility functions.
+"""
+import os
+import tempfile
+import unittest
+
+from tpsd.util import BiabNotFoundError, DatasetIndex, chunked, \
+    get_corresponding_biab
+
+
+class TestDatasetIndex(unittest.TestCase):
+    """
+    Tests the DatasetIndex class and some of its methods.
+    """
+    # pylint: disable=line-too-long
+    TEST_DATASET = './dump_dataset'
+
+    def setUp(self):
+        # pylint: disable=consider-using-with
+        self.directory = tempfile.TemporaryDirectory()
+        self.dataset = self.directory.name
+        os.makedirs(os.path.join(self.dataset, 'nested'))
+        for name in ['song_a.MGU', 'nested/song_b.MG1', 'notes.txt']:
+            with open(os.path.join(self.dataset, name), 'w',
+                      encoding='utf-8'):
+                pass
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_get_corresponding_biab(self):
+        """
+        Tests the file corresponding to an annotation of the test dataset.
+        """
+        self.assertEqual(get_corresponding_biab(
+            './test_data/All The Things You Are_id_07051_allanah.MGU.txt',
+            self.TEST_DATASET),
+            './dump_dataset/All The Things You Are_id_07051_allanah.MGU',
+            "Band-in-a-Box file does not correspond")
+
+    def test_resolve(self):
+        """
+        Tests the resolution of annotations named after files or their stems,
+        also in nested directories.
+        """
+        index = DatasetIndex(self.dataset)
+        self.assertEqual(index.resolve_all(['song_a.MGU.txt', 'song_b.txt']),
+                         {'song_a.MGU.txt': f'{self.dataset}/song_a.MGU',
+                          'song_b.txt': f'{self.dataset}/nested/song_b.MG1'},
+                         "Annotations should be resolved")
+        with self.assertRaises(BiabNotFoundError):
+            index.resolve('notes.txt')
+
+    def test_rescan(self):
+        """
+        Tests that new files are found after a rescan.
+        """
+        index = DatasetIndex(self.dataset)
+        with open(os.path.join(self.dataset, 'nested', 'song_c.MGU'), 'w',
+                  encoding='utf-8'):
+            pass
+        self.assertIsNone(index.find('song_c.txt'),
+                          "New file should not be indexed before a rescan")
+        index.rescan()
+        self.assertEqual(index.find('song_c.txt'),
+                         f'{self.dataset}/nested/song_c.MGU',
+                         "New file should be indexed after a rescan")
+        self.assertEqual(len(index), 3, "Three files should be indexed")
+
+    def test_stale_path(self):
+        """
+        Tests that a renamed file is found again instead of its old path.
+        """
+        self.assertEqual(get_corresponding_biab('song_a.MGU.txt', self.dataset),
+                         f'{self.dataset}/song_a.MGU')
+        os.rename(os.path.join(self.dataset, 'song_a.MGU'),
+                  os.path.join(self.dataset, 'nested', 'song_a.MGU'))
+        self.assertEqual(get_corresponding_biab('song_a.MGU.txt', self.dataset),
+                         f'{self.dataset}/nested/song_a.MGU',
+                         "Renamed file should be found after a rescan")
+        os.remove(os.path.join(self.dataset, 'nested', 'song_a.MGU'))
+        with self.assertRaises(BiabNotFoundError):
+            get_corresponding_biab('song_a.MGU.txt', self.dataset)
+
+
+class TestChunked(unittest.TestCase):
+    """
+    Tests the chunked function.
+    """
+
+    def test_chunked(self):
+        """
+        Tests that the items are grouped in order, the last chunk being
+        shorter.
+        """
+        self.assertEqual(list(chunked(iter(range(5)), 2)),
+                         [[0, 1], [2, 3], [4]])
+        self.assertEqual(list(chunked([], 2)), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+"""
+Test for the TPS distances between all the chords of a vocabulary.
+"""
+import unittest
+
+import numpy as np
+
+from tpsd.tps_comparison import TpsComparison
+from tpsd.vocabulary import ChordVocabulary
+
+
+class TestChordVocabulary(unittest.TestCase):
+    """
+    Tests the ChordVocabulary class and some of its methods.
+    """
+    ITEMS = [(chord, key) for chord in ['C:maj', 'A:min7', 'G:7', 'F#:hdim7',
+                                        'Bb:maj7', 'E:sus4', 'Db:dim/b3']
+             for key in ['C:maj', 'G:min', 'Eb:maj', 'B:min']]
+
+    def test_distance_matrix(self):
+        """
+        Tests that the distances correspond to the ones of TpsComparison.
+        """
+        matrix = ChordVocabulary(self.ITEMS).distance_matrix(block_size=5)
+        for row, (chord_a, key_a) in enumerate(self.ITEMS):
+            for column, (chord_b, key_b) in enumerate(self.ITEMS):
+                comparison = TpsComparison(chord_a, key_a, chord_b, key_b)
+                self.assertEqual(matrix[row, column], comparison.distance(),
+                                 f"Distance between {chord_a} in {key_a} and "
+                                 f"{chord_b} in {key_b} is wrong")
+
+    def test_blocks(self):
+        """
+        Tests that the blocks cover the whole matrix.
+        """
+        vocabulary = ChordVocabulary(self.ITEMS)
+        blocks = list(vocabulary.iter_blocks(block_size=6))
+        self.assertEqual([start for start, _, _ in blocks],
+                         list(range(0, len(self.ITEMS), 6)))
+        self.assertTrue(np.array_equal(
+            np.concatenate([block for _, _, block in blocks]),
+            vocabulary.distances()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,474 @@
+"""
+This file contains the vectorised computation of the areas between two step
+functions, to support the implementation of the Tonal Pitch Step Distance
+(TPSD) algorithm as presented in:
+
+De Haas, W.B., Veltkamp, R.C., Wiering, F.: Tonal pitch step distance: a
+similarity measure for chord progressions.
+In: ISMIR. pp. 51–56 (2008)
+
+Author: Andrea Poltronieri (University of Bologna) and Jacopo de Berardinis
+(King's College of London)
+Copyright: 2022 Andrea Poltronieri and Jacopo de Berardinis
+License: MIT license
+"""
+import math
+from typing import Optional
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from tpsd.instrumentation import INSTRUMENTATION
+
+# maximum number of beats compared at once, which bounds the memory used by the
+# temporary arrays of the sliding windows
+BLOCK_ELEMENTS = 1 << 20
+# number of beat comparisons (shifts times length of the shortest sequence)
+# from which the FFT method is used by default
+FFT_CUTOFF = 1 << 20
+# minimum number of runs of equal values of the shortest sequence for which the
+# FFT method is used by default, since the cost of the run-length method grows
+# with the number of runs while the cost of the FFT does not
+FFT_MIN_RUNS = 1 << 10
+# number of beat comparisons from which the run-length method is used by
+# default, below which its per-run overhead exceeds the cost of sliding windows
+RUNS_CUTOFF = 1 << 18
+METHODS = ('auto', 'sliding', 'runs', 'fft')
+# number of beats accumulated by each shift before checking whether it can be
+# abandoned
+ABANDON_BLOCK = 64
+
+
+def shift_areas(shortest: np.ndarray, longest: np.ndarray) -> np.ndarray:
+    """
+    Calculates the area between the shortest sequence and each window of the
+    longest sequence having the same length.
+    :param shortest: the TPS distance of each beat of the shortest sequence
+    :type shortest: np.ndarray
+    :param longest: the TPS distance of each beat of the longest sequence
+    :type longest: np.ndarray
+    :return: an array containing, for each shift of the shortest sequence over
+    the longest one, the sum of the absolute differences between the two.
+    """
+    if len(shortest) > len(longest):
+        raise ValueError('The shortest sequence is longer than the longest.')
+    windows = sliding_window_view(longest, len(shortest))
+    areas = np.empty(len(windows))
+    block = max(1, BLOCK_ELEMENTS // max(1, len(shortest)))
+    for start in range(0, len(windows), block):
+        areas[start:start + block] = np.abs(
+            windows[start:start + block] - shortest).sum(axis=1)
+    return areas
+
+
+def is_half_step(sequence: np.ndarray) -> bool:
+    """
+    Checks whether all the values of a sequence are multiples of 0.5.
+    :param sequence: the TPS distance of each beat
+    :type sequence: np.ndarray
+    :return: True if the sequence can be encoded with half steps.
+    """
+    doubled = np.asarray(sequence) * 2
+    return bool(np.array_equal(np.rint(doubled), doubled))
+
+
+def half_steps(sequence: np.ndarray) -> np.ndarray:
+    """
+    Encodes a sequence of TPS distances, which are multiples of 0.5, as
+    integers.
+    :param sequence: the TPS distance of each beat
+    :type sequence: np.ndarray
+    :return: an array containing the doubled TPS distance of each beat.
+    """
+    if not is_half_step(sequence):
+        raise ValueError('The values of the sequence are not multiples of 0.5')
+    return np.rint(np.asarray(sequence) * 2).astype(np.int64)
+
+
+def runs(sequence: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Splits a sequence in runs of equal values.
+    :param sequence: the TPS distance of each beat
+    :type sequence: np.ndarray
+    :return: the first beat and the last beat (excluded) of each run.
+    """
+    changes = np.flatnonzero(np.diff(sequence)) + 1
+    return np.concatenate(([0], changes)), np.concatenate(
+        (changes, [len(sequence)]))
+
+
+def runs_shift_areas(shortest: np.ndarray, longest: np.ndarray) -> np.ndarray:
+    """
+    Calculates the area between the shortest sequence and each window of the
+    longest sequence having the same length, one run of equal values of the
+    shortest sequence at a time. For each value v taken by the shortest
+    sequence, the cumulative sums of |v - y| over the longest sequence give the
+    area of a run at all the shifts with a single subtraction, so that the cost
+    is O((r + k) n), r being the number of runs and k the number of distinct
+    values, instead of O(m n).
+    :param shortest: the TPS distance of each beat of the shortest sequence,
+    as multiples of 0.5 so that the cumulative sums are exact
+    :type shortest: np.ndarray
+    :param longest: the TPS distance of each beat of the longest sequence,
+    as multiples of 0.5
+    :type longest: np.ndarray
+    :return: an array containing, for each shift of the shortest sequence over
+    the longest one, the sum of the absolute differences between the two.
+    """
+    if len(shortest) > len(longest):
+        raise ValueError('The shortest sequence is longer than the longest.')
+    shortest = np.asarray(shortest, dtype=np.float64)
+    longest = np.asarray(longest, dtype=np.float64)
+    shifts = len(longest) - len(shortest) + 1
+    starts, ends = runs(shortest)
+    values = shortest[starts]
+    areas = np.zeros(shifts)
+    for value in np.unique(values):
+        cumulative = np.concatenate(([0], np.cumsum(np.abs(value - longest))))
+        for start, end in zip(starts[values == value], ends[values == value]):
+            areas += cumulative[end:end + shifts] - \
+                cumulative[start:start + shifts]
+    return areas
+
+
+def fft_shift_areas(shortest: np.ndarray, longest: np.ndarray) -> np.ndarray:
+    """
+    Calculates the area between the shortest sequence and each window of the
+    longest sequence having the same length, by means of FFT correlations.
+    Given the sorted values v_0 < ... < v_k taken by the two sequences,
+    |x - y| is the sum of (v_j - v_j-1) for all the thresholds v_j exceeded by
+    only one of x and y. For each threshold, the number of mismatching beats at
+    every shift is obtained from the correlation of the indicator sequences,
+    so that the result is exact and is computed in O(k n log n).
+    :param shortest: the TPS distance of each beat of the shortest sequence,
+    as multiples of 0.5
+    :type shortest: np.ndarray
+    :param longest: the TPS distance of each beat of the longest sequence,
+    as multiples of 0.5
+    :type longest: np.ndarray
+    :return: an array containing, for each shift of the shortest sequence over
+    the longest one, the sum of the absolute differences between the two.
+    """
+    if len(shortest) > len(longest):
+        raise ValueError('The shortest sequence is longer than the longest.')
+    doubled_a = half_steps(shortest)
+    doubled_b = half_steps(longest)
+    shifts = len(longest) - len(shortest) + 1
+    size = 1 << (len(longest) + len(shortest) - 1).bit_length()
+    thresholds = np.union1d(doubled_a, doubled_b)
+    areas = np.zeros(shifts, dtype=np.int64)
+    for lower, threshold in zip(thresholds[:-1], thresholds[1:]):
+        indicator_a = (doubled_a >= threshold).astype(np.float64)
+        indicator_b = (doubled_b >= threshold).astype(np.float64)
+        window_b = np.concatenate(([0], np.cumsum(indicator_b)))
+        window_b = window_b[len(shortest):] - window_b[:shifts]
+        correlation = np.fft.irfft(np.fft.rfft(indicator_b, size) * np.conj(
+            np.fft.rfft(indicator_a, size)), size)[:shifts]
+        mismatches = indicator_a.sum() + window_b - 2 * correlation
+        areas += (threshold - lower) * np.rint(mismatches).astype(np.int64)
+    return areas / 2
+
+
+def select_method(shortest: np.ndarray, longest: np.ndarray,
+                  method: str = 'auto') -> str:
+    """
+    Chooses the engine comparing all the shifts of two sequences.
+    :param shortest: the TPS distance of each beat of the shortest sequence
+    :type shortest: np.ndarray
+    :param longest: the TPS distance of each beat of the longest sequence
+    :type longest: np.ndarray
+    :param method: the requested engine, or "auto" to choose among them
+    according to the number of beat comparisons and of runs, if the values are
+    half steps
+    :type method: str
+    :return: "sliding", "runs" or "fft".
+    """
+    if method not in METHODS:
+        raise ValueError(f'Unknown method "{method}", use one of {METHODS}')
+    if method != 'auto':
+        return method
+    comparisons = (len(longest) - len(shortest) + 1) * len(shortest)
+    if comparisons >= RUNS_CUTOFF and is_half_step(
+            shortest) and is_half_step(longest):
+        return 'fft' if comparisons >= FFT_CUTOFF and len(
+            runs(shortest)[0]) >= FFT_MIN_RUNS else 'runs'
+    return 'sliding'
+
+
+def compute_shift_areas(shortest: np.ndarray, longest: np.ndarray,
+                        method: str = 'auto') -> np.ndarray:
+    """
+    Calculates the area between the shortest sequence and each window of the
+    longest sequence having the same length, with the chosen engine.
+    :param shortest: the TPS distance of each beat of the shortest sequence
+    :type shortest: np.ndarray
+    :param longest: the TPS distance of each beat of the longest sequence
+    :type longest: np.ndarray
+    :param method: "sliding" to compare the sliding windows beat by beat,
+    "runs" to compare the runs of equal values, "fft" to use FFT
+    correlations, or "auto" to choose among them according to the number of
+    beat comparisons and of runs, if the values are half steps
+    :type method: str
+    :return: an array containing the area (not normalised) of each shift.
+    """
+    method = select_method(shortest, longest, method)
+    if INSTRUMENTATION.enabled:
+        shifts = max(0, len(longest) - len(shortest) + 1)
+        INSTRUMENTATION.count('shifts_evaluated', shifts)
+        INSTRUMENTATION.count('beats_compared', shifts * len(shortest))
+    with INSTRUMENTATION.stage(f'shift_areas_{method}'):
+        if method == 'fft':
+            return fft_shift_areas(shortest, longest)
+        if method == 'runs':
+            return runs_shift_areas(shortest, longest)
+        return shift_areas(shortest, longest)
+
+
+def bounded_minimum_area(shortest: np.ndarray, longest: np.ndarray,
+                         upper_bound: float) -> tuple[float, int]:
+    """
+    Finds the shift of the shortest sequence over the longest one that
+    minimises the area between the two, if such area does not exceed an upper
+    bound. All shifts are accumulated together, a block of beats at a time, and
+    a shift is abandoned as soon as its partial area exceeds the bound or the
+    area of the most promising shift, which is computed first.
+    :param shortest: the TPS distance of each beat of the shortest sequence
+    :type shortest: np.ndarray
+    :param longest: the TPS distance of each beat of the longest sequence
+    :type longest: np.ndarray
+    :param upper_bound: the maximum area (not normalised) of interest
+    :type upper_bound: float
+    :return: the minimum area (not normalised) and the first beat of the
+    longest sequence at which it is reached, or (inf, -1) if the area of all
+    shifts exceeds the upper bound.
+    """
+    if len(shortest) > len(longest):
+        raise ValueError('The shortest sequence is longer than the longest.')
+    windows = sliding_window_view(longest, len(shortest))
+    alive = np.arange(len(windows))
+    partial = np.abs(windows[:, :ABANDON_BLOCK] -
+                     shortest[:ABANDON_BLOCK]).sum(axis=1)
+    promising = int(np.argmin(partial))
+    best = min(upper_bound, float(np.abs(windows[promising] - shortest).sum()))
+    if INSTRUMENTATION.enabled:
+        INSTRUMENTATION.count('shifts_evaluated', len(windows))
+        INSTRUMENTATION.count('beats_compared', partial.size * min(
+            ABANDON_BLOCK, len(shortest)) + len(shortest))
+
+    for start in range(ABANDON_BLOCK, len(shortest), ABANDON_BLOCK):
+        kept = partial <= best
+        alive, partial = alive[kept], partial[kept]
+        if alive.size == 0:
+            return math.inf, -1
+        if INSTRUMENTATION.enabled:
+            INSTRUMENTATION.count('beats_compared', alive.size * min(
+                ABANDON_BLOCK, len(shortest) - start))
+        partial += np.abs(windows[alive, start:start + ABANDON_BLOCK] -
+                          shortest[start:start + ABANDON_BLOCK]).sum(axis=1)
+
+    position = int(np.argmin(partial))
+    if partial[position] > upper_bound:
+        return math.inf, -1
+    return float(partial[position]), int(alive[position])
+
+
+def minimum_area(shortest: np.ndarray, longest: np.ndarray,
+                 method: str = 'auto',
+                 upper_bound: Optional[float] = None) -> tuple[float, int]:
+    """
+    Finds the shift of the shortest sequence over the longest one that
+    minimises the area between the two.
+    :param shortest: the TPS distance of each beat of the shortest sequence
+    :type shortest: np.ndarray
+    :param longest: the TPS distance of each beat of the longest sequence
+    :type longest: np.ndarray
+    :param method: "sliding" to compare the sliding windows beat by beat,
+    "runs" to compare the runs of equal values, "fft" to use FFT
+    correlations, or "auto" to choose among them
+    :type method: str
+    :param upper_bound: if given, the maximum area (not normalised) of
+    interest, above which the sliding windows are abandoned when the sliding
+    engine is used
+    :type upper_bound: Optional[float]
+    :return: the minimum area (not normalised) and the first beat of the
+    longest sequence at which it is reached, or (inf, -1) if the area of all
+    shifts exceeds the upper bound.
+    """
+    # the bound only prunes the sliding windows, the other engines computing
+    # all the shifts at once
+    method = select_method(shortest, longest, method)
+    with INSTRUMENTATION.stage('minimum_area'):
+        if upper_bound is not None and method == 'sliding':
+            return bounded_minimum_area(shortest, longest, upper_bound)
+        areas = compute_shift_areas(shortest, longest, method)
+    offset = int(np.argmin(areas))
+    if upper_bound is not None and areas[offset] > upper_bound:
+        return math.inf, -1
+    return float(areas[offset]), offset
+
+
+def sequence_minimum_area(sequence_a: np.ndarray, sequence_b: np.ndarray,
+                          method: str = 'auto',
+                          upper_bound: Optional[float] = None) -> tuple[
+        float, int]:
+    """
+    Calculates the minimum area between two sequences, sliding the shortest
+    over the longest as done by TpsdComparison.
+    :param sequence_a: the TPS distance of each beat of the first sequence
+    :type sequence_a: np.ndarray
+    :param sequence_b: the TPS distance of each beat of the second sequence
+    :type sequence_b: np.ndarray
+    :param method: the engine used to compare all the shifts
+    :type method: str
+    :param upper_bound: if given, the maximum normalised area of interest
+    :type upper_bound: Optional[float]
+    :return: the minimum area normalised by the length of the shortest sequence
+    and the beat of the longest sequence at which it is reached, or (inf, -1)
+    if the minimum area exceeds the upper bound.
+    """
+    if len(sequence_a) >= len(sequence_b):
+        shortest, longest = sequence_b, sequence_a
+    else:
+        shortest, longest = sequence_a, sequence_b
+    minimum, offset = minimum_area(
+        shortest, longest, method, None if upper_bound is None else
+        normalised_bound(upper_bound, len(shortest)))
+    if minimum / len(shortest) > (math.inf if upper_bound is None else
+                                  upper_bound):
+        return math.inf, -1
+    return minimum / len(shortest), offset
+
+
+def normalised_bound(upper_bound: float, length: int) -> float:
+    """
+    Converts an upper bound on the normalised area into a bound on the area,
+    rounding it up so that no area within the normalised bound is abandoned.
+    :param upper_bound: the maximum normalised area of interest
+    :type upper_bound: float
+    :param length: the length of the shortest sequence
+    :type length: int
+    :return: the maximum area (not normalised) of interest.
+    """
+    return float(np.nextafter(upper_bound * length, math.inf))
+
+
+def cell_lower_bounds(shortest: np.ndarray, longest: np.ndarray,
+                      resolution: int, method: str = 'auto') -> np.ndarray:
+    """
+    Calculates a lower bound on the area of each shift of the shortest
+    sequence over the longest one, at a coarser resolution. The shortest
+    sequence is split in cells of the given number of beats, and since
+    sum |x - y| >= |sum x - sum y| over each cell, the difference between the
+    sum of each cell and the sum of the window of the longest sequence it
+    overlaps bounds the area from below. The shifts having the same remainder
+    modulo the resolution are compared at once, so that the cost is divided by
+    the resolution.
+    :param shortest: the TPS distance of each beat of the shortest sequence
+    :type shortest: np.ndarray
+    :param longest: the TPS distance of each beat of the longest sequence
+    :type longest: np.ndarray
+    :param resolution: the number of beats of each cell
+    :type resolution: int
+    :param method: the engine used to compare the cells with the windows
+    :type method: str
+    :return: an array containing a lower bound on the area (not normalised) of
+    each shift.
+    """
+    if len(shortest) > len(longest):
+        raise ValueError('The shortest sequence is longer than the longest.')
+    shifts = len(longest) - len(shortest) + 1
+    cells = len(shortest) // resolution
+    bounds = np.zeros(shifts)
+    if not cells:
+        return bounds
+    cell_sums = np.asarray(shortest[:cells * resolution],
+                           dtype=np.float64).reshape(cells, resolution).sum(
+        axis=1)
+    cumulative = np.concatenate(([0], np.cumsum(longest, dtype=np.float64)))
+    window_sums = cumulative[resolution:] - cumulative[:-resolution]
+    for remainder in range(min(resolution, shifts)):
+        count = len(range(remainder, shifts, resolution))
+        bounds[remainder::resolution] = compute_shift_areas(
+            cell_sums, window_sums[remainder::resolution][:count + cells - 1],
+            method)
+    return bounds
+
+
+def coarse_to_fine_minimum_area(shortest: np.ndarray, longest: np.ndarray,
+                                resolution: int = 4,
+                                candidates: Optional[int] = None,
+                                method: str = 'auto') -> tuple[
+        float, int, float]:
+    """
+    Finds the shift of the shortest sequence over the longest one that
+    minimises the area between the two, computing lower bounds on the area of
+    all the shifts at a coarse resolution and then the exact area of the most
+    promising shifts, in increasing order of bound, at beat resolution. The
+    refinement stops when the next bound exceeds the best area found, which is
+    then exact, or after the given number of candidates.
+    :param shortest: the TPS distance of each beat of the shortest sequence
+    :type shortest: np.ndarray
+    :param longest: the TPS distance of each beat of the longest sequence
+    :type longest: np.ndarray
+    :param resolution: the number of beats of the cells of the coarse stage
+    :type resolution: int
+    :param candidates: the maximum number of shifts refined at beat resolution,
+    or None to refine until the result is exact
+    :type candidates: Optional[int]
+    :param method: the engine used to compute the lower bounds
+    :type method: str
+    :return: the minimum area found (not normalised), the first beat of the
+    longest sequence at which it is reached, and the maximum error with respect
+    to the exact minimum area (0 if the result is exact).
+    """
+    # pylint: disable=too-many-locals
+    bounds = cell_lower_bounds(shortest, longest, resolution, method)
+    order = np.argsort(bounds, kind='stable')
+    windows = sliding_window_view(longest, len(shortest))
+    limit = len(order) if candidates is None else max(1, candidates)
+    best, offset = math.inf, -1
+    refined, batch = 0, 16
+    while refined < min(limit, len(order)) and bounds[order[refined]] <= best:
+        chunk = order[refined:min(refined + batch, limit)]
+        areas = np.abs(windows[chunk] - shortest).sum(axis=1)
+        for position in np.lexsort((chunk, areas))[:1]:
+            if (areas[position], chunk[position]) < (best, offset) or \
+                    offset < 0:
+                best, offset = float(areas[position]), int(chunk[position])
+        refined += len(chunk)
+        batch *= 2
+    if refined == len(order) or bounds[order[refined]] > best:
+        return best, offset, 0.0
+    return best, offset, max(0.0, best - float(bounds[order[refined]]))
+
+
+def sequence_coarse_to_fine_minimum_area(
+        sequence_a: np.ndarray, sequence_b: np.ndarray, resolution: int = 4,
+        candidates: Optional[int] = None,
+        method: str = 'auto') -> tuple[float, int, float]:
+    """
+    Calculates the minimum area between two sequences by means of
+    coarse_to_fine_minimum_area(), sliding the shortest over the longest as
+    done by TpsdComparison.
+    :param sequence_a: the TPS distance of each beat of the first sequence
+    :type sequence_a: np.ndarray
+    :param sequence_b: the TPS distance of each beat of the second sequence
+    :type sequence_b: np.ndarray
+    :param resolution: the number of beats of the cells of the coarse stage
+    :type resolution: int
+    :param candidates: the maximum number of shifts refined at beat resolution,
+    or None to refine until the result is exact
+    :type candidates: Optional[int]
+    :param method: the engine used to compute the lower bounds
+    :type method: str
+    :return: the minimum area and the maximum error, both normalised by the
+    length of the shortest sequence, and the beat of the longest sequence at
+    which the area is reached.
+    """
+    if len(sequence_a) >= len(sequence_b):
+        shortest, longest = sequence_b, sequence_a
+    else:
+        shortest, longest = sequence_a, sequence_b
+    minimum, offset, error = coarse_to_fine_minimum_area(
+        shortest, longest, resolution, candidates, method)
+    return minimum / len(shortest), offset, error / len(shortest)
@@ -0,0 +1,183 @@
+"""
+This file contains a cache of the TPS distances between chords and keys, to
+support the implementation of the Tonal Pitch Step Distance (TPSD) algorithm
+as presented in:
+
+De Haas, W.B., Veltkamp, R.C., Wiering, F.: Tonal pitch step distance: a
+similarity measure for chord progressions.
+In: ISMIR. pp. 51–56 (2008)
+
+Author: Andrea Poltronieri (University of Bologna) and Jacopo de Berardinis
+(King's College of London)
+Copyright: 2022 Andrea Poltronieri and Jacopo de Berardinis
+License: MIT license
+"""
+from collections import OrderedDict
+from typing import NamedTuple
+
+from tpsd.canonical import CanonicalChord, canonical_chord, \
+    canonical_distance
+
+
+class CacheEntry(NamedTuple):
+    """
+    A cached chord, expressed relative to the tonic of its key, and its TPS
+    distance from the tonic triad of that key.
+    """
+    chord: CanonicalChord
+    distance: float
+
+
+def normalise_label(chord: str) -> str:
+    """
+    Normalises a chord label expressed using the Harte notation.
+    :param chord: the chord label
+    :return: the label without surrounding whitespaces.
+    """
+    return chord.strip()
+
+
+def normalise_key(key: str) -> str:
+    """
+    Normalises a key, adding the major mode when no mode is given.
+    :param key: the key label (e.g. "C" or "C:min")
+    :return: the key label including its mode (e.g. "C:maj" or "C:min").
+    """
+    key = key.strip()
+    return key if ':' in key else f'{key}:maj'
+
+
+class TpsCache:
+    """
+    Least-recently-used cache of the TPS distances between chords and the tonic
+    triad of their keys. Chords are cached relative to the tonic of their keys,
+    so that transposed chords (e.g. G:7 in C:maj and A:7 in D:maj) share the
+    same entry. The labels already parsed are also kept, within the same size
+    bound, so that each (chord, key) label is parsed once.
+    """
+    # pylint: disable=too-many-instance-attributes
+
+    def __init__(self, maxsize: int = 4096) -> None:
+        """
+        Initialises an empty cache.
+        :param maxsize: the maximum number of canonical chords, and of parsed
+        labels, to be kept, after which the least recently used ones are
+        evicted
+        :type maxsize: int
+        :return: None
+        """
+        if maxsize < 1:
+            raise ValueError('The size of the cache must be positive.')
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.parses = 0
+        self.label_evictions = 0
+        self._entries = OrderedDict()
+        self._labels = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def lookup(self, chord: str, key: str) -> CacheEntry:
+        """
+        Gets the parsed chord and its TPS distance from the key, computing them
+        if they are not cached yet.
+        :param chord: a chord expressed using the Harte notation
+        :param key: the key of the chord
+        :return: the cached entry of the chord in the given key.
+        """
+        cache_key = self.canonical(chord, key)
+        entry = self._entries.get(cache_key)
+        if entry is not None:
+            self.hits += 1
+            self._entries.move_to_end(cache_key)
+            return entry
+
+        self.misses += 1
+        entry = CacheEntry(cache_key, canonical_distance(cache_key))
+        self._entries[cache_key] = entry
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        return entry
+
+    def canonical(self, chord: str, key: str) -> CanonicalChord:
+        """
+        Gets a chord relative to the tonic of its key, parsing the label if it
+        is not cached yet.
+        :param chord: a chord expressed using the Harte notation
+        :param key: the key of the chord
+        :return: the canonical chord.
+        """
+        label = (normalise_label(chord), normalise_key(key))
+        canonical = self._labels.get(label)
+        if canonical is not None:
+            self._labels.move_to_end(label)
+            return canonical
+
+        self.parses += 1
+        canonical = self._labels[label] = canonical_chord(*label)
+        if len(self._labels) > self.maxsize:
+            self._labels.popitem(last=False)
+            self.label_evictions += 1
+        return canonical
+
+    def distance(self, chord: str, key: str) -> float:
+        """
+        Gets the TPS distance between a chord and the tonic triad of its key.
+        :param chord: a chord expressed using the Harte notation
+        :param key: the key of the chord
+        :return: the TPS distance between the chord and the key.
+        """
+        return self.lookup(chord, key).distance
+
+    def resize(self, maxsize: int) -> None:
+        """
+        Changes the size bound of the cache, evicting entries if needed.
+        :param maxsize: the new maximum number of entries
+        :return: None
+        """
+        if maxsize < 1:
+            raise ValueError('The size of the cache must be positive.')
+        self.maxsize = maxsize
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        while len(self._labels) > self.maxsize:
+            self._labels.popitem(last=False)
+            self.label_evictions += 1
+
+    def clear(self) -> None:
+        """
+        Removes all the entries and the parsed labels of the cache and resets
+        its counters.
+        :return: None
+        """
+        self._entries.clear()
+        self._labels.clear()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.parses = 0
+        self.label_evictions = 0
+
+    def stats(self) -> dict:
+        """
+        Reports the usage of the cache.
+        :return: a dictionary containing the number of hits, misses and
+        evictions, the current and maximum size and the hit rate of the
+        distances, and the number of parsed labels kept, parsed and evicted.
+        """
+        lookups = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses,
+                'evictions': self.evictions, 'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'labels': len(self._labels), 'parses': self.parses,
+                'label_evictions': self.label_evictions}
+
+
+# cache shared by default among all the Tpsd instances
+DEFAULT_CACHE = TpsCache()
@@ -0,0 +1,157 @@
+"""
+This file contains a transposition-invariant encoding of the chords, relative
+to the tonic of their key, so that the TPS distances computed by the Tonal
+Pitch Step Distance (TPSD) algorithm are shared among all keys. The algorithm
+is presented in:
+
+De Haas, W.B., Veltkamp, R.C., Wiering, F.: Tonal pitch step distance: a
+similarity measure for chord progressions.
+In: ISMIR. pp. 51–56 (2008)
+
+Author: Andrea Poltronieri (University of Bologna) and Jacopo de Berardinis
+(King's College of London)
+Copyright: 2022 Andrea Poltronieri and Jacopo de Berardinis
+License: MIT license
+"""
+from typing import Callable, NamedTuple, Union
+
+from harte.exceptions import ChordEmptyError
+from harte.harte import Harte
+
+from tpsd.instrumentation import INSTRUMENTATION
+from tpsd.tps import KEYS, POPCOUNT, SCALE_MASKS, Tps, level_masks, \
+    pitch_class_mask
+from tpsd.tps_comparison import circle_fifth_distance
+
+
+# tonic triads of the major and minor modes, built on C
+KEY_TRIADS = {'maj': pitch_class_mask((0, 4, 7)),
+              'min': pitch_class_mask((0, 3, 7))}
+
+
+class CanonicalChord(NamedTuple):
+    """
+    A chord expressed relative to the tonic of its key. The distance from the
+    tonic triad only depends on the pitch classes of the chord relative to the
+    tonic and on the mode, except for the circle of fifths rule, which compares
+    the pitch classes of the roots without wrapping them: wrapped tells whether
+    the root of the chord is above the one of the key.
+    """
+    mode: str
+    tones: int
+    root: int
+    wrapped: bool
+
+
+def transpose_mask(mask: int, semitones: int) -> int:
+    """
+    Transposes a 12-bit mask of pitch classes.
+    :param mask: the mask to be transposed
+    :param semitones: the number of semitones (also negative) of the
+    transposition
+    :return: the mask of the transposed pitch classes.
+    """
+    semitones %= 12
+    return (mask << semitones | mask >> 12 - semitones) & (1 << 12) - 1
+
+
+def parse_chord(chord: str) -> tuple[int, int]:
+    """
+    Parses a chord expressed using the Harte notation. The parsed labels are
+    memoized by TpsCache.
+    :param chord: the chord label
+    :return: the pitch class of the root of the chord and the mask of its
+    pitch classes.
+    """
+    INSTRUMENTATION.count('chords_parsed')
+    try:
+        with INSTRUMENTATION.stage('harte_parsing'):
+            harte = Harte(chord)
+            tones = harte.pitchClasses
+    except ChordEmptyError as exc:
+        raise ValueError('The entered chord is empty.') from exc
+    return harte.root().pitchClass, pitch_class_mask(tones)
+
+
+def key_triad(mode: str) -> int:
+    """
+    Gets the tonic triad of a mode, which is not counted among the parsed
+    chords since it is not part of any sequence.
+    :param mode: the mode of the key (e.g. "maj" or "min")
+    :return: the mask of the pitch classes of the triad built on C.
+    """
+    triad = KEY_TRIADS.get(mode)
+    if triad is None:
+        triad = pitch_class_mask(Harte(f'C:{mode}').pitchClasses)
+    return triad
+
+
+def parse_key(key: str) -> tuple[int, str]:
+    """
+    Parses a key, validating it as done by Tps.
+    :param key: the key label (e.g. "C" or "C:min")
+    :return: the pitch class of the tonic and the mode of the key, the mode
+    defaulting to "maj".
+    """
+    if ':' not in key:
+        key += ':maj'
+    key_root, key_mode = key.split(':')
+    assert key_mode[:3].lower() in KEYS, 'The entered key mode is not valid.'
+    if key_root in ('N', ''):
+        raise ValueError(f'The entered key "{key}" root is not valid.')
+    return Tps.note_index(key_root), key_mode
+
+
+def canonical_chord(chord: str, key: str) -> CanonicalChord:
+    """
+    Encodes a chord relative to the tonic of its key.
+    :param chord: a chord expressed using the Harte notation
+    :param key: the key of the chord
+    :return: the canonical chord, the same for all the transpositions of the
+    chord and of the key in which the roots do not cross the octave boundary.
+    """
+    tonic, mode = parse_key(key)
+    root, tones = parse_chord(chord)
+    return CanonicalChord(mode, transpose_mask(tones, -tonic),
+                          (root - tonic) % 12, root > tonic)
+
+
+def canonical_distance(chord: CanonicalChord) -> float:
+    """
+    Calculates the TPS distance between a canonical chord and the tonic triad
+    of its key, as done by TpsComparison with the chord and the key triad.
+    :param chord: the canonical chord
+    :return: the TPS distance between the chord and the key.
+    """
+    INSTRUMENTATION.count('tps_evaluations')
+    scale = SCALE_MASKS[(0, chord.mode[:3].lower())]
+    triad = key_triad(chord.mode)
+    distance = 0
+    for mask_a, mask_b in zip(level_masks(scale, chord.tones, chord.root),
+                              level_masks(scale, triad, 0)):
+        distance += POPCOUNT[mask_a ^ mask_b]
+    if chord.wrapped:
+        fifths = circle_fifth_distance(chord.root, 0)
+    else:
+        fifths = circle_fifth_distance(0, -chord.root % 12)
+    return distance / 2 + fifths
+
+
+def canonical_sequence(chord_sequence: list[str], keys: Union[str, list[str]],
+                       timing_information: list[int],
+                       encode: Callable[[str, str], CanonicalChord] =
+                       canonical_chord) -> tuple:
+    """
+    Encodes a chord sequence relative to its keys, so that the transposed
+    versions of a song, having the same profile, get the same encoding.
+    :param chord_sequence: a list of chords expressed using the Harte notation
+    :param keys: the key(s) of the chord sequence
+    :param timing_information: the duration (in beats) of each chord
+    :param encode: the function encoding each chord in its key, e.g. the
+    canonical() method of a TpsCache to reuse the parsed labels
+    :return: a hashable tuple of (canonical chord, duration) pairs.
+    """
+    if isinstance(keys, str):
+        keys = [keys] * len(chord_sequence)
+    return tuple((encode(chord, key), beats) for chord, key, beats in
+                 zip(chord_sequence, keys, timing_information))
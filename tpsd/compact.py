@@ -0,0 +1,289 @@
+"""
+This file contains a compact, array-backed representation of the songs
+compared by means of the Tonal Pitch Step Distance (TPSD) algorithm as
+presented in:
+
+De Haas, W.B., Veltkamp, R.C., Wiering, F.: Tonal pitch step distance: a
+similarity measure for chord progressions.
+In: ISMIR. pp. 51–56 (2008)
+
+Author: Andrea Poltronieri (University of Bologna) and Jacopo de Berardinis
+(King's College of London)
+Copyright: 2022 Andrea Poltronieri and Jacopo de Berardinis
+License: MIT license
+"""
+from typing import Optional, Union
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from tpsd import area
+from tpsd.cache import TpsCache
+from tpsd.canonical import canonical_chord, canonical_distance
+from tpsd.profile import TpsdProfile
+
+# maximum number of labels of a vocabulary and maximum duration of a chord
+MAX_UINT16 = (1 << 16) - 1
+
+
+class LabelVocabulary:
+    """
+    Bidirectional mapping between the labels of the chords and keys and the
+    integer identifiers stored by the compact songs.
+    """
+    __slots__ = ('labels', '_ids')
+
+    def __init__(self) -> None:
+        """
+        Initialises an empty vocabulary.
+        :return: None
+        """
+        self.labels = []
+        self._ids = {}
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    def encode(self, label: str) -> int:
+        """
+        Gets the identifier of a label, adding the label if it is new.
+        :param label: a chord or key label
+        :type label: str
+        :return: the identifier of the label.
+        """
+        label_id = self._ids.get(label)
+        if label_id is None:
+            if len(self.labels) > MAX_UINT16:
+                raise OverflowError('The vocabulary cannot contain more than '
+                                    f'{MAX_UINT16 + 1} labels.')
+            label_id = self._ids[label] = len(self.labels)
+            self.labels.append(label)
+        return label_id
+
+    def decode(self, label_id: int) -> str:
+        """
+        Gets the label having a given identifier.
+        :param label_id: the identifier of the label
+        :type label_id: int
+        :return: the label.
+        """
+        return self.labels[label_id]
+
+
+class CompactSong:
+    """
+    Chord sequence stored as arrays of small integers: chord identifiers into a
+    shared vocabulary and durations as uint16, keys as run-length segments and
+    the TPS distances as uint8 doubled values (all distances being multiples of
+    0.5), so that the areas are computed with exact integer arithmetic.
+    """
+    __slots__ = ('vocabulary', 'chords', 'timings', 'key_starts', 'key_ids',
+                 '_doubled')
+
+    def __init__(self, chord_sequence: list[str], keys: Union[str, list[str]],
+                 timing_information: list[int],
+                 vocabulary: Optional[LabelVocabulary] = None) -> None:
+        """
+        Encodes a chord sequence.
+        :param chord_sequence: a list of chords expressed using the Harte
+        notation
+        :type chord_sequence: list[str]
+        :param keys: the key(s) of the chord sequence
+        :type keys: Union[str, list[str]]
+        :param timing_information: the duration (in beats) of each chord
+        :type timing_information: list[int]
+        :param vocabulary: the vocabulary of the labels, shared among all songs
+        by default
+        :type vocabulary: Optional[LabelVocabulary]
+        :return: None
+        """
+        if isinstance(keys, str):
+            keys = [keys] * len(chord_sequence)
+        if not len(chord_sequence) == len(timing_information) == len(keys):
+            raise ValueError("Size mismatch: cannot compute TSPD profile")
+        if any(beats < 0 or beats > MAX_UINT16 for beats in timing_information):
+            raise OverflowError('Durations must be between 0 and '
+                                f'{MAX_UINT16} beats.')
+        self.vocabulary = DEFAULT_VOCABULARY if vocabulary is None else \
+            vocabulary
+        self.chords = np.fromiter(
+            (self.vocabulary.encode(chord) for chord in chord_sequence),
+            dtype=np.uint16, count=len(chord_sequence))
+        self.timings = np.asarray(timing_information, dtype=np.uint16)
+        starts = [position for position in range(len(keys))
+                  if not position or keys[position] != keys[position - 1]]
+        self.key_starts = np.asarray(starts, dtype=np.uint32)
+        self.key_ids = np.fromiter(
+            (self.vocabulary.encode(keys[start]) for start in starts),
+            dtype=np.uint16, count=len(starts))
+        self._doubled = None
+
+    def __len__(self) -> int:
+        return len(self.chords)
+
+    @property
+    def nbytes(self) -> int:
+        """
+        The number of bytes used by the arrays of the song.
+        """
+        doubled = 0 if self._doubled is None else self._doubled.nbytes
+        return self.chords.nbytes + self.timings.nbytes + \
+            self.key_starts.nbytes + self.key_ids.nbytes + doubled
+
+    @property
+    def chord_sequence(self) -> list[str]:
+        """
+        The labels of the chords of the song.
+        """
+        return [self.vocabulary.decode(chord) for chord in self.chords]
+
+    @property
+    def keys(self) -> list[str]:
+        """
+        The key of each chord of the song.
+        """
+        repeats = np.diff(np.append(self.key_starts, len(self)))
+        return [self.vocabulary.decode(key) for key in
+                np.repeat(self.key_ids, repeats)]
+
+    @property
+    def timing_information(self) -> list[int]:
+        """
+        The duration (in beats) of each chord of the song.
+        """
+        return self.timings.tolist()
+
+    def doubled_distances(self,
+                          cache: Optional[TpsCache] = None) -> np.ndarray:
+        """
+        Calculates twice the TPS distance between each chord and the triad of
+        its key, once per distinct (chord, key) pair of the song.
+        :param cache: the cache of the TPS distances between chords and keys,
+        or None to compute them from the canonical chords
+        :type cache: Optional[TpsCache]
+        :return: an uint8 array containing the doubled distance of each chord.
+        """
+        if self._doubled is None:
+            key_ids = np.repeat(self.key_ids, np.diff(
+                np.append(self.key_starts, len(self))))
+            pairs, inverse = np.unique(
+                self.chords.astype(np.uint32) << 16 | key_ids,
+                return_inverse=True)
+            doubled = np.empty(len(pairs), dtype=np.uint8)
+            for index, pair in enumerate(pairs.tolist()):
+                chord = self.vocabulary.decode(pair >> 16)
+                key = self.vocabulary.decode(pair & MAX_UINT16)
+                distance = cache.distance(chord, key) if cache is not None \
+                    else canonical_distance(canonical_chord(chord, key))
+                doubled[index] = int(distance * 2)
+            self._doubled = doubled[inverse.reshape(-1)]
+        return self._doubled
+
+    def doubled_sequence(self,
+                         cache: Optional[TpsCache] = None) -> np.ndarray:
+        """
+        Expands the doubled TPS distances to one value per beat.
+        :param cache: the cache of the TPS distances between chords and keys
+        :type cache: Optional[TpsCache]
+        :return: an int16 array containing twice the TPS distance of each
+        beat.
+        """
+        return np.repeat(self.doubled_distances(cache).astype(np.int16),
+                         self.timings)
+
+    def profile(self, cache: Optional[TpsCache] = None) -> TpsdProfile:
+        """
+        Builds the run-length profile of the song.
+        :param cache: the cache of the TPS distances between chords and keys
+        :type cache: Optional[TpsCache]
+        :return: the profile of the song, as computed by Tpsd.
+        """
+        return TpsdProfile((self.doubled_distances(cache) / 2).tolist(),
+                           self.timings.tolist())
+
+
+def integer_shift_areas(values: np.ndarray, durations: np.ndarray,
+                        longest: np.ndarray) -> np.ndarray:
+    """
+    Calculates the area between a run-length sequence of integers and each
+    window of a longer sequence having the same length, with integer
+    arithmetic. The areas are accumulated run by run from the cumulative sums
+    of |v - y| over the longest sequence (one per distinct value v) when this
+    is cheaper than comparing the windows beat by beat.
+    :param values: the value of each run of the shortest sequence
+    :type values: np.ndarray
+    :param durations: the length of each run of the shortest sequence
+    :type durations: np.ndarray
+    :param longest: the value of each beat of the longest sequence
+    :type longest: np.ndarray
+    :return: an int64 array containing, for each shift of the shortest
+    sequence over the longest one, the sum of the absolute differences.
+    """
+    # pylint: disable=too-many-locals
+    length = int(durations.sum())
+    if length > len(longest):
+        raise ValueError('The shortest sequence is longer than the longest.')
+    shifts = len(longest) - length + 1
+    longest = longest.astype(np.int16, copy=False)
+    distinct = np.unique(values)
+    if (len(values) + len(distinct)) * 2 >= length:
+        windows = sliding_window_view(longest, length)
+        shortest = np.repeat(values.astype(np.int16), durations)
+        areas = np.empty(shifts, dtype=np.int64)
+        block = max(1, area.BLOCK_ELEMENTS // length)
+        for start in range(0, shifts, block):
+            areas[start:start + block] = np.abs(
+                windows[start:start + block] - shortest).sum(axis=1,
+                                                             dtype=np.int64)
+        return areas
+    ends = np.cumsum(durations, dtype=np.int64)
+    starts = ends - durations
+    areas = np.zeros(shifts, dtype=np.int64)
+    for value in distinct:
+        cumulative = np.concatenate(([0], np.cumsum(
+            np.abs(longest - value), dtype=np.int64)))
+        selected = values == value
+        for start, end in zip(starts[selected], ends[selected]):
+            areas += cumulative[end:end + shifts] - \
+                cumulative[start:start + shifts]
+    return areas
+
+
+def compact_minimum_area(song_a: CompactSong, song_b: CompactSong,
+                         method: str = 'auto',
+                         cache: Optional[TpsCache] = None) -> tuple[float, int]:
+    """
+    Calculates the minimum area between two compact songs, comparing their
+    doubled distances with integer arithmetic.
+    :param song_a: the first song
+    :type song_a: CompactSong
+    :param song_b: the second song
+    :type song_b: CompactSong
+    :param method: "auto" to use the integer engine, or one of the engines of
+    area.compute_shift_areas() applied to the doubled distances
+    :type method: str
+    :param cache: the cache of the TPS distances between chords and keys
+    :type cache: Optional[TpsCache]
+    :return: the minimum area normalised by the length of the shortest song, as
+    computed by TpsdComparison, and the offset at which it is reached.
+    """
+    if method not in area.METHODS:
+        raise ValueError(
+            f'Unknown method "{method}", use one of {area.METHODS}')
+    length_a, length_b = int(song_a.timings.sum()), int(song_b.timings.sum())
+    shortest, longest = (song_b, song_a) if length_a >= length_b else \
+        (song_a, song_b)
+    if method == 'auto':
+        areas = integer_shift_areas(shortest.doubled_distances(cache),
+                                    shortest.timings,
+                                    longest.doubled_sequence(cache))
+    else:
+        areas = area.compute_shift_areas(shortest.doubled_sequence(cache),
+                                         longest.doubled_sequence(cache),
+                                         method)
+    offset = int(np.argmin(areas))
+    return float(areas[offset]) / 2 / min(length_a, length_b), offset
+
+
+# vocabulary shared by default among all the compact songs
+DEFAULT_VOCABULARY = LabelVocabulary()
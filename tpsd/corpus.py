@@ -0,0 +1,410 @@
+"""
+This file contains the comparison of whole corpora of chord sequences by means
+of the Tonal Pitch Step Distance (TPSD) algorithm as presented in:
+
+De Haas, W.B., Veltkamp, R.C., Wiering, F.: Tonal pitch step distance: a
+similarity measure for chord progressions.
+In: ISMIR. pp. 51–56 (2008)
+
+Author: Andrea Poltronieri (University of Bologna) and Jacopo de Berardinis
+(King's College of London)
+Copyright: 2022 Andrea Poltronieri and Jacopo de Berardinis
+License: MIT license
+"""
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Callable, Iterable, Iterator, Optional, Union
+
+import numpy as np
+
+from tpsd import area
+from tpsd.cache import DEFAULT_CACHE, TpsCache
+from tpsd.canonical import canonical_chord, canonical_sequence
+from tpsd.instrumentation import INSTRUMENTATION, run_instrumented
+from tpsd.matrix_store import DistanceMatrixStore, matrix_tiles
+from tpsd.profile import TpsdProfile
+from tpsd.result_cache import ResultCache, pair_key, profile_hash
+from tpsd.tpsd_core import Tpsd
+
+Song = tuple[list[str], Union[str, list[str]], list[int]]
+
+# profiles shared with the worker processes, set once by _init_worker
+_WORKER_PROFILES = None
+
+
+def _init_worker(sequences: np.ndarray, bounds: np.ndarray) -> None:
+    """
+    Stores the profiles of the corpus in a worker process, so that they are
+    transferred once per worker instead of once per pair.
+    :param sequences: the concatenation of the TPS distances of all songs
+    :param bounds: the index at which each song starts, followed by the total
+    length
+    :return: None
+    """
+    global _WORKER_PROFILES  # pylint: disable=global-statement
+    _WORKER_PROFILES = (sequences, bounds)
+
+
+def _clear_worker() -> None:
+    """
+    Releases the profiles stored by _init_worker, once the current process is
+    done with them.
+    :return: None
+    """
+    global _WORKER_PROFILES  # pylint: disable=global-statement
+    _WORKER_PROFILES = None
+
+
+def _compare_tile(tile: tuple[int, int, int, int], symmetric: bool,
+                  method: str) -> tuple[tuple[int, int, int, int], np.ndarray]:
+    """
+    Calculates the minimum areas between the songs of a tile of the matrix.
+    :param tile: the first and last (excluded) row and column of the tile
+    :param symmetric: whether to compute only the pairs above the diagonal
+    :param method: the engine used to compare all the shifts
+    :return: the tile and the block of minimum areas.
+    """
+    sequences, bounds = _WORKER_PROFILES
+    row_start, row_stop, column_start, column_stop = tile
+    block = np.zeros((row_stop - row_start, column_stop - column_start))
+    for row in range(row_start, row_stop):
+        sequence_a = sequences[bounds[row]:bounds[row + 1]]
+        for column in range(column_start, column_stop):
+            if row == column or (symmetric and column < row):
+                continue
+            block[row - row_start, column - column_start] = \
+                area.sequence_minimum_area(
+                    sequence_a, sequences[bounds[column]:bounds[column + 1]],
+                    method)[0]
+    return tile, block
+
+
+def _compare_pairs(pairs: list[tuple[int, int]],
+                   method: str) -> tuple[list[tuple[int, int]], list[float]]:
+    """
+    Calculates the minimum areas between some pairs of songs.
+    :param pairs: the indices of the two songs of each pair
+    :param method: the engine used to compare all the shifts
+    :return: the pairs and their minimum areas.
+    """
+    sequences, bounds = _WORKER_PROFILES
+    return pairs, [area.sequence_minimum_area(
+        sequences[bounds[row]:bounds[row + 1]],
+        sequences[bounds[column]:bounds[column + 1]], method)[0]
+        for row, column in pairs]
+
+
+class TpsdCorpus:
+    """
+    Collection of chord sequences whose TPSD profiles are computed once and
+    compared pairwise.
+    """
+
+    def __init__(self, songs: Iterable[Song],
+                 cache: Optional[TpsCache] = DEFAULT_CACHE) -> None:
+        """
+        Computes the profile of each song of the corpus. The transposed
+        versions of a song share the same profile, which is computed once.
+        :param songs: the songs of the corpus, each one expressed as a tuple
+        containing the chord sequence, the key(s) and the duration of each chord
+        :type songs: Iterable[Song]
+        :param cache: the cache of the TPS distances between chords and keys
+        :type cache: Optional[TpsCache]
+        :return: None
+        """
+        profiles = {}
+        self.profiles = []
+        encode = canonical_chord if cache is None else cache.canonical
+        for chords, keys, timings in songs:
+            tpsd = Tpsd(chords, keys, timings, cache)
+            canonical = canonical_sequence(
+                tpsd.chord_sequence, tpsd.keys, tpsd.timing_information,
+                encode)
+            if canonical not in profiles:
+                profiles[canonical] = tpsd.profile()
+            self.profiles.append(profiles[canonical])
+
+    @classmethod
+    def from_profiles(cls, profiles: Iterable[TpsdProfile]) -> 'TpsdCorpus':
+        """
+        Builds a corpus from already computed profiles.
+        :param profiles: the profiles of the songs
+        :type profiles: Iterable[TpsdProfile]
+        :return: the corpus containing the profiles.
+        """
+        corpus = cls([])
+        corpus.profiles = list(profiles)
+        return corpus
+
+    def __len__(self) -> int:
+        return len(self.profiles)
+
+    def flatten(self) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Concatenates the expanded profiles of all songs in a single array.
+        :return: the array containing the TPS distance of each beat of all the
+        songs, and the index at which each song starts followed by the total
+        length.
+        """
+        lengths = [len(profile) for profile in self.profiles]
+        bounds = np.concatenate(([0], np.cumsum(lengths))).astype(np.int64)
+        if not self.profiles:
+            return np.empty(0), bounds
+        return np.concatenate([profile.to_array() for profile in
+                               self.profiles]), bounds
+
+    def tiles(self, tile_size: int,
+              symmetric: bool = True) -> list[tuple[int, int, int, int]]:
+        """
+        Splits the distance matrix in square tiles.
+        :param tile_size: the number of rows and columns of each tile
+        :type tile_size: int
+        :param symmetric: whether to keep only the tiles intersecting the upper
+        triangle of the matrix
+        :type symmetric: bool
+        :return: a list containing the first and last (excluded) row and column
+        of each tile.
+        """
+        return matrix_tiles(len(self.profiles), tile_size, symmetric)
+
+    def distance_matrix(self, symmetric: bool = True, tile_size: int = 64,
+                        workers: Optional[int] = None,
+                        progress: Optional[Callable[[int, int], None]] = None,
+                        method: str = 'auto',
+                        result_cache: Optional[ResultCache] = None) -> np.ndarray:
+        """
+        Calculates the minimum area between each pair of songs of the corpus.
+        :param symmetric: whether to compute only the pairs above the diagonal,
+        mirroring them below it, since the minimum area does not depend on the
+        order of the two songs
+        :type symmetric: bool
+        :param tile_size: the number of rows and columns of the matrix computed
+        by each task
+        :type tile_size: int
+        :param workers: the number of worker processes, defaulting to the
+        number of CPUs. With 0 or 1 worker the matrix is computed in the
+        current process.
+        :type workers: Optional[int]
+        :param progress: a function called with the number of completed tiles
+        and the total number of tiles each time a tile is completed
+        :type progress: Optional[Callable[[int, int], None]]
+        :param method: the engine used to compare all the shifts
+        :type method: str
+        :param result_cache: if given, the persistent cache of the minimum
+        areas, from which the pairs already computed are read
+        :type result_cache: Optional[ResultCache]
+        :return: the square matrix of the minimum areas between the songs.
+        """
+        # pylint: disable=too-many-arguments,too-many-positional-arguments
+        size = len(self.profiles)
+        matrix = np.zeros((size, size))
+        for tile, block in self.compute_tiles(self.tiles(tile_size, symmetric),
+                                              symmetric, workers, progress,
+                                              method, result_cache):
+            row_start, row_stop, column_start, column_stop = tile
+            matrix[row_start:row_stop, column_start:column_stop] = block
+            if symmetric:
+                matrix[column_start:column_stop, row_start:row_stop] = block.T
+        return matrix
+
+    def fill_store(self, store: DistanceMatrixStore,
+                   workers: Optional[int] = None,
+                   progress: Optional[Callable[[int, int], None]] = None,
+                   method: str = 'auto',
+                   result_cache: Optional[ResultCache] = None) -> \
+            DistanceMatrixStore:
+        """
+        Writes the minimum area between each pair of songs of the corpus into a
+        memory-mapped matrix, computing only the tiles not completed yet, so
+        that an interrupted computation is resumed.
+        :param store: the matrix to be filled, having the size of the corpus
+        :type store: DistanceMatrixStore
+        :param workers: the number of worker processes, defaulting to the
+        number of CPUs
+        :type workers: Optional[int]
+        :param progress: a function called with the number of completed tiles
+        and the number of tiles pending when the computation started
+        :type progress: Optional[Callable[[int, int], None]]
+        :param method: the engine used to compare all the shifts
+        :type method: str
+        :param result_cache: if given, the persistent cache of the minimum
+        areas, from which the pairs already computed (e.g. by a previous
+        experiment on an overlapping corpus) are read
+        :type result_cache: Optional[ResultCache]
+        :return: the filled store.
+        """
+        if store.size != len(self.profiles):
+            raise ValueError("Size mismatch: the matrix does not fit the corpus")
+        for tile, block in self.compute_tiles(store.pending_tiles(),
+                                              store.symmetric, workers,
+                                              progress, method, result_cache):
+            store.write_tile(tile, block)
+        return store
+
+    def compute_tiles(self, tiles: list[tuple[int, int, int, int]],
+                      symmetric: bool = True, workers: Optional[int] = None,
+                      progress: Optional[Callable[[int, int], None]] = None,
+                      method: str = 'auto',
+                      result_cache: Optional[ResultCache] = None) -> Iterator[
+            tuple[tuple[int, int, int, int], np.ndarray]]:
+        """
+        Computes the given tiles of the distance matrix, in a pool of processes
+        if more than one worker is requested, yielding them as soon as they are
+        completed.
+        :param tiles: the first and last (excluded) row and column of each tile
+        :type tiles: list[tuple[int, int, int, int]]
+        :param symmetric: whether to compute only the pairs above the diagonal.
+        The tiles on the diagonal are then mirrored on themselves.
+        :type symmetric: bool
+        :param workers: the number of worker processes, defaulting to the
+        number of CPUs
+        :type workers: Optional[int]
+        :param progress: a function called with the number of completed tiles
+        and the total number of tiles each time a tile is completed
+        :type progress: Optional[Callable[[int, int], None]]
+        :param method: the engine used to compare all the shifts
+        :type method: str
+        :param result_cache: if given, the persistent cache of the minimum
+        areas: the pairs of each tile are looked up by the hashes of their
+        profiles, identical profiles being compared once, and only the missing
+        pairs are computed and then stored
+        :type result_cache: Optional[ResultCache]
+        :return: an iterator over the tiles and their blocks of minimum areas.
+        """
+        # pylint: disable=too-many-arguments,too-many-positional-arguments
+        if method not in area.METHODS:
+            raise ValueError(
+                f'Unknown method "{method}", use one of {area.METHODS}')
+        sequences, bounds = self.flatten()
+        workers = os.cpu_count() if workers is None else workers
+        if result_cache is None:
+            blocks = self._run_tiles(tiles, sequences, bounds, symmetric,
+                                     method, workers)
+        else:
+            blocks = self._run_cached_tiles(tiles, sequences, bounds,
+                                            symmetric, method, workers,
+                                            result_cache)
+        for completed, (tile, block) in enumerate(blocks, 1):
+            if symmetric and tile[0] == tile[2]:
+                block = block + block.T
+            yield tile, block
+            if progress is not None:
+                progress(completed, len(tiles))
+
+    @staticmethod
+    def _run_tiles(tiles, sequences, bounds, symmetric, method, workers):
+        """
+        Computes the tiles, in a pool of processes if more than one worker is
+        requested, yielding them as soon as they are completed. At most two
+        tiles per worker are pending at once, so that the memory used is
+        bounded by the size of the tiles.
+        """
+        # pylint: disable=too-many-arguments,too-many-positional-arguments
+        if not tiles:
+            return
+        if workers <= 1:
+            _init_worker(sequences, bounds)
+            try:
+                for tile in tiles:
+                    yield _compare_tile(tile, symmetric, method)
+            finally:
+                _clear_worker()
+            return
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(sequences, bounds)) as executor:
+            pending = set()
+            tiles = iter(tiles)
+            while True:
+                for tile in tiles:
+                    pending.add(executor.submit(
+                        run_instrumented, INSTRUMENTATION.enabled,
+                        _compare_tile, tile, symmetric, method))
+                    if len(pending) >= 2 * workers:
+                        break
+                if not pending:
+                    return
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    result, snapshot = future.result()
+                    INSTRUMENTATION.merge(snapshot)
+                    yield result
+
+    def _cached_tile(self, tile: tuple[int, int, int, int], symmetric: bool,
+                     hashes: list[str], result_cache: ResultCache) -> tuple[
+            np.ndarray, dict, list[tuple[int, int]]]:
+        """
+        Fills a tile with the minimum areas found in the cache.
+        :return: the partially filled block, the cells of each pair of profiles
+        missing from the cache, and one (row, column) pair to be computed for
+        each of them.
+        """
+        row_start, row_stop, column_start, column_stop = tile
+        block = np.zeros((row_stop - row_start, column_stop - column_start))
+        cells = {}
+        for row in range(row_start, row_stop):
+            for column in range(column_start, column_stop):
+                # identical profiles have a null minimum area
+                if row == column or (symmetric and column < row) or \
+                        hashes[row] == hashes[column]:
+                    continue
+                cells.setdefault(pair_key(hashes[row], hashes[column]),
+                                 []).append((row, column))
+        for key, minimum in result_cache.get_many(cells).items():
+            for row, column in cells.pop(key):
+                block[row - row_start, column - column_start] = minimum
+        return block, cells, [positions[0] for positions in cells.values()]
+
+    def _run_cached_tiles(self, tiles, sequences, bounds, symmetric, method,
+                          workers, result_cache):
+        """
+        Computes the tiles, reading the pairs already computed from the cache
+        and computing the missing ones, in a pool of processes if more than
+        one worker is requested. At most two tiles per worker are pending at
+        once, so that the memory used is bounded by the size of the tiles.
+        """
+        # pylint: disable=too-many-arguments,too-many-positional-arguments,too-many-locals
+        hashes = [profile_hash(profile) for profile in self.profiles]
+
+        def complete(tile, block, cells, minima):
+            for positions, minimum in zip(cells.values(), minima):
+                for row, column in positions:
+                    block[row - tile[0], column - tile[2]] = minimum
+            result_cache.put_many(
+                (*key, minimum) for key, minimum in zip(cells, minima))
+            return tile, block
+
+        if workers <= 1:
+            _init_worker(sequences, bounds)
+            try:
+                for tile in tiles:
+                    block, cells, pairs = self._cached_tile(
+                        tile, symmetric, hashes, result_cache)
+                    yield complete(tile, block, cells, _compare_pairs(
+                        pairs, method)[1] if pairs else [])
+            finally:
+                _clear_worker()
+            return
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(sequences, bounds)) as executor:
+            pending = {}
+            tiles = iter(tiles)
+            while True:
+                for tile in tiles:
+                    block, cells, pairs = self._cached_tile(
+                        tile, symmetric, hashes, result_cache)
+                    if not pairs:
+                        yield tile, block
+                        continue
+                    future = executor.submit(
+                        run_instrumented, INSTRUMENTATION.enabled,
+                        _compare_pairs, pairs, method)
+                    pending[future] = (tile, block, cells)
+                    if len(pending) >= 2 * workers:
+                        break
+                if not pending:
+                    return
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    (_, minima), snapshot = future.result()
+                    INSTRUMENTATION.merge(snapshot)
+                    yield complete(*pending.pop(future), minima)
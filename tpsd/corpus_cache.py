@@ -0,0 +1,249 @@
+"""
+This file contains a persistent cache of parsed datasets, to support the
+implementation of the Tonal Pitch Step Distance (TPSD) algorithm as presented
+in:
+
+De Haas, W.B., Veltkamp, R.C., Wiering, F.: Tonal pitch step distance: a
+similarity measure for chord progressions.
+In: ISMIR. pp. 51–56 (2008)
+
+Author: Andrea Poltronieri (University of Bologna) and Jacopo de Berardinis
+(King's College of London)
+Copyright: 2022 Andrea Poltronieri and Jacopo de Berardinis
+License: MIT license
+"""
+import hashlib
+import json
+import os
+import uuid
+from typing import Iterable, Optional
+
+import numpy as np
+
+from tpsd.cache import DEFAULT_CACHE, TpsCache
+from tpsd.corpus import TpsdCorpus
+from tpsd.profile import TpsdProfile
+from tpsd.tpsd_core import Tpsd
+from tpsd.util import get_corresponding_biab, open_harte, parse_mgu
+
+CACHE_VERSION = 2
+MANIFEST = 'manifest.json'
+ARRAYS = ('chords', 'durations', 'distances')
+
+
+def _replace_file(path: str, write) -> None:
+    """
+    Writes a file atomically: the content is written to a temporary file of the
+    same directory, which then replaces the file.
+    :param path: the path of the file
+    :param write: a function writing the content to the given binary file
+    :return: None
+    """
+    temporary = f'{path}.{uuid.uuid4().hex}.tmp'
+    try:
+        with open(temporary, 'wb') as file:
+            write(file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary, path)
+    finally:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+
+
+def fingerprint(path: str, previous: Optional[dict] = None) -> dict:
+    """
+    Computes the fingerprint of a file, made of its modification time, size
+    and hash. The hash is reused from a previous fingerprint if the
+    modification time and the size did not change.
+    :param path: the path of the file
+    :type path: str
+    :param previous: the fingerprint previously computed for the file
+    :type previous: Optional[dict]
+    :return: a dictionary containing the modification time (in ns), the size
+    and the SHA-1 hash of the file.
+    """
+    stat = os.stat(path)
+    if previous is not None and previous['mtime'] == stat.st_mtime_ns and \
+            previous['size'] == stat.st_size:
+        return previous
+    with open(path, 'rb') as file:
+        digest = hashlib.sha1(file.read()).hexdigest()
+    return {'mtime': stat.st_mtime_ns, 'size': stat.st_size, 'sha1': digest}
+
+
+class CorpusCache:
+    """
+    Compact binary store of a parsed dataset, containing for each song the
+    indices of its chords in a shared vocabulary, its key, the duration of its
+    chords and their TPS distance from the key, loaded back memory-mapped.
+    """
+
+    def __init__(self, directory: str) -> None:
+        """
+        Loads a cache previously written by CorpusCache.build().
+        :param directory: the directory containing the cache
+        :type directory: str
+        :return: None
+        """
+        self.directory = directory
+        with open(os.path.join(directory, MANIFEST), 'r',
+                  encoding='utf-8') as file:
+            manifest = json.load(file)
+        if manifest['version'] != CACHE_VERSION:
+            raise ValueError(f'Unsupported cache version in {directory}')
+        self.vocabulary = manifest['vocabulary']
+        self.songs = manifest['songs']
+        self.chords, self.durations, self.distances = [
+            np.load(os.path.join(directory, manifest['arrays'][name]),
+                    mmap_mode='r') for name in ARRAYS]
+        self._starts = np.concatenate(
+            ([0], np.cumsum([song['length'] for song in self.songs]))).astype(
+            np.int64)
+        for name in ARRAYS:
+            if len(getattr(self, name)) != self._starts[-1]:
+                raise ValueError(f'The {name} stored in {directory} do not '
+                                 f'match the manifest')
+
+    def __len__(self) -> int:
+        return len(self.songs)
+
+    @classmethod
+    def build(cls, annotation_paths: Iterable[str], dataset_path: str,
+              directory: str,
+              cache: Optional[TpsCache] = DEFAULT_CACHE) -> 'CorpusCache':
+        """
+        Ingests a dataset of Harte annotations and Band-in-a-Box files into the
+        cache. Songs whose files did not change since the cache was last built
+        are reused instead of being parsed again.
+        :param annotation_paths: the paths of the files containing the Harte
+        annotations
+        :type annotation_paths: Iterable[str]
+        :param dataset_path: the directory containing the Band-in-a-Box files
+        :type dataset_path: str
+        :param directory: the directory in which the cache is written
+        :type directory: str
+        :param cache: the cache of the TPS distances between chords and keys
+        :type cache: Optional[TpsCache]
+        :return: the updated cache.
+        """
+        # pylint: disable=too-many-locals
+        previous = None
+        if os.path.exists(os.path.join(directory, MANIFEST)):
+            try:
+                previous = cls(directory)
+            except (ValueError, KeyError, OSError):
+                previous = None
+        previous_songs = {} if previous is None else {
+            song['harte_path']: (index, song)
+            for index, song in enumerate(previous.songs)}
+
+        vocabulary = {}
+        songs, arrays = [], {name: [] for name in ARRAYS}
+        for harte_path in annotation_paths:
+            biab_path = get_corresponding_biab(harte_path, dataset_path)
+            old_index, old_song = previous_songs.get(harte_path, (None, None))
+            harte_print = fingerprint(
+                harte_path, old_song and old_song['harte_fingerprint'])
+            biab_print = fingerprint(
+                biab_path, old_song and old_song['biab_fingerprint'])
+            if old_song is not None and old_song['biab_path'] == biab_path \
+                    and old_song['harte_fingerprint']['sha1'] == \
+                    harte_print['sha1'] and \
+                    old_song['biab_fingerprint']['sha1'] == biab_print['sha1']:
+                chords, key, durations, distances = previous.song(old_index)
+            else:
+                chords, key = open_harte(harte_path)
+                durations = parse_mgu(biab_path)
+                tpsd = Tpsd(chords, key, durations, cache)
+                distances = [tpsd.chord_distance(chord, chord_key) for
+                             chord, chord_key in zip(tpsd.chord_sequence,
+                                                     tpsd.keys)]
+            if len(chords) != len(durations):
+                raise ValueError(
+                    f'Size mismatch: cannot compute TSPD profile of '
+                    f'{harte_path}')
+            songs.append({'harte_path': harte_path, 'biab_path': biab_path,
+                          'harte_fingerprint': harte_print,
+                          'biab_fingerprint': biab_print, 'key': key,
+                          'length': len(chords)})
+            arrays['chords'].append([vocabulary.setdefault(
+                chord, len(vocabulary)) for chord in chords])
+            arrays['durations'].append(durations)
+            arrays['distances'].append(np.rint(np.asarray(distances) * 2))
+        del previous
+
+        if len(vocabulary) > np.iinfo(np.uint16).max:
+            raise ValueError('The chord vocabulary exceeds 65535 labels.')
+        os.makedirs(directory, exist_ok=True)
+        # the arrays of each build get new names, and the manifest pointing to
+        # them is replaced last: an interrupted build leaves the previous cache
+        # untouched
+        generation = uuid.uuid4().hex
+        files = {name: f'{name}-{generation}.npy' for name in ARRAYS}
+        for name, dtype in zip(ARRAYS, (np.uint16, np.uint16, np.uint8)):
+            values = np.concatenate([np.asarray(song, dtype=np.int64) for song
+                                     in arrays[name]]) if songs else []
+            if np.size(values) and np.max(values) > np.iinfo(dtype).max:
+                raise ValueError(f'The {name} exceed the range of {dtype}.')
+            values = np.asarray(values, dtype=dtype)
+            _replace_file(os.path.join(directory, files[name]),
+                          lambda file, values=values: np.save(file, values))
+        manifest = json.dumps({'version': CACHE_VERSION, 'arrays': files,
+                               'vocabulary': list(vocabulary), 'songs': songs})
+        _replace_file(os.path.join(directory, MANIFEST),
+                      lambda file: file.write(manifest.encode('utf-8')))
+        for name in os.listdir(directory):
+            if name.endswith('.npy') and name.split('-')[0] in ARRAYS and \
+                    name not in files.values():
+                os.remove(os.path.join(directory, name))
+        return cls(directory)
+
+    def _bounds(self, index: int) -> tuple[int, int]:
+        """
+        Gets the position of the chords of a song within the stored arrays.
+        """
+        return int(self._starts[index]), int(self._starts[index + 1])
+
+    def song(self, index: int) -> tuple[list[str], str, list[int], list[float]]:
+        """
+        Gets a song of the cache.
+        :param index: the position of the song
+        :type index: int
+        :return: the chord sequence, the key, the duration of each chord (as
+        accepted by Tpsd) and the TPS distance of each chord from the key.
+        """
+        start, stop = self._bounds(index)
+        return ([self.vocabulary[chord] for chord in self.chords[start:stop]],
+                self.songs[index]['key'],
+                self.durations[start:stop].tolist(),
+                self.song_distances(index))
+
+    def song_distances(self, index: int) -> list[float]:
+        """
+        Gets the TPS distance of each chord of a song from its key.
+        :param index: the position of the song
+        :type index: int
+        :return: the TPS distances of the chords.
+        """
+        start, stop = self._bounds(index)
+        return (self.distances[start:stop] / 2).tolist()
+
+    def profile(self, index: int) -> TpsdProfile:
+        """
+        Gets the precomputed profile of a song.
+        :param index: the position of the song
+        :type index: int
+        :return: the profile of the song.
+        """
+        start, stop = self._bounds(index)
+        return TpsdProfile(self.song_distances(index),
+                           self.durations[start:stop].tolist())
+
+    def corpus(self) -> TpsdCorpus:
+        """
+        Builds a corpus from the precomputed profiles of all songs.
+        :return: the corpus containing all the songs of the cache.
+        """
+        return TpsdCorpus.from_profiles(self.profile(index)
+                                        for index in range(len(self)))
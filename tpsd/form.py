@@ -0,0 +1,233 @@
+"""
+This file contains the comparison of songs whose chorus is repeated, without
+expanding the repetitions, by means of the Tonal Pitch Step Distance (TPSD)
+algorithm as presented in:
+
+De Haas, W.B., Veltkamp, R.C., Wiering, F.: Tonal pitch step distance: a
+similarity measure for chord progressions.
+In: ISMIR. pp. 51–56 (2008)
+
+Author: Andrea Poltronieri (University of Bologna) and Jacopo de Berardinis
+(King's College of London)
+Copyright: 2022 Andrea Poltronieri and Jacopo de Berardinis
+License: MIT license
+"""
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+from tpsd.profile import TpsdProfile
+
+
+class SongForm(NamedTuple):
+    """
+    The form of a song, made of an intro, a chorus played a number of times and
+    an outro. The intro and the chorus are expressed as numbers of chords, the
+    remaining chords being the outro.
+    """
+    intro: int
+    chorus: int
+    repeats: int
+
+
+class FormedProfile:
+    """
+    Profile of a song made of an intro, a chorus repeated a number of times and
+    an outro, whose repetitions are never expanded.
+    """
+    # pylint: disable=too-many-instance-attributes
+
+    def __init__(self, chorus: TpsdProfile, repeats: int = 1,
+                 intro: Optional[TpsdProfile] = None,
+                 outro: Optional[TpsdProfile] = None) -> None:
+        """
+        Builds the profile of a song from the profiles of its parts.
+        :param chorus: the profile of the chorus
+        :type chorus: TpsdProfile
+        :param repeats: the number of times the chorus is played
+        :type repeats: int
+        :param intro: the profile of the intro, if any
+        :type intro: Optional[TpsdProfile]
+        :param outro: the profile of the outro, if any
+        :type outro: Optional[TpsdProfile]
+        :return: None
+        """
+        if repeats < 0:
+            raise ValueError('The number of repeats cannot be negative.')
+        self.intro = TpsdProfile([], []) if intro is None else intro
+        self.chorus = chorus
+        self.repeats = repeats
+        self.outro = TpsdProfile([], []) if outro is None else outro
+        self.period = len(chorus)
+        # first beat of the chorus and first beat after its last repetition
+        self.chorus_start = len(self.intro)
+        self.chorus_stop = self.chorus_start + self.period * repeats
+        self._cumulative = {}
+
+    @classmethod
+    def from_profile(cls, profile: TpsdProfile) -> 'FormedProfile':
+        """
+        Wraps the profile of a song without repetitions.
+        :param profile: the profile of the song
+        :type profile: TpsdProfile
+        :return: the profile made of the intro only.
+        """
+        return cls(TpsdProfile([], []), 0, intro=profile)
+
+    def __len__(self) -> int:
+        return self.chorus_stop + len(self.outro)
+
+    def expand(self) -> TpsdProfile:
+        """
+        Expands the repetitions of the chorus.
+        :return: the run-length profile of the whole song.
+        """
+        profile = TpsdProfile([], [])
+        for part in [self.intro] + [self.chorus] * self.repeats + [self.outro]:
+            for value, duration in zip(part.values, part.durations):
+                profile.append(value, duration)
+        return profile
+
+    def parts(self) -> list[tuple[TpsdProfile, list[int]]]:
+        """
+        Lists the parts of the song with the beats at which they are played.
+        :return: a list containing each part and the list of its first beats.
+        """
+        return [(self.intro, [0]),
+                (self.chorus, [self.chorus_start + self.period * repeat
+                               for repeat in range(self.repeats)]),
+                (self.outro, [self.chorus_stop])]
+
+    def cumulative(self, value: float, positions: np.ndarray) -> np.ndarray:
+        """
+        Calculates the sum of the absolute differences between a value and the
+        beats of the song preceding each position, in constant time per
+        position by means of the sums over each part.
+        :param value: the value compared with the song
+        :type value: float
+        :param positions: the positions (between 0 and the length of the song)
+        :type positions: np.ndarray
+        :return: the sums of |value - y| over the beats before each position.
+        """
+        if value not in self._cumulative:
+            self._cumulative[value] = tuple(
+                np.concatenate(([0], np.cumsum(np.abs(value - part.to_array()))))
+                for part in (self.intro, self.chorus, self.outro))
+        intro, chorus, outro = self._cumulative[value]
+        positions = np.asarray(positions, dtype=np.int64)
+        repeats, remainder = np.divmod(np.clip(
+            positions - self.chorus_start, 0, self.chorus_stop -
+            self.chorus_start), max(1, self.period))
+        sums = intro[np.minimum(positions, self.chorus_start)] + \
+            repeats * chorus[-1] + chorus[remainder]
+        after = positions > self.chorus_stop
+        sums[after] += outro[positions[after] - self.chorus_stop]
+        return sums
+
+    def part_areas(self, part: TpsdProfile) -> np.ndarray:
+        """
+        Calculates the area between a part of another song and each window of
+        this song having the same length, for the representative shifts only.
+        The sums of the differences from each value of the part are computed
+        once over the beats covered by the windows, so that each segment of
+        the part adds its area at all the shifts with a single subtraction.
+        :param part: the profile of the part
+        :type part: TpsdProfile
+        :return: the area (not normalised) at each of the representatives(len(
+        part)) shifts.
+        """
+        # pylint: disable=too-many-locals
+        length = len(part)
+        shifts, first, last = self._representative_bounds(length)
+        values = np.asarray(part.values)
+        ends = np.asarray(part.ends)
+        starts = ends - np.asarray(part.durations)
+        areas = []
+        for range_start, range_stop in ((0, first), (last, shifts)):
+            count = range_stop - range_start
+            range_areas = np.zeros(count)
+            if count:
+                beats = np.arange(range_start, range_stop + length)
+                for value in np.unique(values):
+                    cumulative = self.cumulative(value, beats)
+                    for start, end in zip(starts[values == value],
+                                          ends[values == value]):
+                        range_areas += cumulative[end:end + count] - \
+                            cumulative[start:start + count]
+            areas.append(range_areas)
+        return np.concatenate(areas)
+
+    def _representative_bounds(self, length: int) -> tuple[int, int, int]:
+        """
+        Gets the number of shifts of a window of the given length, and the
+        bounds of the shifts that lie within the repetitions of the chorus and
+        are equal to an earlier shift, one period before.
+        """
+        shifts = len(self) - length + 1
+        first = min(shifts, self.chorus_start + self.period)
+        last = max(first, self.chorus_stop - length + 1)
+        return shifts, first, last
+
+    def representatives(self, length: int) -> np.ndarray:
+        """
+        Lists the shifts of a window of the given length whose area must be
+        computed, since the area of a window lying within the repetitions of
+        the chorus is the same as one period before.
+        :param length: the length of the window
+        :type length: int
+        :return: the first shifts, up to the end of the first period of the
+        chorus, and the shifts reaching the outro.
+        """
+        shifts, first, last = self._representative_bounds(length)
+        return np.concatenate((np.arange(first), np.arange(last, shifts)))
+
+    def representative_index(self, shifts: np.ndarray,
+                             length: int) -> np.ndarray:
+        """
+        Maps each shift of a window of the given length to the position of its
+        representative in representatives(length).
+        :param shifts: the shifts of the window
+        :type shifts: np.ndarray
+        :param length: the length of the window
+        :type length: int
+        :return: the indices of the representatives.
+        """
+        _, first, last = self._representative_bounds(length)
+        within = (shifts >= self.chorus_start) & \
+            (shifts + length <= self.chorus_stop)
+        shifts = np.where(within, self.chorus_start + (
+            shifts - self.chorus_start) % max(1, self.period), shifts)
+        return np.where(shifts < first, shifts, shifts - last + first)
+
+
+def formed_minimum_area(longest: FormedProfile,
+                        shortest: FormedProfile) -> tuple[float, int]:
+    """
+    Finds the shift of the shortest song over the longest one that minimises
+    the area between the two, without expanding the repetitions: the areas of
+    each part of the shortest song are computed once for every distinct window
+    of the longest song and reused for all the repetitions of the part, and
+    only the distinct shifts of the shortest song are compared. The result is
+    the same as comparing the expanded songs, provided that the values are
+    multiples of 0.5.
+    :param longest: the profile of the longest song
+    :type longest: FormedProfile
+    :param shortest: the profile of the shortest song
+    :type shortest: FormedProfile
+    :return: the minimum area normalised by the length of the shortest song and
+    the first beat of the longest song at which it is reached.
+    """
+    length = len(shortest)
+    if length > len(longest):
+        raise ValueError('The shortest sequence is longer than the longest.')
+    shifts = longest.representatives(length)
+    areas = np.zeros(len(shifts))
+    for part, starts in shortest.parts():
+        if not part or not starts:
+            continue
+        part_areas = longest.part_areas(part)
+        for start in starts:
+            areas += part_areas[longest.representative_index(
+                shifts + start, len(part))]
+    best = int(np.argmin(areas))
+    return float(areas[best]) / length, int(shifts[best])
@@ -0,0 +1,377 @@
+"""
+This file contains a nearest-neighbour search index over the step functions
+computed by the Tonal Pitch Step Distance (TPSD) algorithm as presented in:
+
+De Haas, W.B., Veltkamp, R.C., Wiering, F.: Tonal pitch step distance: a
+similarity measure for chord progressions.
+In: ISMIR. pp. 51–56 (2008)
+
+Author: Andrea Poltronieri (University of Bologna) and Jacopo de Berardinis
+(King's College of London)
+Copyright: 2022 Andrea Poltronieri and Jacopo de Berardinis
+License: MIT license
+"""
+import heapq
+from typing import Any, Hashable, Optional, Union
+
+import numpy as np
+
+from tpsd import area
+from tpsd.profile import TpsdProfile, resolution_beats
+
+# number of half steps of the histograms: TPS distances from 0 to 13, i.e.
+# from 0 to 26 half steps, cover the usual chords; the histograms of an index
+# are widened when farther chords are added or queried
+HALF_STEPS = 27
+# maximum number of (query, candidate, value) elements of the arrays used to
+# compute the bounds of a batch of queries at once
+BOUNDS_BLOCK_ELEMENTS = 1 << 22
+
+
+class ProfileStatistics:
+    """
+    Summary statistics of a profile, from which lower bounds on its minimum
+    area with other profiles are derived. All values are in half steps.
+    """
+
+    def __init__(self, sequence: np.ndarray) -> None:
+        """
+        Computes the statistics of an expanded profile, which must not be
+        empty.
+        :param sequence: the TPS distance of each beat
+        :type sequence: np.ndarray
+        :return: None
+        """
+        if sequence.size == 0:
+            raise ValueError('Empty profiles cannot be indexed or queried.')
+        doubled = area.half_steps(sequence)
+        self.length = len(doubled)
+        self.minimum = int(doubled.min())
+        self.maximum = int(doubled.max())
+        self.histogram = np.bincount(doubled, minlength=HALF_STEPS)
+
+    @property
+    def width(self) -> int:
+        """
+        The number of values of the histogram.
+        """
+        return len(self.histogram)
+
+    def histogram_at(self, width: int) -> np.ndarray:
+        """
+        Gets the histogram of the values, widened to a number of values.
+        :param width: the number of values, not lower than the width of the
+        histogram
+        :type width: int
+        :return: the number of beats taking each value.
+        """
+        return np.pad(self.histogram, (0, width - self.width))
+
+    def nearest_at(self, width: int) -> np.ndarray:
+        """
+        Gets the distance of each value from the closest value taken by the
+        profile.
+        :param width: the number of values
+        :type width: int
+        :return: the distance of each value, in half steps.
+        """
+        return np.abs(np.arange(width)[:, None] - np.flatnonzero(
+            self.histogram)[None, :]).min(axis=1)
+
+
+def _extreme_sums(histograms: np.ndarray, lengths: np.ndarray) -> tuple[
+        np.ndarray, np.ndarray]:
+    """
+    Computes the sum of the smallest and of the largest values of profiles,
+    taking a given number of values from each one.
+    :param histograms: the histograms of the profiles (along the last axis)
+    :param lengths: the number of values to be taken from each profile
+    :return: the sums of the smallest and of the largest values.
+    """
+    values = np.arange(histograms.shape[-1])
+    lengths = lengths[..., None]
+    before = np.cumsum(histograms, axis=-1) - histograms
+    smallest = np.clip(lengths - before, 0, histograms)
+    after = np.flip(np.cumsum(np.flip(histograms, -1), axis=-1),
+                    -1) - histograms
+    largest = np.clip(lengths - after, 0, histograms)
+    return (smallest * values).sum(axis=-1), (largest * values).sum(axis=-1)
+
+
+class TpsdIndex:
+    """
+    Index returning the profiles having the smallest minimum area with a query,
+    pruning the candidates by means of lower bounds on the minimum area.
+    """
+
+    def __init__(self, method: str = 'auto',
+                 resolution: Union[int, str] = 'beat',
+                 beats_per_bar: int = 4) -> None:
+        """
+        Initialises an empty index.
+        :param method: the engine used to compare all the shifts when the exact
+        minimum area is computed
+        :type method: str
+        :param resolution: the resolution at which the profiles and the queries
+        are compared: "beat", "half-bar", "bar" or a number of beats. At a
+        coarser resolution than the beat, the profiles are resampled (see
+        TpsdProfile.resample) and compared as done by TpsdComparison, while
+        the lower bounds rely on the resampled values rounded to the nearest
+        half step and are loosened by the rounding error.
+        :type resolution: Union[int, str]
+        :param beats_per_bar: the number of beats of each bar
+        :type beats_per_bar: int
+        :return: None
+        """
+        self.method = method
+        self.resolution = resolution_beats(resolution, beats_per_bar)
+        self.labels = []
+        self.sequences = []
+        self.statistics = []
+        self.last_stats = {}
+        self._arrays = None
+
+    def __len__(self) -> int:
+        return len(self.sequences)
+
+    def add(self, profile: TpsdProfile, label: Optional[Hashable] = None) -> int:
+        """
+        Adds a profile to the index.
+        :param profile: the profile of a song, lasting at least one beat
+        :type profile: TpsdProfile
+        :param label: the label returned when the song is found, defaulting to
+        its position in the index
+        :type label: Optional[Hashable]
+        :return: the position of the song in the index.
+        """
+        sequence = self._sequence(profile)
+        self.statistics.append(self._statistics(sequence))
+        self.sequences.append(sequence)
+        self.labels.append(len(self.labels) if label is None else label)
+        self._arrays = None
+        return len(self.sequences) - 1
+
+    def _sequence(self, profile: TpsdProfile) -> np.ndarray:
+        """
+        Expands a profile at the resolution of the index.
+        """
+        if self.resolution == 1:
+            return profile.to_array()
+        return profile.resample(self.resolution).to_array()
+
+    def _statistics(self, sequence: np.ndarray) -> ProfileStatistics:
+        """
+        Computes the statistics of a sequence at the resolution of the index,
+        rounding the resampled values to the nearest half step.
+        """
+        if self.resolution == 1:
+            return ProfileStatistics(sequence)
+        return ProfileStatistics(np.rint(sequence * 2) / 2)
+
+    def _statistics_arrays(self, width: int = HALF_STEPS) -> dict:
+        """
+        Stacks the statistics of all the profiles, to compute the bounds of
+        all the candidates at once, with histograms of at least the given
+        width.
+        """
+        width = max([width] + [stats.width for stats in self.statistics])
+        if self._arrays is None or self._arrays['width'] != width:
+            self._arrays = {
+                'width': width,
+                'length': np.array([stats.length for stats in self.statistics]),
+                'minimum': np.array([stats.minimum for stats in
+                                     self.statistics]),
+                'maximum': np.array([stats.maximum for stats in
+                                     self.statistics]),
+                'histogram': np.array([stats.histogram_at(width) for stats in
+                                       self.statistics]).reshape(-1, width),
+                'nearest': np.array([stats.nearest_at(width) for stats in
+                                     self.statistics]).reshape(-1, width)}
+        return self._arrays
+
+    def lower_bounds(self, query: ProfileStatistics) -> tuple[
+            np.ndarray, np.ndarray]:
+        """
+        Computes two lower bounds on the (not normalised) minimum area between a
+        query and each profile of the index, in half steps.
+        The first one only relies on the ranges of values: each beat of the
+        shortest profile differs at least by the gap between the two ranges.
+        The second one also relies on the histograms of values: each value of
+        the shortest profile differs at least by its distance from the closest
+        value of the longest, and the sums of the two profiles differ at least
+        by the distance between the sum of the shortest and the sums that a
+        window of the longest can reach.
+        At a coarser resolution than the beat, the statistics describe the
+        values rounded to the nearest half step: since each value differs from
+        its rounding by at most a quarter of a step, the bounds are lowered by
+        one half step per beat of the shortest profile.
+        :param query: the statistics of the query profile
+        :type query: ProfileStatistics
+        :return: the range bounds and the histogram bounds (never lower than
+        the range bounds) of all the candidates.
+        """
+        range_bounds, histogram_bounds = self.batch_lower_bounds([query])
+        return range_bounds[0], histogram_bounds[0]
+
+    def batch_lower_bounds(self, queries: list[ProfileStatistics]) -> tuple[
+            np.ndarray, np.ndarray]:
+        """
+        Computes the lower bounds of lower_bounds() between several queries
+        and each profile of the index at once.
+        :param queries: the statistics of the query profiles
+        :type queries: list[ProfileStatistics]
+        :return: the range bounds and the histogram bounds, having one row per
+        query and one column per candidate.
+        """
+        # pylint: disable=too-many-locals
+        arrays = self._statistics_arrays(max(query.width for query in queries))
+        width = arrays['width']
+        lengths = arrays['length'][None, :]
+        query_lengths = np.array([query.length for query in queries])[:, None]
+        shortest = np.minimum(lengths, query_lengths)
+        query_longest = query_lengths >= lengths
+
+        gap = np.maximum(0, np.maximum(
+            np.array([query.minimum for query in queries])[:, None] -
+            arrays['maximum'][None, :],
+            arrays['minimum'][None, :] -
+            np.array([query.maximum for query in queries])[:, None]))
+        range_bounds = shortest * gap
+
+        query_histograms = np.array([query.histogram_at(width)
+                                     for query in queries])
+        query_nearest = np.array([query.nearest_at(width) for query in queries])
+        support = np.where(query_longest,
+                           query_nearest @ arrays['histogram'].T,
+                           query_histograms @ arrays['nearest'].T)
+
+        values = np.arange(width)
+        sums = (arrays['histogram'] @ values)[None, :]
+        query_sums = (query_histograms @ values)[:, None]
+        smallest = np.empty(shortest.shape, dtype=np.int64)
+        largest = np.empty(shortest.shape, dtype=np.int64)
+        block = max(1, BOUNDS_BLOCK_ELEMENTS // (len(queries) * width))
+        for start in range(0, shortest.shape[1], block):
+            stop = start + block
+            smallest[:, start:stop], largest[:, start:stop] = _extreme_sums(
+                np.where(query_longest[:, start:stop, None],
+                         query_histograms[:, None, :],
+                         arrays['histogram'][None, start:stop, :]),
+                shortest[:, start:stop])
+        shortest_sums = np.where(query_longest, sums, query_sums)
+        sum_bounds = np.maximum(0, np.maximum(shortest_sums - largest,
+                                              smallest - shortest_sums))
+        histogram_bounds = np.maximum(range_bounds,
+                                      np.maximum(support, sum_bounds))
+        if self.resolution != 1:
+            # rounding error of the values of both profiles
+            range_bounds = np.maximum(0, range_bounds - shortest)
+            histogram_bounds = np.maximum(0, histogram_bounds - shortest)
+        return range_bounds, histogram_bounds
+
+    def query(self, profile: TpsdProfile, k: int = 10) -> list[
+            tuple[Any, float]]:
+        """
+        Finds the k profiles having the smallest minimum area with the query.
+        The candidates are compared in increasing order of lower bound, and
+        those whose bound exceeds the k-th best area found so far are
+        discarded. The statistics of the pruning are stored in last_stats.
+        :param profile: the profile of the query
+        :type profile: TpsdProfile
+        :param k: the number of profiles to be returned
+        :type k: int
+        :return: a list of (label, minimum area) pairs, sorted by area and then
+        by position in the index, identical to the brute force search.
+        """
+        return self.query_batch([profile], k)[0]
+
+    def query_batch(self, profiles: list[TpsdProfile], k: int = 10) -> list[
+            list[tuple[Any, float]]]:
+        """
+        Finds the k profiles having the smallest minimum area with each query
+        of a batch. Identical queries (e.g. sent by different clients) are
+        answered once, and the lower bounds of all the distinct queries are
+        computed together against the whole index; the exact minimum areas of
+        the candidates that are not pruned are then computed query by query.
+        The statistics of the pruning of the whole batch are stored in
+        last_stats.
+        :param profiles: the profiles of the queries
+        :type profiles: list[TpsdProfile]
+        :param k: the number of profiles to be returned for each query
+        :type k: int
+        :return: the results of each query, as returned by query().
+        """
+        signatures = [(tuple(profile.values), tuple(profile.durations))
+                      for profile in profiles]
+        distinct = {}
+        for signature, profile in zip(signatures, profiles):
+            distinct.setdefault(signature, profile)
+        stats = {'candidates': len(self) * len(distinct), 'pruned_range': 0,
+                 'pruned_histogram': 0, 'compared': 0}
+        if len(profiles) > 1:
+            stats.update({'queries': len(profiles), 'distinct': len(distinct)})
+        self.last_stats = stats
+        if not self.sequences or k <= 0:
+            return [[] for _ in profiles]
+
+        sequences = [self._sequence(profile) for profile in distinct.values()]
+        statistics = [self._statistics(sequence) for sequence in sequences]
+        range_bounds, histogram_bounds = self.batch_lower_bounds(statistics)
+        # bounds normalised as the minimum area, in TPS units
+        shortest = np.minimum(
+            self._arrays['length'][None, :],
+            np.array([query.length for query in statistics])[:, None])
+        range_bounds = range_bounds / 2 / shortest
+        histogram_bounds = histogram_bounds / 2 / shortest
+        results = {signature: self._search(sequence, range_bounds[row],
+                                           histogram_bounds[row], k, stats)
+                   for row, (signature, sequence) in enumerate(
+                       zip(distinct, sequences))}
+        return [results[signature] for signature in signatures]
+
+    def _search(self, sequence: np.ndarray, range_bounds: np.ndarray,
+                histogram_bounds: np.ndarray, k: int,
+                stats: dict) -> list[tuple[Any, float]]:
+        """
+        Compares a query with the candidates in increasing order of lower
+        bound, until the bounds exceed the k-th best area found so far.
+        """
+        best = []  # max-heap of (-area, -position) of the k best candidates
+        for position in np.argsort(histogram_bounds, kind='stable'):
+            if len(best) == k and histogram_bounds[position] > -best[0][0]:
+                if range_bounds[position] > -best[0][0]:
+                    stats['pruned_range'] += 1
+                else:
+                    stats['pruned_histogram'] += 1
+                continue
+            stats['compared'] += 1
+            minimum = area.sequence_minimum_area(
+                sequence, self.sequences[position], self.method,
+                -best[0][0] if len(best) == k else None)[0]
+            entry = (-minimum, -int(position))
+            if len(best) < k:
+                heapq.heappush(best, entry)
+            elif entry > best[0]:
+                heapq.heapreplace(best, entry)
+        return [(self.labels[-negative_position], -negative_area)
+                for negative_area, negative_position in
+                sorted(best, reverse=True)]
+
+    def brute_force(self, profile: TpsdProfile, k: int = 10) -> list[
+            tuple[Any, float]]:
+        """
+        Finds the k profiles having the smallest minimum area with the query,
+        comparing the query with all the profiles.
+        :param profile: the profile of the query
+        :type profile: TpsdProfile
+        :param k: the number of profiles to be returned
+        :type k: int
+        :return: a list of (label, minimum area) pairs, sorted by area and then
+        by position in the index.
+        """
+        sequence = self._sequence(profile)
+        areas = [(area.sequence_minimum_area(sequence, candidate,
+                                             self.method)[0], position)
+                 for position, candidate in enumerate(self.sequences)]
+        return [(self.labels[position], minimum)
+                for minimum, position in sorted(areas)[:k]]
@@ -0,0 +1,247 @@
+"""
+This file contains a parallel pipeline ingesting datasets of Harte annotations
+and Band-in-a-Box files, to support the implementation of the Tonal Pitch Step
+Distance (TPSD) algorithm as presented in:
+
+De Haas, W.B., Veltkamp, R.C., Wiering, F.: Tonal pitch step distance: a
+similarity measure for chord progressions.
+In: ISMIR. pp. 51–56 (2008)
+
+Author: Andrea Poltronieri (University of Bologna) and Jacopo de Berardinis
+(King's College of London)
+Copyright: 2022 Andrea Poltronieri and Jacopo de Berardinis
+License: MIT license
+"""
+import os
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, \
+    ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Iterable, Iterator, NamedTuple, Optional
+
+from tpsd.cache import DEFAULT_CACHE, TpsCache
+from tpsd.instrumentation import INSTRUMENTATION, run_instrumented
+from tpsd.profile import TpsdProfile
+from tpsd.tpsd_core import Tpsd
+from tpsd.util import DatasetIndex, chunked, open_harte, parse_mgu
+
+# cache of the TPS distances used by the worker processes, set by _init_worker
+_WORKER_CACHE = None
+
+
+class IngestedSong(NamedTuple):
+    """
+    A song parsed from its Harte annotation and its Band-in-a-Box file, with
+    the TPS distance of each chord from the key.
+    """
+    harte_path: str
+    biab_path: str
+    chords: list[str]
+    key: str
+    durations: list[int]
+    distances: list[float]
+
+    def profile(self) -> TpsdProfile:
+        """
+        Builds the profile of the song.
+        :return: the run-length profile of the song.
+        """
+        return TpsdProfile(self.distances, self.durations)
+
+
+class IngestError(NamedTuple):
+    """
+    A file that could not be ingested, with the stage at which it failed.
+    """
+    harte_path: str
+    stage: str
+    message: str
+
+
+class IngestReport:
+    """
+    Report of an ingestion, collecting the files that could not be ingested.
+    """
+
+    def __init__(self) -> None:
+        self.ingested = 0
+        self.errors = []
+
+    def __len__(self) -> int:
+        return self.ingested + len(self.errors)
+
+    def summary(self) -> dict:
+        """
+        Summarises the ingestion.
+        :return: a dictionary containing the number of ingested and failed files
+        and the number of failures at each stage.
+        """
+        stages = {}
+        for error in self.errors:
+            stages[error.stage] = stages.get(error.stage, 0) + 1
+        return {'ingested': self.ingested, 'failed': len(self.errors),
+                'stages': stages}
+
+
+def ingest_file(harte_path: str, biab_path: str,
+                cache: Optional[TpsCache] = DEFAULT_CACHE):
+    """
+    Parses a song, catching any error so that a malformed file does not stop
+    the ingestion of the others.
+    :param harte_path: the path of the file containing the Harte annotations
+    :param biab_path: the path of the corresponding Band-in-a-Box file
+    :param cache: the cache of the TPS distances between chords and keys, or
+    None to compute each distance from scratch
+    :return: an IngestedSong, or an IngestError if the song could not be parsed.
+    """
+    # pylint: disable=broad-except
+    stage = 'harte'
+    try:
+        chords, key = open_harte(harte_path)
+        stage = 'biab'
+        durations = parse_mgu(biab_path)
+        stage = 'timing'
+        if len(chords) != len(durations):
+            raise ValueError(f'Size mismatch: {len(chords)} chords and '
+                             f'{len(durations)} durations')
+        stage = 'chord'
+        distances = Tpsd(chords, key, durations, cache).distances()
+    except Exception as exc:
+        return IngestError(harte_path, stage, f'{type(exc).__name__}: {exc}')
+    return IngestedSong(harte_path, biab_path, chords, key, durations,
+                        distances)
+
+
+def _init_worker(cache: Optional[TpsCache]) -> None:
+    """
+    Stores the cache of the TPS distances in a worker process, so that it is
+    transferred once per worker instead of once per chunk.
+    :param cache: the cache of the TPS distances between chords and keys
+    :return: None
+    """
+    global _WORKER_CACHE  # pylint: disable=global-statement
+    _WORKER_CACHE = cache
+
+
+def _ingest_chunk(chunk: list[tuple[str, str]],
+                  cache: Optional[TpsCache] = None) -> list:
+    """
+    Parses a chunk of songs, with the given cache or, in a worker process,
+    with the one stored by _init_worker.
+    """
+    cache = _WORKER_CACHE if cache is None else cache
+    return [ingest_file(harte_path, biab_path, cache)
+            for harte_path, biab_path in chunk]
+
+
+def ingest(annotation_paths: Iterable[str], dataset_path: str,
+           workers: Optional[int] = None, chunk_size: int = 16,
+           report: Optional[IngestReport] = None,
+           index: Optional[DatasetIndex] = None,
+           cache: Optional[TpsCache] = DEFAULT_CACHE) -> Iterator[IngestedSong]:
+    """
+    Ingests a dataset, parsing the files in a pool of processes and yielding
+    the songs as soon as they are parsed (not necessarily in order). The files
+    that cannot be ingested are added to the report instead of stopping the
+    ingestion. If a worker process dies, the files of the chunks lost with the
+    pool are reported at the "worker" stage and the pool is restarted.
+    :param annotation_paths: the paths of the files containing the Harte
+    annotations
+    :type annotation_paths: Iterable[str]
+    :param dataset_path: the directory containing the Band-in-a-Box files
+    :type dataset_path: str
+    :param workers: the number of worker processes, defaulting to the number
+    of CPUs. With 0 or 1 worker the files are parsed in the current process.
+    :type workers: Optional[int]
+    :param chunk_size: the number of files parsed by each task
+    :type chunk_size: int
+    :param report: the report collecting the errors
+    :type report: Optional[IngestReport]
+    :param index: the index of the dataset, scanned if not given
+    :type index: Optional[DatasetIndex]
+    :param cache: the cache of the TPS distances between chords and keys, or
+    None to compute each distance from scratch
+    :type cache: Optional[TpsCache]
+    :return: an iterator over the ingested songs.
+    """
+    # pylint: disable=too-many-arguments,too-many-positional-arguments,too-many-locals
+    report = IngestReport() if report is None else report
+    index = DatasetIndex(dataset_path) if index is None else index
+    workers = os.cpu_count() if workers is None else workers
+
+    def resolved():
+        for harte_path in annotation_paths:
+            biab_path = index.find(harte_path)
+            if biab_path is None:
+                report.errors.append(IngestError(
+                    harte_path, 'resolve', 'No Band-in-a-Box file found'))
+                continue
+            yield harte_path, biab_path
+
+    def collect(results, snapshot=None):
+        INSTRUMENTATION.merge(snapshot)
+        for result in results:
+            if isinstance(result, IngestError):
+                report.errors.append(result)
+            else:
+                report.ingested += 1
+                yield result
+
+    if workers <= 1:
+        for chunk in chunked(resolved(), chunk_size):
+            yield from collect(_ingest_chunk(chunk, cache))
+        return
+
+    def start():
+        return ProcessPoolExecutor(max_workers=workers,
+                                   initializer=_init_worker,
+                                   initargs=(cache,))
+
+    def drain(return_when):
+        done, _ = wait(pending, return_when=return_when)
+        broken = False
+        for future in done:
+            chunk = pending.pop(future)
+            try:
+                results, snapshot = future.result()
+            except BrokenProcessPool as exc:
+                broken = True
+                report.errors.extend(
+                    IngestError(harte_path, 'worker',
+                                f'{type(exc).__name__}: {exc}')
+                    for harte_path, _ in chunk)
+                continue
+            yield from collect(results, snapshot)
+        return broken
+
+    def restart():
+        nonlocal executor
+        # the other chunks in flight are lost with the pool
+        yield from drain(ALL_COMPLETED)
+        executor.shutdown()
+        executor = start()
+
+    def settle():
+        if (yield from drain(FIRST_COMPLETED)):
+            yield from restart()
+
+    executor = start()
+    pending = {}
+    try:
+        for chunk in chunked(resolved(), chunk_size):
+            try:
+                future = executor.submit(run_instrumented,
+                                         INSTRUMENTATION.enabled,
+                                         _ingest_chunk, chunk)
+            except BrokenProcessPool:
+                yield from restart()
+                future = executor.submit(run_instrumented,
+                                         INSTRUMENTATION.enabled,
+                                         _ingest_chunk, chunk)
+            pending[future] = chunk
+            # bounds the number of chunks in flight, and so the memory used
+            if len(pending) >= 2 * workers:
+                yield from settle()
+        while pending:
+            yield from settle()
+    finally:
+        executor.shutdown()
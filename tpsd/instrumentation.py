@@ -0,0 +1,227 @@
+"""
+This file contains the instrumentation of the hot paths of the Tonal Pitch Step
+Distance (TPSD) algorithm as presented in:
+
+De Haas, W.B., Veltkamp, R.C., Wiering, F.: Tonal pitch step distance: a
+similarity measure for chord progressions.
+In: ISMIR. pp. 51–56 (2008)
+
+The instrumented code increments named counters and times named stages, which
+are only recorded while the instrumentation is enabled:
+
+    from tpsd.instrumentation import INSTRUMENTATION
+
+    INSTRUMENTATION.enable()
+    ...
+    print(INSTRUMENTATION.snapshot())
+
+The work done by pools of processes is recorded by each worker and merged in
+the parent with the results of its tasks (see run_instrumented).
+
+Author: Andrea Poltronieri (University of Bologna) and Jacopo de Berardinis
+(King's College of London)
+Copyright: 2022 Andrea Poltronieri and Jacopo de Berardinis
+License: MIT license
+"""
+import time
+from collections import Counter
+from contextlib import nullcontext
+from typing import Any, Callable, ContextManager, Optional
+
+# stage returned while the instrumentation is disabled, doing nothing
+_NULL_STAGE = nullcontext()
+
+
+class InstrumentationHook:
+    """
+    Receiver of the events of the instrumentation, e.g. to export the metrics
+    or to drive a sampling profiler. The methods do nothing by default and are
+    overridden by the subclasses.
+    """
+
+    def on_count(self, name: str, amount: int) -> None:
+        """
+        Called when a counter is incremented.
+        :param name: the name of the counter
+        :param amount: the increment
+        :return: None
+        """
+
+    def on_stage_start(self, name: str) -> None:
+        """
+        Called when a stage starts.
+        :param name: the name of the stage
+        :return: None
+        """
+
+    def on_stage_end(self, name: str, elapsed: float) -> None:
+        """
+        Called when a stage ends.
+        :param name: the name of the stage
+        :param elapsed: the duration (in seconds) of the stage
+        :return: None
+        """
+
+
+class _Stage:
+    """
+    Context manager timing a stage.
+    """
+    __slots__ = ('instrumentation', 'name', 'start')
+
+    def __init__(self, instrumentation: 'Instrumentation', name: str) -> None:
+        self.instrumentation = instrumentation
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self) -> '_Stage':
+        for hook in self.instrumentation.hooks:
+            hook.on_stage_start(self.name)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *_) -> None:
+        elapsed = time.perf_counter() - self.start
+        self.instrumentation.record(self.name, elapsed)
+
+
+class Instrumentation:
+    """
+    Named counters and cumulative stage timers, disabled by default so that
+    the instrumented code only pays for a flag check.
+    """
+
+    def __init__(self) -> None:
+        """
+        Initialises disabled instrumentation, without hooks.
+        :return: None
+        """
+        self.enabled = False
+        self.counters = Counter()
+        self.timers = {}
+        self.hooks = []
+
+    def enable(self) -> None:
+        """
+        Starts recording the counters and the stages.
+        :return: None
+        """
+        self.enabled = True
+
+    def disable(self) -> None:
+        """
+        Stops recording the counters and the stages, keeping the values
+        recorded so far.
+        :return: None
+        """
+        self.enabled = False
+
+    def reset(self) -> None:
+        """
+        Clears the counters and the timers.
+        :return: None
+        """
+        self.counters.clear()
+        self.timers.clear()
+
+    def add_hook(self, hook: InstrumentationHook) -> None:
+        """
+        Attaches a hook, receiving the events while enabled.
+        :param hook: the hook
+        :return: None
+        """
+        self.hooks.append(hook)
+
+    def remove_hook(self, hook: InstrumentationHook) -> None:
+        """
+        Detaches a hook.
+        :param hook: the hook
+        :return: None
+        """
+        self.hooks.remove(hook)
+
+    def count(self, name: str, amount: int = 1) -> None:
+        """
+        Increments a counter, if enabled.
+        :param name: the name of the counter
+        :param amount: the increment
+        :return: None
+        """
+        if self.enabled:
+            self.counters[name] += amount
+            for hook in self.hooks:
+                hook.on_count(name, amount)
+
+    def stage(self, name: str) -> ContextManager:
+        """
+        Times a stage, if enabled: the duration of the block run within the
+        returned context manager is added to the timer of the stage.
+        :param name: the name of the stage
+        :return: the context manager timing the stage.
+        """
+        if self.enabled:
+            return _Stage(self, name)
+        return _NULL_STAGE
+
+    def record(self, name: str, elapsed: float) -> None:
+        """
+        Adds the duration of a run of a stage to its timer.
+        :param name: the name of the stage
+        :param elapsed: the duration (in seconds) of the run
+        :return: None
+        """
+        total, calls = self.timers.get(name, (0.0, 0))
+        self.timers[name] = (total + elapsed, calls + 1)
+        for hook in self.hooks:
+            hook.on_stage_end(name, elapsed)
+
+    def snapshot(self) -> dict:
+        """
+        Reports the values recorded so far.
+        :return: a dictionary containing the counters and, for each stage, the
+        cumulative time (in seconds) and the number of runs.
+        """
+        return {'counters': dict(self.counters),
+                'stages': {name: {'seconds': total, 'calls': calls}
+                           for name, (total, calls) in self.timers.items()}}
+
+    def merge(self, snapshot: Optional[dict]) -> None:
+        """
+        Adds the values of a snapshot (e.g. taken by a worker process) to the
+        counters and the timers, without notifying the hooks.
+        :param snapshot: the snapshot, or None to add nothing
+        :return: None
+        """
+        if snapshot is None:
+            return
+        self.counters.update(snapshot['counters'])
+        for name, stage in snapshot['stages'].items():
+            total, calls = self.timers.get(name, (0.0, 0))
+            self.timers[name] = (total + stage['seconds'],
+                                 calls + stage['calls'])
+
+
+# instrumentation shared by all the modules
+INSTRUMENTATION = Instrumentation()
+
+
+def run_instrumented(enabled: bool, function: Callable,
+                     *args) -> tuple[Any, Optional[dict]]:
+    """
+    Runs a task in a worker process, recording its instrumentation apart so
+    that the parent process can merge it.
+    :param enabled: whether the instrumentation is enabled in the parent
+    :param function: the task
+    :param args: the arguments of the task
+    :return: the result of the task, and the snapshot of its instrumentation
+    (None if disabled).
+    """
+    if not enabled:
+        return function(*args), None
+    INSTRUMENTATION.reset()
+    INSTRUMENTATION.enable()
+    try:
+        result = function(*args)
+        return result, INSTRUMENTATION.snapshot()
+    finally:
+        INSTRUMENTATION.reset()
@@ -0,0 +1,314 @@
+"""
+This file contains a streaming reader of iReal Pro chord corpora exported as
+CSV files (such as examples/all_the_things_versions.csv), converting them to
+the Harte notation used by the Tonal Pitch Step Distance (TPSD) algorithm as
+presented in:
+
+De Haas, W.B., Veltkamp, R.C., Wiering, F.: Tonal pitch step distance: a
+similarity measure for chord progressions.
+In: ISMIR. pp. 51–56 (2008)
+
+Author: Andrea Poltronieri (University of Bologna) and Jacopo de Berardinis
+(King's College of London)
+Copyright: 2022 Andrea Poltronieri and Jacopo de Berardinis
+License: MIT license
+"""
+import csv
+import re
+from functools import lru_cache
+from typing import Iterator, NamedTuple
+
+from tpsd.form import SongForm
+from tpsd.tps import NOTE_INDEX
+from tpsd.tpsd_core import Tpsd
+from tpsd.util import chunked
+
+ROOT = re.compile(r'[A-G][b#]?')
+# a token may contain several chords of the same bar (e.g. "Db69Bb7b9"), each
+# one starting with a root (or "W") that is not a bass note
+CHORD_START = re.compile(r'(?<!/)(?=[A-GW][b#]?)')
+# markers of endings (N1, N2, ...) and of the end of the song (U)
+MARKERS = re.compile(r'^(U|N\d)+')
+NO_CHORD = 'n'
+REPEAT_BAR = 'x'
+
+# intervals of the chords in semitones from the root, extensions being placed
+# in the second octave (e.g. 14 for the ninth) as in the Harte notation
+INTERVALS = {2: '2', 3: 'b3', 4: '3', 5: '4', 6: 'b5', 7: '5', 8: '#5',
+             9: '6', 10: 'b7', 11: '7', 13: 'b9', 14: '9', 15: '#9', 17: '11',
+             18: '#11', 20: 'b13', 21: '13'}
+ALTERATIONS = {'b5': 6, '#5': 8, 'b6': 8, 'b9': 13, '9': 14, '#9': 15,
+               '#11': 18, 'b13': 20, 'add9': 14, 'add3': 4}
+ALTERATION = re.compile(r'add[39]|b6|[b#](?:5|9|11|13)')
+# Harte shorthands, identified by the intervals of the chord
+SHORTHANDS = {
+    frozenset({4, 7}): 'maj', frozenset({3, 7}): 'min',
+    frozenset({3, 6}): 'dim', frozenset({4, 8}): 'aug',
+    frozenset({4, 7, 11}): 'maj7', frozenset({3, 7, 10}): 'min7',
+    frozenset({4, 7, 10}): '7', frozenset({3, 6, 9}): 'dim7',
+    frozenset({3, 6, 10}): 'hdim7', frozenset({3, 7, 11}): 'minmaj7',
+    frozenset({4, 7, 9}): 'maj6', frozenset({3, 7, 9}): 'min6',
+    frozenset({4, 7, 10, 14}): '9', frozenset({4, 7, 11, 14}): 'maj9',
+    frozenset({3, 7, 10, 14}): 'min9', frozenset({5, 7}): 'sus4',
+    frozenset({2, 7}): 'sus2',
+}
+# qualities left once the prefixes (e.g. "-", "h", "^") and the alterations
+# have been parsed
+QUALITY_BASES = ('', '7', '9', '11', '13', '6', '69', '2', '5')
+BASS_INTERVALS = {1: 'b2', 2: '2', 3: 'b3', 4: '3', 5: '4', 6: 'b5', 7: '5',
+                  8: 'b6', 9: '6', 10: 'b7', 11: '7'}
+
+
+class IRealSong(NamedTuple):
+    """
+    A song read from an iReal Pro CSV corpus, with its chords converted to the
+    Harte notation and their durations in beats.
+    """
+    title: str
+    composer: str
+    style: str
+    key: str
+    chords: list[str]
+    durations: list[int]
+    repeats: int
+    beats_per_bar: int
+
+    def as_song(self) -> tuple[list[str], str, list[int]]:
+        """
+        Gets the chord sequence, the key and the durations, as accepted by
+        Tpsd and TpsdCorpus.
+        """
+        return self.chords, self.key, self.durations
+
+    def form(self) -> SongForm:
+        """
+        Gets the form of the song, whose chords are all repeated.
+        """
+        return SongForm(0, len(self.chords), self.repeats)
+
+    def tpsd(self, repeat: bool = False) -> Tpsd:
+        """
+        Builds the Tpsd of the song.
+        :param repeat: whether the chords are played the number of times given
+        by the repeats of the song, instead of once
+        :type repeat: bool
+        """
+        return Tpsd(self.chords, self.key, self.durations,
+                    form=self.form() if repeat else None)
+
+
+def _intervals(quality: str) -> set[int]:
+    """
+    Computes the intervals (in semitones from the root) of an iReal Pro chord
+    quality, such as "-7", "^9", "7b9sus" or "h7". Raises a ValueError if
+    part of the quality is not recognised.
+    """
+    # pylint: disable=too-many-branches,too-many-statements
+    alterations = ALTERATION.findall(quality)
+    base = ALTERATION.sub('', quality)
+    sus = 'sus' in base
+    altered = 'alt' in base
+    base = base.replace('sus', '').replace('alt', '')
+
+    third, fifth = 4, 7
+    intervals = set()
+    if base.startswith('-'):
+        third = 3
+        base = base[1:]
+    elif base.startswith('h'):
+        # half-diminished chords always have a minor seventh
+        third, fifth = 3, 6
+        intervals.add(10)
+        base = base[1:].replace('7', '', 1)
+    elif base.startswith('o'):
+        third, fifth = 3, 6
+        if base.startswith('o7'):
+            intervals.add(9)
+            base = base[2:]
+        else:
+            base = base[1:]
+    elif base.startswith('+'):
+        fifth = 8
+        base = base[1:]
+    if base.startswith('^'):
+        intervals.add(11)
+        base = base[1:]
+    if base not in QUALITY_BASES:
+        raise ValueError(f'Unknown iReal chord quality "{quality}".')
+
+    if base in ('7', '9', '11', '13') and 11 not in intervals or altered:
+        intervals.add(10)
+    if base in ('9', '11', '13', '69'):
+        intervals.add(14)
+    if base == '11':
+        # dominant eleventh chords are played without their third
+        intervals.add(17)
+        if third == 4:
+            third = None
+    if base in ('13', '6', '69'):
+        intervals.add(21 if base == '13' else 9)
+    if base == '2':
+        third = 2
+    elif base == '5':
+        third = None
+    if altered:
+        intervals.update({13, 15, 20})
+        fifth = 6
+
+    for alteration in alterations:
+        if alteration in ('b5', '#5'):
+            fifth = ALTERATIONS[alteration]
+        else:
+            intervals.add(ALTERATIONS[alteration])
+    intervals.add(5 if sus else third)
+    intervals.add(fifth)
+    intervals.discard(None)
+    return intervals
+
+
+@lru_cache(maxsize=None)
+def ireal_to_harte(token: str) -> str:
+    """
+    Converts a chord expressed in the iReal Pro notation (e.g. "Db7#9",
+    "F-7", "Bb13", "Ab^7/Eb") to the Harte notation. Conversions are memoized.
+    :param token: the iReal Pro chord, having an explicit root
+    :type token: str
+    :return: the chord in the Harte notation.
+    """
+    match = ROOT.match(token)
+    if match is None:
+        raise ValueError(f'The iReal chord "{token}" has no valid root.')
+    root = match.group()
+    quality, _, bass = token[match.end():].partition('/')
+    intervals = _intervals(quality)
+    shorthand = SHORTHANDS.get(frozenset(intervals))
+    if shorthand is None:
+        shorthand = '(' + ','.join(INTERVALS[interval] for interval in
+                                   sorted(intervals)) + ')'
+    harte = f'{root}:{shorthand}'
+    if bass:
+        if ROOT.fullmatch(bass) is None:
+            raise ValueError(f'The iReal chord "{token}" has no valid bass.')
+        interval = (NOTE_INDEX[bass] - NOTE_INDEX[root]) % 12
+        if interval:
+            harte += '/' + BASS_INTERVALS[interval]
+    return harte
+
+
+def ireal_key(key: str) -> str:
+    """
+    Converts a key expressed in the iReal Pro notation (e.g. "Ab" or "C-") to
+    the Harte notation.
+    :param key: the iReal Pro key
+    :type key: str
+    :return: the key in the Harte notation (e.g. "Ab:maj" or "C:min").
+    """
+    key = key.strip()
+    if key.endswith('-'):
+        return f'{key[:-1]}:min'
+    return f'{key}:maj'
+
+
+def _split_beats(beats: int, parts: int) -> list[int]:
+    """
+    Splits the beats of a bar among its chords, as evenly as possible and
+    giving the remaining beats to the first chords.
+    """
+    return [beats // parts + (1 if part < beats % parts else 0)
+            for part in range(parts)]
+
+
+def parse_chords(chords: str, beats_per_bar: int) -> tuple[
+        list[str], list[int]]:
+    """
+    Converts the chords of an iReal Pro song to the Harte notation and computes
+    their durations. Since the corpus does not contain bar lines, each token
+    is considered a bar, split evenly among the chords it contains. Bars
+    without chords ("n") extend the previous chord, bars repeating the
+    previous one ("x") are expanded, and chords without an explicit root ("W")
+    take the root of the previous chord, or the whole chord if only a bass note
+    is given.
+    :param chords: the space-separated chord tokens
+    :type chords: str
+    :param beats_per_bar: the number of beats of each bar
+    :type beats_per_bar: int
+    :return: the chords in the Harte notation and the duration of each chord.
+    """
+    harte_chords, durations = [], []
+    previous_bar, previous_chord = [], None
+    for token in chords.split():
+        token = MARKERS.sub('', token)
+        if token == REPEAT_BAR:
+            bar_chords = previous_bar
+        elif token in (NO_CHORD, ''):
+            if durations:
+                durations[-1] += beats_per_bar
+            continue
+        else:
+            bar_chords = []
+            for chord in CHORD_START.split(token):
+                if not chord:
+                    continue
+                if chord.startswith('W'):
+                    if previous_chord is None:
+                        raise ValueError(f'The iReal chord "{chord}" has no '
+                                         f'previous chord.')
+                    # "W" alone or with a bass repeats the previous chord,
+                    # "W" followed by a quality keeps only its root
+                    chord = (previous_chord if chord[1:2] in ('', '/') else
+                             ROOT.match(previous_chord).group()) + chord[1:]
+                previous_chord = chord.partition('/')[0]
+                bar_chords.append(ireal_to_harte(chord))
+        for chord, beats in zip(bar_chords, _split_beats(
+                beats_per_bar, len(bar_chords))):
+            harte_chords.append(chord)
+            durations.append(beats)
+        previous_bar = bar_chords
+    return harte_chords, durations
+
+
+def iter_ireal_csv(path: str, skip_invalid: bool = False) -> Iterator[
+        IRealSong]:
+    """
+    Reads an iReal Pro CSV corpus row by row, so that the memory used does not
+    depend on the size of the corpus.
+    :param path: the path of the CSV file, having the columns title, composer,
+    style, key, repeats, time_signature and chords
+    :type path: str
+    :param skip_invalid: whether to skip the songs containing chords that
+    cannot be converted, instead of raising an error
+    :type skip_invalid: bool
+    :return: an iterator over the songs of the corpus.
+    """
+    with open(path, 'r', encoding='utf-8', newline='') as csv_file:
+        for row in csv.DictReader(csv_file):
+            beats_per_bar = int(re.findall(r'\d+', row['time_signature'])[0]) \
+                if row.get('time_signature') else 4
+            try:
+                chords, durations = parse_chords(row['chords'], beats_per_bar)
+            except (ValueError, KeyError, AttributeError) as exc:
+                if skip_invalid:
+                    continue
+                raise ValueError(f'Cannot convert the chords of '
+                                 f'"{row["title"]}": {exc}') from exc
+            yield IRealSong(row['title'], row.get('composer', ''),
+                            row.get('style', ''), ireal_key(row['key']),
+                            chords, durations,
+                            int(row['repeats']) if row.get('repeats') else 1,
+                            beats_per_bar)
+
+
+def iter_ireal_chunks(path: str, chunk_size: int = 1000,
+                      skip_invalid: bool = False) -> Iterator[list[IRealSong]]:
+    """
+    Reads an iReal Pro CSV corpus in chunks of songs.
+    :param path: the path of the CSV file
+    :type path: str
+    :param chunk_size: the maximum number of songs of each chunk
+    :type chunk_size: int
+    :param skip_invalid: whether to skip the songs containing chords that
+    cannot be converted
+    :type skip_invalid: bool
+    :return: an iterator over the chunks of songs.
+    """
+    yield from chunked(iter_ireal_csv(path, skip_invalid), chunk_size)
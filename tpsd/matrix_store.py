@@ -0,0 +1,200 @@
+"""
+This file contains the on-disk storage of the matrices of distances computed
+by means of the Tonal Pitch Step Distance (TPSD) algorithm as presented in:
+
+De Haas, W.B., Veltkamp, R.C., Wiering, F.: Tonal pitch step distance: a
+similarity measure for chord progressions.
+In: ISMIR. pp. 51–56 (2008)
+
+Author: Andrea Poltronieri (University of Bologna) and Jacopo de Berardinis
+(King's College of London)
+Copyright: 2022 Andrea Poltronieri and Jacopo de Berardinis
+License: MIT license
+"""
+import json
+import os
+
+import numpy as np
+
+ENCODINGS = ('float32', 'uint16')
+# fixed-point scale of the uint16 encoding: minimum areas range from 0 to 13,
+# so that 4096 steps per unit fit in 16 bits with an error below 1 / 8192
+UINT16_SCALE = 4096
+
+
+def matrix_tiles(size: int, tile_size: int,
+                 symmetric: bool = True) -> list[tuple[int, int, int, int]]:
+    """
+    Splits a square matrix in square tiles.
+    :param size: the number of rows and columns of the matrix
+    :type size: int
+    :param tile_size: the number of rows and columns of each tile
+    :type tile_size: int
+    :param symmetric: whether to keep only the tiles intersecting the upper
+    triangle of the matrix
+    :type symmetric: bool
+    :return: a list containing the first and last (excluded) row and column of
+    each tile.
+    """
+    return [(row, min(row + tile_size, size), column,
+             min(column + tile_size, size))
+            for row in range(0, size, tile_size)
+            for column in range(row if symmetric else 0, size, tile_size)]
+
+
+def open_matrix(path: str) -> np.ndarray:
+    """
+    Opens a stored distance matrix for reading without copying it in memory.
+    :param path: the path of the matrix file
+    :type path: str
+    :return: a read-only memory-mapped array containing the encoded matrix,
+    to be decoded with decode() if the uint16 encoding is used.
+    """
+    return np.load(path, mmap_mode='r')
+
+
+def decode(values: np.ndarray) -> np.ndarray:
+    """
+    Decodes (part of) a stored distance matrix into minimum areas.
+    :param values: the encoded values read from the matrix
+    :type values: np.ndarray
+    :return: an array of float minimum areas.
+    """
+    if values.dtype == np.uint16:
+        return values / UINT16_SCALE
+    return np.asarray(values, dtype=np.float64)
+
+
+class DistanceMatrixStore:
+    """
+    Memory-mapped square matrix of distances, written tile by tile and keeping
+    track of the completed tiles so that an interrupted computation can be
+    resumed.
+    """
+
+    def __init__(self, path: str, mode: str = 'r+') -> None:
+        """
+        Opens an existing matrix, created by DistanceMatrixStore.create().
+        :param path: the path of the matrix file
+        :type path: str
+        :param mode: the mode in which the files are memory-mapped ("r" or
+        "r+")
+        :type mode: str
+        :return: None
+        """
+        self.path = path
+        with open(self.metadata_path(path), 'r', encoding='utf-8') as file:
+            metadata = json.load(file)
+        self.size = metadata['size']
+        self.tile_size = metadata['tile_size']
+        self.symmetric = metadata['symmetric']
+        self.encoding = metadata['encoding']
+        self.matrix = np.load(path, mmap_mode=mode)
+        self.completed = np.load(self.tiles_path(path), mmap_mode=mode)
+
+    @staticmethod
+    def metadata_path(path: str) -> str:
+        """
+        Gets the path of the file describing the matrix.
+        """
+        return f'{path}.json'
+
+    @staticmethod
+    def tiles_path(path: str) -> str:
+        """
+        Gets the path of the file tracking the completed tiles.
+        """
+        return f'{path}.tiles.npy'
+
+    @classmethod
+    def create(cls, path: str, size: int, tile_size: int = 64,
+               symmetric: bool = True,
+               encoding: str = 'float32') -> 'DistanceMatrixStore':
+        """
+        Creates the files of an empty matrix, or opens them if a matrix having
+        the same parameters already exists, so that its computation is resumed.
+        :param path: the path of the matrix file (a .npy file)
+        :type path: str
+        :param size: the number of rows and columns of the matrix
+        :type size: int
+        :param tile_size: the number of rows and columns of each tile
+        :type tile_size: int
+        :param symmetric: whether only the tiles above the diagonal are
+        computed, each one being mirrored below it
+        :type symmetric: bool
+        :param encoding: "float32", or "uint16" to store fixed-point values
+        using half of the space
+        :type encoding: str
+        :return: the store of the matrix.
+        """
+        if encoding not in ENCODINGS:
+            raise ValueError(
+                f'Unknown encoding "{encoding}", use one of {ENCODINGS}')
+        metadata = {'size': size, 'tile_size': tile_size,
+                    'symmetric': symmetric, 'encoding': encoding}
+        if os.path.exists(cls.metadata_path(path)):
+            with open(cls.metadata_path(path), 'r', encoding='utf-8') as file:
+                if json.load(file) != metadata:
+                    raise ValueError(f'A different matrix is stored in {path}')
+            return cls(path)
+
+        tiles = -(-size // tile_size)
+        np.lib.format.open_memmap(path, mode='w+', dtype=encoding,
+                                  shape=(size, size)).flush()
+        np.lib.format.open_memmap(cls.tiles_path(path), mode='w+',
+                                  dtype=np.uint8, shape=(tiles, tiles)).flush()
+        with open(cls.metadata_path(path), 'w', encoding='utf-8') as file:
+            json.dump(metadata, file)
+        return cls(path)
+
+    def tiles(self) -> list[tuple[int, int, int, int]]:
+        """
+        Lists all the tiles of the matrix to be computed.
+        :return: a list containing the first and last (excluded) row and column
+        of each tile.
+        """
+        return matrix_tiles(self.size, self.tile_size, self.symmetric)
+
+    def pending_tiles(self) -> list[tuple[int, int, int, int]]:
+        """
+        Lists the tiles of the matrix that have not been completed yet.
+        :return: a list containing the first and last (excluded) row and column
+        of each pending tile.
+        """
+        return [tile for tile in self.tiles() if not self.completed[
+            tile[0] // self.tile_size, tile[2] // self.tile_size]]
+
+    def is_complete(self) -> bool:
+        """
+        Checks whether all the tiles of the matrix have been computed.
+        """
+        return not self.pending_tiles()
+
+    def write_tile(self, tile: tuple[int, int, int, int],
+                   block: np.ndarray) -> None:
+        """
+        Writes a computed tile, mirroring it if the matrix is symmetric, and
+        marks it as completed once its values are flushed to disk.
+        :param tile: the first and last (excluded) row and column of the tile
+        :type tile: tuple[int, int, int, int]
+        :param block: the minimum areas of the tile
+        :type block: np.ndarray
+        :return: None
+        """
+        row_start, row_stop, column_start, column_stop = tile
+        if self.encoding == 'uint16':
+            block = np.rint(block * UINT16_SCALE).astype(np.uint16)
+        self.matrix[row_start:row_stop, column_start:column_stop] = block
+        if self.symmetric:
+            self.matrix[column_start:column_stop, row_start:row_stop] = block.T
+        self.matrix.flush()
+        self.completed[row_start // self.tile_size,
+                       column_start // self.tile_size] = 1
+        self.completed.flush()
+
+    def read(self) -> np.ndarray:
+        """
+        Reads the whole matrix of minimum areas.
+        :return: the decoded matrix.
+        """
+        return decode(self.matrix)
@@ -0,0 +1,155 @@
+"""
+This file contains the online comparison of a chord sequence, whose chords
+arrive one at a time, with a fixed reference by means of the Tonal Pitch Step
+Distance (TPSD) algorithm as presented in:
+
+De Haas, W.B., Veltkamp, R.C., Wiering, F.: Tonal pitch step distance: a
+similarity measure for chord progressions.
+In: ISMIR. pp. 51–56 (2008)
+
+Author: Andrea Poltronieri (University of Bologna) and Jacopo de Berardinis
+(King's College of London)
+Copyright: 2022 Andrea Poltronieri and Jacopo de Berardinis
+License: MIT license
+"""
+import math
+from typing import Optional, Union
+
+import numpy as np
+
+from tpsd.cache import DEFAULT_CACHE, TpsCache
+from tpsd.profile import TpsdProfile
+from tpsd.tpsd_core import Tpsd
+
+
+class OnlineTpsdComparison:
+    """
+    Comparison between a fixed reference and a query whose chords are appended
+    as they arrive. The areas of all the shifts are kept up to date, so that
+    the minimum area (as computed by TpsdComparison) is available after each
+    chord without comparing the whole query again.
+    """
+    # pylint: disable=too-many-instance-attributes
+
+    def __init__(self, reference: Union[Tpsd, TpsdProfile],
+                 cache: Optional[TpsCache] = DEFAULT_CACHE) -> None:
+        """
+        Initialises the comparison with an empty query.
+        :param reference: the reference sequence, or its profile
+        :type reference: Union[Tpsd, TpsdProfile]
+        :param cache: the cache of the TPS distances between chords and keys
+        used for the query
+        :type cache: Optional[TpsCache]
+        :return: None
+        """
+        if isinstance(reference, Tpsd):
+            reference = reference.profile()
+        if not reference:
+            raise ValueError('The reference sequence is empty.')
+        self.reference = reference
+        self.query = Tpsd([], [], [], cache)
+        self._sequence = reference.to_array()
+        # cumulative sums of the differences between each value taken by the
+        # query and the reference, computed on first use
+        self._differences = {}
+        # areas of the query starting at each beat of the reference, complete
+        # for the shifts at which the query fits in the reference
+        self._forward = np.zeros(len(reference))
+        # areas of the reference starting at each beat of the query, from the
+        # first shift which is not complete yet
+        self._pending = np.zeros(0)
+        self._pending_start = 0
+        self._best = (math.inf, -1)
+
+    def __len__(self) -> int:
+        return len(self.query.profile())
+
+    def _cumulative_differences(self, value: float) -> np.ndarray:
+        """
+        Gets the cumulative sums of the absolute differences between a value and
+        each beat of the reference.
+        """
+        if value not in self._differences:
+            self._differences[value] = np.concatenate((
+                [0], np.cumsum(np.abs(value - self._sequence))))
+        return self._differences[value]
+
+    def append(self, chord: str, key: str, beats: int) -> None:
+        """
+        Appends a chord to the query, updating the areas of the shifts it
+        overlaps in O(R + beats) time, where R is the length of the reference.
+        :param chord: a chord expressed using the Harte notation
+        :type chord: str
+        :param key: the key of the chord
+        :type key: str
+        :param beats: the duration (in beats) of the chord
+        :type beats: int
+        :return: None
+        """
+        start = len(self)
+        self.query.append(chord, key, beats)
+        if beats <= 0:
+            return
+        self._add_segment(self.query.profile().values[-1], start, beats)
+
+    def _add_segment(self, value: float, start: int, beats: int) -> None:
+        """
+        Adds the contribution of a segment of the query, lasting from the given
+        beat for a number of beats, to the areas of all the shifts.
+        """
+        length = len(self._sequence)
+        stop = start + beats
+        differences = self._cumulative_differences(value)
+
+        # query shorter than the reference: beat t of the query is compared
+        # with beat s + t of the reference at shift s
+        if start < length:
+            shifts = np.arange(length - start)
+            self._forward[:length - start] += differences[np.minimum(
+                length, shifts + stop)] - differences[shifts + start]
+
+        # query longer than the reference: beat t of the query is compared
+        # with beat t - s of the reference at shift s
+        self._pending = np.concatenate((self._pending, np.zeros(
+            stop - self._pending_start - len(self._pending))))
+        first = max(0, start - length + 1)
+        shifts = np.arange(first, stop)
+        self._pending[first - self._pending_start:] += differences[np.minimum(
+            stop - shifts, length)] - differences[np.maximum(start - shifts, 0)]
+
+        # the shifts at which the reference has been entirely compared are
+        # complete, and only their minimum is kept
+        completed = stop - length + 1 - self._pending_start
+        if completed > 0:
+            position = int(np.argmin(self._pending[:completed]))
+            if self._pending[position] < self._best[0]:
+                self._best = (float(self._pending[position]),
+                              self._pending_start + position)
+            self._pending = self._pending[completed:]
+            self._pending_start += completed
+
+    def minimum_area(self, return_offset: bool = False) -> Union[
+            float, tuple[float, int]]:
+        """
+        Calculates the minimum area between the query received so far and the
+        reference, as done by TpsdComparison.
+        :param return_offset: whether to return also the beat of the longest
+        sequence at which the shortest one is aligned when the minimum is
+        reached
+        :type return_offset: bool
+        :return: the minimum area normalised by the length of the shortest
+        sequence (inf if the query is empty), and the offset (-1 if the query is
+        empty) if return_offset is True.
+        """
+        query_length, length = len(self), len(self._sequence)
+        if not query_length:
+            minimum, offset = math.inf, -1
+        elif query_length <= length:
+            areas = self._forward[:length - query_length + 1]
+            offset = int(np.argmin(areas))
+            minimum = float(areas[offset]) / query_length
+        else:
+            minimum, offset = self._best[0] / length, self._best[1]
+        if return_offset:
+            return minimum, offset
+        return minimum
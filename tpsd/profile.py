@@ -0,0 +1,195 @@
+"""
+This file contains the run-length representation of the step functions
+computed by the Tonal Pitch Step Distance (TPSD) algorithm as presented in:
+
+De Haas, W.B., Veltkamp, R.C., Wiering, F.: Tonal pitch step distance: a
+similarity measure for chord progressions.
+In: ISMIR. pp. 51–56 (2008)
+
+Author: Andrea Poltronieri (University of Bologna) and Jacopo de Berardinis
+(King's College of London)
+Copyright: 2022 Andrea Poltronieri and Jacopo de Berardinis
+License: MIT license
+"""
+from bisect import bisect_right
+from typing import Union
+
+import numpy as np
+
+RESOLUTIONS = ('beat', 'half-bar', 'bar')
+
+
+def resolution_beats(resolution: Union[int, str],
+                     beats_per_bar: int = 4) -> int:
+    """
+    Converts a time resolution into a number of beats.
+    :param resolution: "beat", "half-bar", "bar" or a number of beats
+    :type resolution: Union[int, str]
+    :param beats_per_bar: the number of beats of each bar
+    :type beats_per_bar: int
+    :return: the number of beats of each sample.
+    """
+    if isinstance(resolution, str):
+        if resolution not in RESOLUTIONS:
+            raise ValueError(f'Unknown resolution "{resolution}", use one of '
+                             f'{RESOLUTIONS} or a number of beats')
+        if resolution == 'half-bar' and beats_per_bar % 2:
+            raise ValueError('Bars having an odd number of beats cannot be '
+                             'split in halves')
+        resolution = {'beat': 1, 'half-bar': beats_per_bar // 2,
+                      'bar': beats_per_bar}[resolution]
+    if resolution < 1:
+        raise ValueError('The resolution must be at least one beat.')
+    return resolution
+
+
+class TpsdProfile:
+    """
+    Step function of the TPS distances of a chord sequence, stored as a list of
+    (value, duration) segments instead of one value per beat.
+    """
+
+    def __init__(self, values: list[float], durations: list[int]) -> None:
+        """
+        Builds the profile from the TPS distance and the duration of each chord.
+        Consecutive chords having the same distance are merged in one segment
+        and chords lasting zero beats are discarded.
+        :param values: the TPS distance of each chord
+        :type values: list[float]
+        :param durations: the duration (in beats) of each chord
+        :type durations: list[int]
+        :return: None
+        """
+        if len(values) != len(durations):
+            raise ValueError("Size mismatch: cannot compute TSPD profile")
+        self.values = []
+        self.durations = []
+        self.ends = []
+        for value, duration in zip(values, durations):
+            self.append(value, duration)
+
+    def append(self, value: float, duration: int) -> None:
+        """
+        Appends a chord at the end of the profile in constant time, merging it
+        with the last segment if they have the same distance.
+        :param value: the TPS distance of the chord
+        :type value: float
+        :param duration: the duration (in beats) of the chord
+        :type duration: int
+        :return: None
+        """
+        if duration <= 0:
+            return
+        if self.values and self.values[-1] == value:
+            self.durations[-1] += duration
+            self.ends[-1] += duration
+        else:
+            self.values.append(value)
+            self.durations.append(duration)
+            self.ends.append(len(self) + duration)
+
+    @classmethod
+    def from_sequence(cls, sequence: list[float]) -> 'TpsdProfile':
+        """
+        Builds the profile from a list containing one value per beat.
+        :param sequence: the TPS distance of each beat
+        :type sequence: list[float]
+        :return: the run-length profile of the sequence.
+        """
+        return cls(list(sequence), [1] * len(sequence))
+
+    def __len__(self) -> int:
+        return self.ends[-1] if self.ends else 0
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, TpsdProfile):
+            return NotImplemented
+        return self.values == other.values and self.durations == other.durations
+
+    def __repr__(self) -> str:
+        return f'TpsdProfile({self.values}, {self.durations})'
+
+    @property
+    def segments(self) -> list[tuple[float, int]]:
+        """
+        The (value, duration) segments of the profile.
+        """
+        return list(zip(self.values, self.durations))
+
+    def expand(self) -> list[float]:
+        """
+        Expands the profile into one value per beat.
+        :return: a list containing the TPS distance of each beat.
+        """
+        sequence = []
+        for value, duration in zip(self.values, self.durations):
+            sequence.extend([value] * duration)
+        return sequence
+
+    def to_array(self) -> np.ndarray:
+        """
+        Expands the profile into a NumPy array containing one value per beat.
+        :return: an array containing the TPS distance of each beat.
+        """
+        return np.repeat(np.asarray(self.values, dtype=np.float64),
+                         self.durations)
+
+    def resample(self, resolution: int) -> 'TpsdProfile':
+        """
+        Resamples the profile with one value every given number of beats. Each
+        value is the mean of the profile over its beats, weighted by the
+        duration of each chord, so that chords not aligned with the samples
+        contribute in proportion to their overlap. The last sample is the mean
+        of the remaining beats.
+        :param resolution: the number of beats of each sample
+        :type resolution: int
+        :return: the profile containing one segment per sample (or run of equal
+        samples), whose durations are expressed in samples.
+        """
+        if resolution == 1 or not self.values:
+            return TpsdProfile(list(self.values), list(self.durations))
+        bounds = np.append(np.arange(0, len(self), resolution), len(self))
+        # the integral of the step function is linear between the chord ends
+        integrals = np.interp(bounds, [0] + self.ends, np.concatenate((
+            [0], np.cumsum(np.multiply(self.values, self.durations)))))
+        means = np.diff(integrals) / np.diff(bounds)
+        return TpsdProfile(means.tolist(), [1] * len(means))
+
+    def step_points(self) -> tuple[list[int], list[float]]:
+        """
+        Computes the points of the profile to be drawn as a step function with
+        the "pre" style, equivalent to drawing the expanded sequence.
+        :return: the x and y coordinates of the points.
+        """
+        if not self.values:
+            return [], []
+        return [0] + [end - 1 for end in self.ends], \
+            [self.values[0]] + self.values
+
+    def area(self, other: 'TpsdProfile', offset: int = 0) -> float:
+        """
+        Calculates the area between this profile and another (longer) profile,
+        when this profile starts at a given beat of the other one.
+        :param other: the profile to be compared, which must contain this one
+        once shifted
+        :type other: TpsdProfile
+        :param offset: the beat of the other profile at which this profile
+        starts
+        :type offset: int
+        :return: the area between the two step functions, which is the sum of
+        the absolute differences of the values at each beat.
+        """
+        if offset < 0 or offset + len(self) > len(other):
+            raise ValueError('The shifted profile exceeds the other profile.')
+        area = 0
+        position = offset
+        index = bisect_right(other.ends, position)
+        for value, duration in zip(self.values, self.durations):
+            end = position + duration
+            while position < end:
+                step = min(end, other.ends[index]) - position
+                area += abs(value - other.values[index]) * step
+                position += step
+                if position == other.ends[index]:
+                    index += 1
+        return area
@@ -0,0 +1,186 @@
+"""
+This file contains a persistent cache of the minimum areas computed by means of
+the Tonal Pitch Step Distance (TPSD) algorithm as presented in:
+
+De Haas, W.B., Veltkamp, R.C., Wiering, F.: Tonal pitch step distance: a
+similarity measure for chord progressions.
+In: ISMIR. pp. 51–56 (2008)
+
+Profiles are identified by a hash of their content, so that identical profiles
+(e.g. the same song in two datasets) share their results, which are stored in a
+SQLite database keyed by the pair of hashes and the version of the algorithm.
+
+Author: Andrea Poltronieri (University of Bologna) and Jacopo de Berardinis
+(King's College of London)
+Copyright: 2022 Andrea Poltronieri and Jacopo de Berardinis
+License: MIT license
+"""
+import hashlib
+import os
+import sqlite3
+from typing import Iterable, Optional
+
+import numpy as np
+
+from tpsd.profile import TpsdProfile
+
+# to be increased whenever a change alters the minimum areas, so that the
+# results computed by previous versions are no longer used
+ALGORITHM_VERSION = 1
+# number of pairs looked up or stored by each SQL statement
+BATCH_SIZE = 10000
+
+
+def profile_hash(profile: TpsdProfile) -> str:
+    """
+    Hashes the content of a profile. Since the segments of a profile are merged
+    when equal, profiles having the same step function have the same hash.
+    :param profile: the profile
+    :type profile: TpsdProfile
+    :return: the hexadecimal digest of the profile.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(np.asarray(profile.values, dtype='<f8').tobytes())
+    digest.update(np.asarray(profile.durations, dtype='<i8').tobytes())
+    return digest.hexdigest()
+
+
+def pair_key(hash_a: str, hash_b: str) -> tuple[str, str]:
+    """
+    Orders the hashes of a pair, the minimum area not depending on the order of
+    the two profiles.
+    """
+    return (hash_a, hash_b) if hash_a <= hash_b else (hash_b, hash_a)
+
+
+class ResultCache:
+    """
+    On-disk cache of the minimum areas between pairs of profiles, keeping track
+    of its hit rate.
+    """
+
+    def __init__(self, path: str, version: int = ALGORITHM_VERSION) -> None:
+        """
+        Opens the cache, creating its database if needed.
+        :param path: the path of the SQLite database
+        :type path: str
+        :param version: the version of the algorithm whose results are read
+        and written
+        :type version: int
+        :return: None
+        """
+        self.path = path
+        self.version = version
+        self.hits = 0
+        self.misses = 0
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS results (first TEXT NOT NULL, '
+            'second TEXT NOT NULL, version INTEGER NOT NULL, area REAL NOT '
+            'NULL, PRIMARY KEY (first, second, version)) WITHOUT ROWID')
+        self.connection.commit()
+
+    def __len__(self) -> int:
+        return self.connection.execute(
+            'SELECT COUNT(*) FROM results WHERE version = ?',
+            (self.version,)).fetchone()[0]
+
+    def __enter__(self) -> 'ResultCache':
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """
+        Closes the database.
+        :return: None
+        """
+        self.connection.close()
+
+    def get(self, hash_a: str, hash_b: str) -> Optional[float]:
+        """
+        Looks up the minimum area between two profiles.
+        :param hash_a: the hash of the first profile
+        :type hash_a: str
+        :param hash_b: the hash of the second profile
+        :type hash_b: str
+        :return: the stored minimum area, or None if it was never computed.
+        """
+        return self.get_many([(hash_a, hash_b)]).get(pair_key(hash_a, hash_b))
+
+    def get_many(self, pairs: Iterable[tuple[str, str]]) -> dict[
+            tuple[str, str], float]:
+        """
+        Looks up the minimum areas between several pairs of profiles.
+        :param pairs: the hashes of the two profiles of each pair
+        :type pairs: Iterable[tuple[str, str]]
+        :return: a dictionary mapping the ordered hashes of each stored pair to
+        its minimum area.
+        """
+        keys = list(dict.fromkeys(pair_key(*pair) for pair in pairs))
+        found = {}
+        with self.connection:
+            self.connection.execute(
+                'CREATE TEMP TABLE IF NOT EXISTS wanted (first TEXT, second '
+                'TEXT)')
+            for start in range(0, len(keys), BATCH_SIZE):
+                self.connection.execute('DELETE FROM wanted')
+                self.connection.executemany(
+                    'INSERT INTO wanted VALUES (?, ?)',
+                    keys[start:start + BATCH_SIZE])
+                found.update(((first, second), area) for first, second, area in
+                             self.connection.execute(
+                                 'SELECT results.first, results.second, area '
+                                 'FROM wanted JOIN results ON results.first = '
+                                 'wanted.first AND results.second = '
+                                 'wanted.second AND results.version = ?',
+                                 (self.version,)))
+            self.connection.execute('DELETE FROM wanted')
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def put(self, hash_a: str, hash_b: str, minimum: float) -> None:
+        """
+        Stores the minimum area between two profiles.
+        :param hash_a: the hash of the first profile
+        :type hash_a: str
+        :param hash_b: the hash of the second profile
+        :type hash_b: str
+        :param minimum: the minimum area
+        :type minimum: float
+        :return: None
+        """
+        self.put_many([(hash_a, hash_b, minimum)])
+
+    def put_many(self, results: Iterable[tuple[str, str, float]]) -> None:
+        """
+        Stores the minimum areas between several pairs of profiles, in a
+        single transaction.
+        :param results: the hashes of the two profiles and the minimum area of
+        each pair
+        :type results: Iterable[tuple[str, str, float]]
+        :return: None
+        """
+        with self.connection:
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)',
+                ((*pair_key(hash_a, hash_b), self.version, float(minimum))
+                 for hash_a, hash_b, minimum in results))
+
+    def stats(self) -> dict:
+        """
+        Reports the size of the cache and its hit rate since it was opened.
+        :return: a dictionary containing the number of stored results (for the
+        current version and overall), the size of the database in bytes and
+        the number of hits and misses.
+        """
+        lookups = self.hits + self.misses
+        return {'entries': len(self),
+                'all_entries': self.connection.execute(
+                    'SELECT COUNT(*) FROM results').fetchone()[0],
+                'bytes': os.path.getsize(self.path)
+                if os.path.exists(self.path) else 0,
+                'hits': self.hits, 'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0}
@@ -0,0 +1,157 @@
+"""
+This file contains the search of short chord progressions within the songs of
+a corpus, by means of the step functions computed by the Tonal Pitch Step
+Distance (TPSD) algorithm as presented in:
+
+De Haas, W.B., Veltkamp, R.C., Wiering, F.: Tonal pitch step distance: a
+similarity measure for chord progressions.
+In: ISMIR. pp. 51–56 (2008)
+
+Author: Andrea Poltronieri (University of Bologna) and Jacopo de Berardinis
+(King's College of London)
+Copyright: 2022 Andrea Poltronieri and Jacopo de Berardinis
+License: MIT license
+"""
+from typing import Any, Hashable, Iterable, NamedTuple, Optional, Union
+
+import numpy as np
+
+from tpsd import area
+from tpsd.corpus import TpsdCorpus
+from tpsd.profile import TpsdProfile
+from tpsd.tpsd_core import Tpsd
+
+# maximum number of beats of the songs compared with the pattern at once
+BATCH_BEATS = 1 << 22
+
+
+class SubsequenceMatch(NamedTuple):
+    """
+    An occurrence of a pattern within a song.
+    """
+    label: Any
+    offset: int
+    area: float
+
+
+def select_matches(areas: np.ndarray, k: int, separation: int,
+                   max_area: Optional[float] = None) -> list[
+        tuple[int, float]]:
+    """
+    Selects the shifts having the smallest areas, discarding the shifts too
+    close to an already selected one, so that the matches do not overlap.
+    :param areas: the area of each shift of the pattern over a song
+    :type areas: np.ndarray
+    :param k: the maximum number of shifts to be selected
+    :type k: int
+    :param separation: the minimum distance (in beats) between two selected
+    shifts
+    :type separation: int
+    :param max_area: if given, the maximum area of the selected shifts
+    :type max_area: Optional[float]
+    :return: a list of (offset, area) pairs, sorted by area and then by offset.
+    """
+    order = np.argsort(areas, kind='stable')
+    if max_area is not None:
+        order = order[areas[order] <= max_area]
+    blocked = np.zeros(len(areas), dtype=bool)
+    matches = []
+    for offset in order:
+        if len(matches) == k:
+            break
+        if blocked[offset]:
+            continue
+        matches.append((int(offset), float(areas[offset])))
+        blocked[max(0, offset - separation + 1):offset + separation] = True
+    return matches
+
+
+class SubsequenceSearch:
+    """
+    Search of a pattern within all the songs of a corpus. The songs are
+    concatenated, so that the areas of all the shifts of the pattern over many
+    songs are computed at once, and only the shifts lying within a song are
+    kept.
+    """
+    # pylint: disable=too-few-public-methods
+
+    def __init__(self, corpus: TpsdCorpus,
+                 labels: Optional[Iterable[Hashable]] = None,
+                 method: str = 'auto') -> None:
+        """
+        Prepares the songs of a corpus for the search.
+        :param corpus: the corpus containing the profiles of the songs
+        :type corpus: TpsdCorpus
+        :param labels: the label of each song, defaulting to its position in the
+        corpus
+        :type labels: Optional[Iterable[Hashable]]
+        :param method: the engine used to compare all the shifts
+        :type method: str
+        :return: None
+        """
+        self.sequences, self.bounds = corpus.flatten()
+        self.labels = list(range(len(corpus))) if labels is None else \
+            list(labels)
+        if len(self.labels) != len(corpus):
+            raise ValueError('Size mismatch: one label is needed per song')
+        self.method = method
+
+    def _batches(self) -> Iterable[tuple[int, int]]:
+        """
+        Groups consecutive songs in batches of at most BATCH_BEATS beats (or a
+        single longer song).
+        """
+        first = 0
+        for song in range(1, len(self.labels) + 1):
+            if song == len(self.labels) or \
+                    self.bounds[song + 1] - self.bounds[first] > BATCH_BEATS:
+                yield first, song
+                first = song
+
+    def search(self, pattern: Union[Tpsd, TpsdProfile], k: int = 1,
+               max_area: Optional[float] = None,
+               separation: Optional[int] = None) -> list[SubsequenceMatch]:
+        """
+        Finds the best occurrences of a pattern within each song of the corpus.
+        Songs shorter than the pattern do not contain any occurrence.
+        :param pattern: the pattern to be found, or its profile
+        :type pattern: Union[Tpsd, TpsdProfile]
+        :param k: the maximum number of occurrences returned for each song
+        :type k: int
+        :param max_area: if given, the maximum area of the occurrences
+        :type max_area: Optional[float]
+        :param separation: the minimum distance (in beats) between two
+        occurrences within a song, defaulting to the length of the pattern so
+        that occurrences do not overlap
+        :type separation: Optional[int]
+        :return: the occurrences, sorted by song and then by area, each one
+        containing the label of the song, the beat at which the pattern starts
+        and the area normalised by the length of the pattern, as computed by
+        TpsdComparison.
+        """
+        # pylint: disable=too-many-locals
+        if isinstance(pattern, Tpsd):
+            pattern = pattern.profile()
+        sequence = pattern.to_array()
+        length = len(sequence)
+        if not length:
+            raise ValueError('The pattern is empty.')
+        separation = length if separation is None else max(1, separation)
+
+        matches = []
+        for first, last in self._batches():
+            start, stop = self.bounds[first], self.bounds[last]
+            if stop - start < length:
+                continue
+            areas = area.compute_shift_areas(
+                sequence, self.sequences[start:stop], self.method) / length
+            for song in range(first, last):
+                song_start = self.bounds[song] - start
+                song_stop = self.bounds[song + 1] - start - length + 1
+                if song_stop <= song_start:
+                    continue
+                matches.extend(
+                    SubsequenceMatch(self.labels[song], offset, song_area)
+                    for offset, song_area in select_matches(
+                        areas[song_start:song_stop], k, separation, max_area))
+        return matches
@@ -0,0 +1,455 @@
+"""
+This file contains a local HTTP/JSON service answering similarity queries
+against a resident corpus by means of the Tonal Pitch Step Distance (TPSD)
+algorithm as presented in:
+
+De Haas, W.B., Veltkamp, R.C., Wiering, F.: Tonal pitch step distance: a
+similarity measure for chord progressions.
+In: ISMIR. pp. 51–56 (2008)
+
+The corpus is loaded once. Queries arriving within a short window are
+coalesced in a batch, which is answered by a worker pool so that the event
+loop stays responsive. Usage:
+
+    python -m tpsd.service --ireal examples/all_the_things_versions.csv
+
+    POST /query   {"chords": ["C:maj", "A:min", ...], "key": "C:maj",
+                   "durations": [4, 4, ...], "k": 10}
+    GET  /stats
+    GET  /health
+
+Author: Andrea Poltronieri (University of Bologna) and Jacopo de Berardinis
+(King's College of London)
+Copyright: 2022 Andrea Poltronieri and Jacopo de Berardinis
+License: MIT license
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import time
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, \
+    ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Optional, Union
+
+import numpy as np
+
+from tpsd.corpus_cache import CorpusCache
+from tpsd.index import TpsdIndex
+from tpsd.ireal import iter_ireal_csv
+from tpsd.tpsd_core import Tpsd
+
+# index shared with the worker processes, set once by _init_worker
+_WORKER_INDEX = None
+# number of latencies kept to compute their percentiles
+LATENCY_WINDOW = 10000
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found',
+           405: 'Method Not Allowed', 500: 'Internal Server Error'}
+
+Query = tuple[list[str], Union[str, list[str]], list[int], int]
+
+
+def _init_worker(index: TpsdIndex) -> None:
+    """
+    Stores the index of the corpus in a worker process, so that it is
+    transferred once per worker instead of once per batch.
+    :param index: the index of the corpus
+    :return: None
+    """
+    global _WORKER_INDEX  # pylint: disable=global-statement
+    _WORKER_INDEX = index
+
+
+def _answer_batch(queries: list[Query],
+                  index: Optional[TpsdIndex] = None) -> list:
+    """
+    Answers a batch of queries in a worker, computing their profiles and
+    searching the corpus. A query that cannot be parsed gets its error message
+    instead of failing the whole batch.
+    :param queries: the chord sequence, the key(s), the durations and the
+    number of results of each query
+    :param index: the index of the corpus, defaulting to the one of the worker
+    :return: for each query, the list of (label, minimum area) pairs or the
+    error message.
+    """
+    # pylint: disable=broad-except
+    index = _WORKER_INDEX if index is None else index
+    profiles, errors = [], {}
+    for position, (chords, keys, durations, _) in enumerate(queries):
+        try:
+            profile = Tpsd(chords, keys, durations).profile()
+            if not profile:
+                raise ValueError('The query is empty.')
+            profiles.append(profile)
+        except Exception as exc:
+            errors[position] = f'{type(exc).__name__}: {exc}'
+            profiles.append(None)
+    answers = {}
+    for k in sorted({query[3] for query in queries}):
+        positions = [position for position, query in enumerate(queries)
+                     if query[3] == k and position not in errors]
+        try:
+            answers.update(zip(positions, index.query_batch(
+                [profiles[position] for position in positions], k)))
+        except Exception:
+            # the queries are answered one by one, to isolate the failing ones
+            for position in positions:
+                try:
+                    answers[position] = index.query_batch(
+                        [profiles[position]], k)[0]
+                except Exception as exc:
+                    errors[position] = f'{type(exc).__name__}: {exc}'
+
+    return [errors[position] if position in errors else answers[position]
+            for position in range(len(queries))]
+
+
+def parse_query(payload: Any) -> Query:
+    """
+    Validates the JSON payload of a query.
+    :param payload: the decoded JSON payload
+    :return: the chord sequence, the key(s), the durations and the number of
+    results of the query.
+    """
+    if not isinstance(payload, dict):
+        raise ValueError('The query must be a JSON object.')
+    chords, keys = payload.get('chords'), payload.get('key')
+    durations, k = payload.get('durations'), payload.get('k', 10)
+    if not isinstance(chords, list) or not all(
+            isinstance(chord, str) for chord in chords):
+        raise ValueError('"chords" must be a list of Harte chord labels.')
+    if not isinstance(keys, (str, list)):
+        raise ValueError('"key" must be a key or a list of keys.')
+    if not isinstance(durations, list) or not all(
+            isinstance(beats, int) and not isinstance(beats, bool) and
+            beats > 0 for beats in durations):
+        raise ValueError('"durations" must be a list of positive numbers of '
+                         'beats.')
+    if not isinstance(k, int) or isinstance(k, bool) or k < 1:
+        raise ValueError('"k" must be a positive number.')
+    if len(chords) != len(durations) or (
+            isinstance(keys, list) and len(keys) != len(chords)):
+        raise ValueError('Size mismatch: one key and one duration are needed '
+                         'per chord.')
+    return chords, keys, durations, k
+
+
+class QueryService:
+    """
+    Asynchronous service answering similarity queries against a corpus,
+    coalescing the queries arriving within a short window in batches.
+    """
+    # pylint: disable=too-many-instance-attributes
+
+    def __init__(self, index: TpsdIndex, window: float = 0.005,
+                 max_batch: int = 64, workers: int = 1) -> None:
+        """
+        Prepares the service.
+        :param index: the index of the corpus
+        :type index: TpsdIndex
+        :param window: the time (in seconds) waited after the first query of a
+        batch for more queries to be coalesced
+        :type window: float
+        :param max_batch: the maximum number of queries of a batch
+        :type max_batch: int
+        :param workers: the number of worker processes answering the batches.
+        With 0 workers, batches are answered by a thread of the service
+        process.
+        :type workers: int
+        :return: None
+        """
+        self.index = index
+        self.window = window
+        self.max_batch = max_batch
+        self.workers = workers
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.counters = {'requests': 0, 'errors': 0, 'batches': 0,
+                         'batched_queries': 0, 'max_queue_depth': 0,
+                         'max_batch_size': 0, 'pool_restarts': 0}
+        self._queue = None
+        self._executor = None
+        self._tasks = []
+
+    async def start(self) -> None:
+        """
+        Starts the worker pool and the batching of the queries.
+        :return: None
+        """
+        self._queue = asyncio.Queue()
+        self._executor = self._create_executor()
+        self._tasks = [asyncio.create_task(self._batcher())
+                       for _ in range(max(1, self.workers))]
+
+    def _create_executor(self) -> Executor:
+        """
+        Creates the pool answering the batches.
+        """
+        if self.workers <= 0:
+            return ThreadPoolExecutor(max_workers=1)
+        # forked workers would inherit the sockets of the open connections,
+        # which would then never be closed on the side of the clients
+        return ProcessPoolExecutor(max_workers=self.workers,
+                                   mp_context=multiprocessing.get_context(
+                                       'spawn'),
+                                   initializer=_init_worker,
+                                   initargs=(self.index,))
+
+    def _restart_executor(self, broken: Executor) -> None:
+        """
+        Replaces a broken pool, unless another batch already replaced it.
+        :param broken: the pool that failed
+        :return: None
+        """
+        if self._executor is not broken:
+            return
+        broken.shutdown(wait=False, cancel_futures=True)
+        self._executor = self._create_executor()
+        self.counters['pool_restarts'] += 1
+
+    async def close(self) -> None:
+        """
+        Stops the batching of the queries and the worker pool.
+        :return: None
+        """
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    async def submit(self, query: Query) -> Union[list, str]:
+        """
+        Submits a query and waits for its batch to be answered.
+        :param query: the chord sequence, the key(s), the durations and the
+        number of results of the query
+        :type query: Query
+        :return: the list of (label, minimum area) pairs, or the error message
+        if the query could not be parsed.
+        """
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((query, future))
+        self.counters['max_queue_depth'] = max(
+            self.counters['max_queue_depth'], self._queue.qsize())
+        return await future
+
+    async def _batcher(self) -> None:
+        """
+        Collects the queries in batches and answers them in the worker pool.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.window
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(),
+                                                        timeout))
+                except asyncio.TimeoutError:
+                    break
+            self.counters['batches'] += 1
+            self.counters['batched_queries'] += len(batch)
+            self.counters['max_batch_size'] = max(
+                self.counters['max_batch_size'], len(batch))
+            queries = [query for query, _ in batch]
+            arguments = (queries, self.index) if self.workers <= 0 else \
+                (queries,)
+            executor = self._executor
+            try:
+                answers = await loop.run_in_executor(
+                    executor, _answer_batch, *arguments)
+            except BrokenProcessPool as exc:
+                # a worker died: the batch fails, the following ones are
+                # answered by a new pool
+                answers = [exc] * len(batch)
+                self._restart_executor(executor)
+            except Exception as exc:  # pylint: disable=broad-except
+                answers = [exc] * len(batch)
+            for (_, future), answer in zip(batch, answers):
+                if future.done():
+                    continue
+                if isinstance(answer, Exception):
+                    future.set_exception(answer)
+                else:
+                    future.set_result(answer)
+
+    def stats(self) -> dict:
+        """
+        Reports the load and the latency of the service.
+        :return: a dictionary containing the counters, the current depth of
+        the queue, the mean batch size and the percentiles of the latency (in
+        seconds) of the last requests.
+        """
+        latencies = np.asarray(self.latencies)
+        batches = self.counters['batches']
+        stats = dict(self.counters)
+        stats.update({
+            'queue_depth': self._queue.qsize() if self._queue else 0,
+            'mean_batch_size': self.counters['batched_queries'] / batches
+            if batches else 0.0,
+            'corpus_size': len(self.index)})
+        if latencies.size:
+            stats['latency'] = {
+                'mean': float(latencies.mean()),
+                'p50': float(np.percentile(latencies, 50)),
+                'p95': float(np.percentile(latencies, 95)),
+                'p99': float(np.percentile(latencies, 99)),
+                'max': float(latencies.max())}
+        return stats
+
+    async def respond(self, method: str, path: str,
+                      body: bytes) -> tuple[int, dict]:
+        """
+        Answers an HTTP request.
+        :param method: the HTTP method
+        :type method: str
+        :param path: the requested path
+        :type path: str
+        :param body: the body of the request
+        :type body: bytes
+        :return: the status code and the JSON payload of the response.
+        """
+        # pylint: disable=too-many-return-statements
+        if path == '/health':
+            return 200, {'status': 'ok'}
+        if path == '/stats':
+            return 200, self.stats()
+        if path != '/query':
+            return 404, {'error': f'Unknown path {path}'}
+        if method != 'POST':
+            return 405, {'error': 'Queries must be sent with POST.'}
+        start = time.perf_counter()
+        try:
+            query = parse_query(json.loads(body or b'null'))
+        except ValueError as exc:
+            return 400, {'error': str(exc)}
+        answer = await self.submit(query)
+        self.latencies.append(time.perf_counter() - start)
+        if isinstance(answer, str):
+            return 400, {'error': answer}
+        return 200, {'results': [{'label': label, 'area': minimum}
+                                 for label, minimum in answer]}
+
+    async def handle(self, reader: asyncio.StreamReader,
+                     writer: asyncio.StreamWriter) -> None:
+        """
+        Handles an HTTP connection, answering a single request.
+        :param reader: the stream of the request
+        :param writer: the stream of the response
+        :return: None
+        """
+        try:
+            request_line = (await reader.readline()).decode('latin-1').split()
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode('latin-1').strip()
+                if not line:
+                    break
+                name, _, value = line.partition(':')
+                headers[name.strip().lower()] = value.strip()
+            self.counters['requests'] += 1
+            length = headers.get('content-length', '0')
+            if len(request_line) < 2:
+                status, payload = 400, {'error': 'Malformed request.'}
+            elif not length.isdecimal():
+                status, payload = 400, {'error': 'Invalid Content-Length.'}
+            else:
+                body = await reader.readexactly(int(length))
+                status, payload = await self.respond(
+                    request_line[0].upper(), request_line[1].split('?')[0],
+                    body)
+        except Exception as exc:  # pylint: disable=broad-except
+            status, payload = 500, {'error': f'{type(exc).__name__}: {exc}'}
+        if status != 200:
+            self.counters['errors'] += 1
+        content = json.dumps(payload).encode('utf-8')
+        writer.write(f'HTTP/1.1 {status} {REASONS[status]}\r\n'
+                     f'Content-Type: application/json\r\n'
+                     f'Content-Length: {len(content)}\r\n'
+                     f'Connection: close\r\n\r\n'.encode('latin-1') + content)
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def serve(self, host: str = '127.0.0.1',
+                    port: int = 8080) -> asyncio.AbstractServer:
+        """
+        Starts the service and listens for HTTP requests.
+        :param host: the address to listen on
+        :type host: str
+        :param port: the port to listen on (0 to pick a free one)
+        :type port: int
+        :return: the listening server.
+        """
+        await self.start()
+        return await asyncio.start_server(self.handle, host, port)
+
+
+def load_index(ireal_paths: list[str], cache_directories: list[str],
+               method: str = 'auto') -> TpsdIndex:
+    """
+    Loads the songs of iReal CSV files and of corpus caches in an index.
+    :param ireal_paths: the paths of the iReal CSV files, whose songs are
+    labelled by title
+    :param cache_directories: the directories of the corpus caches, whose songs
+    are labelled by the path of their annotation file
+    :param method: the engine used to compare all the shifts
+    :return: the index of all the songs.
+    """
+    index = TpsdIndex(method)
+    for path in ireal_paths:
+        for song in iter_ireal_csv(path, skip_invalid=True):
+            index.add(song.tpsd().profile(), song.title)
+    for directory in cache_directories:
+        cache = CorpusCache(directory)
+        for position, song in enumerate(cache.songs):
+            index.add(cache.profile(position), song['harte_path'])
+    return index
+
+
+def main(arguments: Optional[list[str]] = None) -> None:
+    """
+    Runs the service until interrupted.
+    """
+    parser = argparse.ArgumentParser(
+        description=__doc__.split('\n\n', maxsplit=1)[0])
+    parser.add_argument('--ireal', nargs='*', default=[],
+                        help='iReal CSV files containing the corpus')
+    parser.add_argument('--corpus-cache', nargs='*', default=[],
+                        help='directories of corpus caches')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--window', type=float, default=0.005,
+                        help='batching window in seconds')
+    parser.add_argument('--max-batch', type=int, default=64)
+    parser.add_argument('--workers', type=int, default=1)
+    options = parser.parse_args(arguments)
+
+    async def run():
+        service = QueryService(load_index(options.ireal, options.corpus_cache),
+                               options.window, options.max_batch,
+                               options.workers)
+        server = await service.serve(options.host, options.port)
+        print(f'Serving {len(service.index)} songs on '
+              f'http://{options.host}:{options.port}')
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            await service.close()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -11,11 +11,12 @@ Author: Andrea Poltronieri (University of Bologna) and Jacopo de Berardinis
 Copyright: 2022 Andrea Poltronieri and Jacopo de Berardinis
 License: MIT license
 """
-from typing import List
+from typing import List, Tuple
 
 from harte.exceptions import ChordEmptyError
 from harte.harte import Harte
-from tabulate import tabulate
+
+from tpsd.instrumentation import INSTRUMENTATION
 
 KEYS = {
     'maj': [2, 2, 1, 2, 2, 2, 1],
@@ -27,6 +28,83 @@ KEYS = {
     'loc': [2, 2, 1, 2, 2, 2, 1],
 }
 
+NOTE_MAP = [
+    ('C', 'Dbb', 'B#'),
+    ('C#', 'Db'),
+    ('D', 'C##', 'Ebb'),
+    ('Eb', 'D#'),
+    ('E', 'D##', 'Fb'),
+    ('F', 'E#', 'Gbb'),
+    ('F#', 'Gb'),
+    ('G', 'F##', 'Abb'),
+    ('G#', 'Ab'),
+    ('A', 'G##', 'Bbb'),
+    ('Bb', 'A#'),
+    ('B', 'A##', 'Cb')
+]
+NOTE_INDEX = {note: idx for idx, names in enumerate(NOTE_MAP)
+              for note in names}
+
+# each TPS level is encoded as a 12-bit mask, where bit i is set if the pitch
+# class i belongs to the level
+FULL_MASK = (1 << 12) - 1
+POPCOUNT = [bin(mask).count('1') for mask in range(FULL_MASK + 1)]
+
+
+def pitch_class_mask(pitch_classes) -> int:
+    """
+    Encodes a collection of pitch classes as a 12-bit mask.
+    :param pitch_classes: an iterable of pitch classes (int from 0 to 11)
+    :return: the mask having a bit set for each of the pitch classes.
+    """
+    mask = 0
+    for pitch_class in pitch_classes:
+        mask |= 1 << (pitch_class % 12)
+    return mask
+
+
+def mask_to_list(mask: int) -> List[int]:
+    """
+    Decodes a 12-bit mask into the sorted list of its pitch classes.
+    :param mask: the mask to be decoded
+    :return: a sorted list of the pitch classes set in the mask.
+    """
+    return [pitch_class for pitch_class in range(12) if mask >> pitch_class & 1]
+
+
+def _scale_mask(root: int, scale_grades: List[int]) -> int:
+    """
+    Computes the mask of the diatonic scale built on a root.
+    :param root: the index of the root of the scale
+    :param scale_grades: the intervals (in semitones) between the scale grades
+    :return: the mask of the pitch classes belonging to the scale.
+    """
+    mask = 0
+    for grade in scale_grades:
+        root = (root + grade) % 12
+        mask |= 1 << root
+    return mask
+
+
+def level_masks(scale_mask: int, tones_mask: int,
+                root: int) -> Tuple[int, int, int, int]:
+    """
+    Encodes all levels of the TPS of a chord as 12-bit masks.
+    :param scale_mask: the mask of the diatonic scale of the key
+    :param tones_mask: the mask of the pitch classes of the chord
+    :param root: the pitch class of the root of the chord
+    :return: a tuple containing the masks of the diatonic, triadic, fifth and
+    root levels.
+    """
+    root_mask = 1 << root
+    return (scale_mask | tones_mask, tones_mask,
+            root_mask | 1 << (root + 7) % 12, root_mask)
+
+
+# diatonic scales for all the 12 roots and all the modes in KEYS
+SCALE_MASKS = {(root, mode): _scale_mask(root, grades)
+               for mode, grades in KEYS.items() for root in range(12)}
+
 
 class Tps:
     """
@@ -35,6 +113,11 @@ class Tps:
     chromatic_level = list(range(0, 12))
 
     def __init__(self, chord: str, key: str):
+        """
+        Parses the chord and the key and encodes the TPS levels as masks.
+        :param chord: the chord expressed using the Harte notation
+        :param key: the key of the chord (e.g. "C:maj")
+        """
         if ':' not in key:
             key += ':maj'
         self.tones = None
@@ -48,11 +131,16 @@ class Tps:
             self.key = key_root
         else:
             raise ValueError(f'The entered key "{key}" root is not valid.')
+        INSTRUMENTATION.count('chords_parsed')
         try:
-            self._chord = Harte(chord)
-            self.tones = tuple(sorted(self._chord.pitchClasses))
+            with INSTRUMENTATION.stage('harte_parsing'):
+                self._chord = Harte(chord)
+                self.tones = tuple(sorted(self._chord.pitchClasses))
         except ChordEmptyError:
             raise ValueError('The entered chord is empty.')
+        self.root = self._chord.root().pitchClass
+        self.tones_mask = pitch_class_mask(self.tones)
+        self.scale_mask = SCALE_MASKS[(self.note_index(self.key), key_mode)]
 
     @staticmethod
     def note_index(note) -> int:
@@ -60,24 +148,9 @@ class Tps:
         Gets a note label and returns its index within the chromatic scale.
         :return: the index of the note within the chromatic scale.
         """
-        note_map = [
-            ('C', 'Dbb', 'B#'),
-            ('C#', 'Db'),
-            ('D', 'C##', 'Ebb'),
-            ('Eb', 'D#'),
-            ('E', 'D##', 'Fb'),
-            ('F', 'E#', 'Gbb'),
-            ('F#', 'Gb'),
-            ('G', 'F##', 'Abb'),
-            ('G#', 'Ab'),
-            ('A', 'G##', 'Bbb'),
-            ('Bb', 'A#'),
-            ('B', 'A##', 'Cb')
-        ]
-
         try:
-            return [i for i, n in enumerate(note_map) if note in n][0]
-        except IndexError as exc:
+            return NOTE_INDEX[note]
+        except KeyError as exc:
             raise NameError(
                 'The note is not indexed, try with an enharmonic') from exc
 
@@ -86,14 +159,7 @@ class Tps:
         Computes the diatonic level of the TPS.
         :return: a list of the grades belonging to the diatonic level of the TPS
         """
-        note_index = self.note_index(self.key)
-        diatonic_grades = list(self.tones)
-        for grade in self.scale_grades:
-            note_index = (note_index + grade)
-            if note_index >= 12:
-                note_index = note_index - 12
-            diatonic_grades.append(note_index)
-        return list(set(diatonic_grades))
+        return mask_to_list(self.scale_mask | self.tones_mask)
 
     def triadic_level(self) -> List[int]:
         """
@@ -109,16 +175,15 @@ class Tps:
         Computes the root level of the TPS.
         :return: a list of the grades belonging to the root level of the TPS.
         """
-        return [self._chord.root().pitchClass]
+        return [self.root]
 
     def fifth_level(self) -> List[int]:
         """
         Computes the fifth level of the TPS.
         :return: a list of the grades belonging to the fifth level of the TPS.
         """
-        root = self._chord.root().pitchClass
-        fifth = root + 7 if root + 7 < 12 else root + 7 - 12
-        return [root, fifth]
+        fifth = self.root + 7 if self.root + 7 < 12 else self.root + 7 - 12
+        return [self.root, fifth]
 
     def get_levels(self):
         """
@@ -128,6 +193,14 @@ class Tps:
         return [self.diatonic_level(), self.triadic_level(), self.fifth_level(),
                 self.root_level()]
 
+    def level_masks(self) -> Tuple[int, int, int, int]:
+        """
+        Encodes all levels of the TPS as 12-bit masks.
+        :return: a tuple containing the masks of the diatonic, triadic, fifth
+        and root levels, in the same order as get_levels().
+        """
+        return level_masks(self.scale_mask, self.tones_mask, self.root)
+
     def _prepare_show(self) -> List:
         """
         Prepares the data to be plotted.
@@ -149,6 +222,8 @@ class Tps:
         initialising the class.
         :return: None
         """
+        # loaded on first use, so that the numeric core does not need it
+        from tabulate import tabulate  # pylint: disable=import-outside-toplevel
         print(tabulate(self._prepare_show()))
 
 
@@ -12,10 +12,27 @@ Author: Andrea Poltronieri (University of Bologna) and Jacopo de Berardinis
 Copyright: 2022 Andrea Poltronieri and Jacopo de Berardinis
 License: MIT license
 """
-from tabulate import tabulate
-from termcolor import colored
+from tpsd.instrumentation import INSTRUMENTATION
+from tpsd.tps import Tps, FULL_MASK, POPCOUNT
 
-from tpsd.tps import Tps
+DIATONIC_FIFTHS_ASCENDING = [0, 7, 2, 9]
+DIATONIC_FIFTHS_DESCENDING = [5, 11, 4]
+
+
+def circle_fifth_distance(root_a: int, root_b: int) -> int:
+    """
+    Implements the circle of fifth rule (Lehrdal et al.) on two chord roots.
+    :param root_a: the pitch class of the root of the first chord
+    :param root_b: the pitch class of the root of the second chord
+    :return: the resulting value of the circle of fifths rule
+    (int from 0 to 3).
+    """
+    difference = root_b - root_a
+    if difference in DIATONIC_FIFTHS_ASCENDING:
+        return DIATONIC_FIFTHS_ASCENDING.index(difference)
+    if difference in DIATONIC_FIFTHS_DESCENDING:
+        return DIATONIC_FIFTHS_DESCENDING.index(difference) + 1
+    return 3
 
 
 class TpsComparison:
@@ -36,8 +53,22 @@ class TpsComparison:
         self.chord_a = Tps(key=key_a, chord=chord_a)
         self.chord_b = Tps(key=key_b, chord=chord_b)
 
-        self.tps_a = self.chord_a.get_levels()
-        self.tps_b = self.chord_b.get_levels()
+        self.masks_a = self.chord_a.level_masks()
+        self.masks_b = self.chord_b.level_masks()
+
+    @property
+    def tps_a(self) -> list:
+        """
+        The levels of the TPS of the first chord.
+        """
+        return self.chord_a.get_levels()
+
+    @property
+    def tps_b(self) -> list:
+        """
+        The levels of the TPS of the second chord.
+        """
+        return self.chord_b.get_levels()
 
     def get_tpsd_distance(self) -> int:
         """
@@ -47,8 +78,8 @@ class TpsComparison:
         chords.
         """
         distance = 0
-        for i in range(len(self.tps_a)):
-            distance += len(list(set(self.tps_a[i]) - set(self.tps_b[i])))
+        for mask_a, mask_b in zip(self.masks_a, self.masks_b):
+            distance += POPCOUNT[mask_a & ~mask_b & FULL_MASK]
         return distance
 
     def circle_fifth_rule(self) -> int:
@@ -57,18 +88,7 @@ class TpsComparison:
         :return: the resulting value of the circle of fifths rule
         (int from 1 to 3).
         """
-        diatonic_fifths_ascending = [0, 7, 2, 9]
-        diatonic_fifths_descending = [5, 11, 4]
-
-        if self.chord_b.root_level()[0] - self.chord_a.root_level()[
-            0] in diatonic_fifths_ascending:
-            return diatonic_fifths_ascending.index(
-                self.chord_b.root_level()[0] - self.chord_a.root_level()[0])
-        if self.chord_b.root_level()[0] - self.chord_a.root_level()[
-            0] in diatonic_fifths_descending:
-            return diatonic_fifths_descending.index(
-                self.chord_b.root_level()[0] - self.chord_a.root_level()[0]) + 1
-        return 3
+        return circle_fifth_distance(self.chord_a.root, self.chord_b.root)
 
     def chord_distance_rule(self) -> float:
         """
@@ -79,10 +99,8 @@ class TpsComparison:
         into account.
         """
         tps_distance = 0
-
-        for i in range(len(self.tps_a)):
-            tps_distance += len(
-                set(self.tps_a[i]).symmetric_difference(set(self.tps_b[i])))
+        for mask_a, mask_b in zip(self.masks_a, self.masks_b):
+            tps_distance += POPCOUNT[mask_a ^ mask_b]
         return tps_distance
 
     def distance(self) -> float:
@@ -92,6 +110,7 @@ class TpsComparison:
         :return: a floating number which is the final value of the TPS between
         two chords.
         """
+        INSTRUMENTATION.count('tps_evaluations')
         return (self.chord_distance_rule() / 2) + self.circle_fifth_rule()
 
     def plot(self) -> None:
@@ -99,6 +118,11 @@ class TpsComparison:
         Plots the TPSD distance in a graphical way
         :return : None
         """
+        # loaded on first use, so that the numeric core does not need them
+        # pylint: disable=import-outside-toplevel
+        from tabulate import tabulate
+        from termcolor import colored
+
         print('Plot of the first chord')
         self.chord_a.show_table()
         print('Plot of the second chord')
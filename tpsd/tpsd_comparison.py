@@ -1,5 +1,6 @@
 # pylint: disable=line-too-long
 # pylint: disable=too-many-arguments
+# pylint: disable=too-many-instance-attributes
 """
 This script contains a Python 3 re-implementation of the Tonal Pith Space
 Distance (TPSD) algorithm as presented in:
@@ -13,11 +14,16 @@ Author: Andrea Poltronieri (University of Bologna) and Jacopo de Berardinis
 Copyright: 2022 Andrea Poltronieri and Jacopo de Berardinis
 License: MIT license
 """
-from typing import Union
+import math
+from typing import Optional, Union
 
-import matplotlib.pyplot as plt
 import numpy as np
 
+from tpsd import area, form
+from tpsd.cache import DEFAULT_CACHE, TpsCache
+from tpsd.compact import CompactSong, compact_minimum_area
+from tpsd.form import FormedProfile, SongForm
+from tpsd.profile import TpsdProfile, resolution_beats
 from tpsd.tpsd_core import Tpsd
 
 
@@ -28,18 +34,25 @@ class TpsdComparison:
 
     # pylint: disable=line-too-long
     # pylint: disable=consider-using-enumerate
-    def __init__(self, chord_sequence_a: list[str],
-                 chord_sequence_b: list[str],
-                 key_a: Union[str, list[str]],
-                 key_b: Union[str, list[str]],
-                 duration_sequence_a: list[int],
-                 duration_sequence_b: list[int]) -> None:
+    def __init__(self, chord_sequence_a: Union[list[str], CompactSong],
+                 chord_sequence_b: Union[list[str], CompactSong],
+                 key_a: Optional[Union[str, list[str]]] = None,
+                 key_b: Optional[Union[str, list[str]]] = None,
+                 duration_sequence_a: Optional[list[int]] = None,
+                 duration_sequence_b: Optional[list[int]] = None,
+                 cache: Optional[TpsCache] = DEFAULT_CACHE,
+                 form_a: Optional[SongForm] = None,
+                 form_b: Optional[SongForm] = None,
+                 resolution: Union[int, str] = 'beat',
+                 beats_per_bar: int = 4) -> None:
         """
         Implementation of the comparison between two TPSD distances
-        :param chord_sequence_a: the first sequence of chord to be compared
-        :type chord_sequence_a: list[str]
-        :param chord_sequence_b: the second sequence of chord to be compared
-        :type chord_sequence_b: list[str]
+        :param chord_sequence_a: the first sequence of chord to be compared, or
+        a compact song (whose keys and durations are then not needed)
+        :type chord_sequence_a: Union[list[str], CompactSong]
+        :param chord_sequence_b: the second sequence of chord to be compared,
+        or a compact song
+        :type chord_sequence_b: Union[list[str], CompactSong]
         :param key_a: the key(s) of the first sequence of chord to be compared
         :type key_a: Union[str, list[str]]
         :param key_b: the key(s) of the second sequence of chord to be compared
@@ -50,19 +63,139 @@ class TpsdComparison:
         :param duration_sequence_b: the duration information of the second
         sequence of chord to be compared
         :type duration_sequence_b: list[int]
+        :param cache: the cache of the TPS distances between chords and keys
+        used for both sequences, or None to disable caching
+        :type cache: Optional[TpsCache]
+        :param form_a: the form of the first sequence, if its chorus is
+        repeated
+        :type form_a: Optional[SongForm]
+        :param form_b: the form of the second sequence, if its chorus is
+        repeated
+        :type form_b: Optional[SongForm]
+        :param resolution: the resolution at which the sequences are compared:
+        "beat", "half-bar", "bar" or a number of beats. At a coarser resolution
+        than the beat, each sample takes the mean distance of the chords it
+        overlaps (see TpsdProfile.resample), and the offsets are expressed in
+        samples.
+        :type resolution: Union[int, str]
+        :param beats_per_bar: the number of beats of each bar
+        :type beats_per_bar: int
         :return: None
         """
-        tpsd_a = Tpsd(chord_sequence_a, key_a, duration_sequence_a)
-        tpsd_b = Tpsd(chord_sequence_b, key_b, duration_sequence_b)
-        self.sequence_area_a = tpsd_a.sequence_area()
-        self.sequence_area_b = tpsd_b.sequence_area()
+        tpsd_a = Tpsd(chord_sequence_a, key_a, duration_sequence_a, cache,
+                      form_a)
+        tpsd_b = Tpsd(chord_sequence_b, key_b, duration_sequence_b, cache,
+                      form_b)
+        # compact songs without a form are compared from their doubled
+        # integer distances
+        self.compact_pair = (chord_sequence_a, chord_sequence_b) if all(
+            isinstance(song, CompactSong) and song_form is None for song,
+            song_form in ((chord_sequence_a, form_a),
+                          (chord_sequence_b, form_b))) else None
+        self.cache = cache
+        self.resolution = resolution_beats(resolution, beats_per_bar)
+        self.tpsd_a = tpsd_a
+        self.tpsd_b = tpsd_b
+        # profiles of the sequences having a form, without repetitions
+        self.formed_a = tpsd_a.formed_profile() if form_a is not None \
+            else None
+        self.formed_b = tpsd_b.formed_profile() if form_b is not None \
+            else None
+        # the expanded profiles are only built by the paths using them
+        self.length_a = -(-self._length(tpsd_a, self.formed_a) //
+                          self.resolution)
+        self.length_b = -(-self._length(tpsd_b, self.formed_b) //
+                          self.resolution)
+        if self.resolution != 1:
+            # the resampled profiles are only compared sample by sample
+            self.compact_pair = self.formed_a = self.formed_b = None
+        self._a_longest = self.length_a >= self.length_b
+        self._profile_a = None
+        self._profile_b = None
+        self._sequence_area_a = None
+        self._sequence_area_b = None
 
-        self.longest_sequence = self.sequence_area_a if len(
-            self.sequence_area_a) >= len(
-            self.sequence_area_b) else self.sequence_area_b
-        self.shortest_sequence = self.sequence_area_a if len(
-            self.sequence_area_a) <= len(
-            self.sequence_area_b) else self.sequence_area_b
+    @staticmethod
+    def _length(tpsd: Tpsd, formed: Optional[FormedProfile]) -> int:
+        """
+        Gets the number of beats of a sequence without computing its profile.
+        """
+        if formed is not None:
+            return len(formed)
+        if tpsd.compact is not None:
+            return int(tpsd.compact.timings.sum())
+        return sum(tpsd.timing_information)
+
+    @property
+    def profile_a(self) -> TpsdProfile:
+        """
+        The profile of the first sequence at the resolution of the comparison,
+        computed on first access.
+        """
+        if self._profile_a is None:
+            self._profile_a = self.tpsd_a.profile(self.resolution)
+        return self._profile_a
+
+    @property
+    def profile_b(self) -> TpsdProfile:
+        """
+        The profile of the second sequence at the resolution of the
+        comparison, computed on first access.
+        """
+        if self._profile_b is None:
+            self._profile_b = self.tpsd_b.profile(self.resolution)
+        return self._profile_b
+
+    @property
+    def longest_profile(self) -> TpsdProfile:
+        """
+        The profile of the longest sequence (the first one if they have the
+        same length).
+        """
+        return self.profile_a if self._a_longest else self.profile_b
+
+    @property
+    def shortest_profile(self) -> TpsdProfile:
+        """
+        The profile of the shortest sequence.
+        """
+        return self.profile_b if self._a_longest else self.profile_a
+
+    @property
+    def sequence_area_a(self) -> list[float]:
+        """
+        The TPS distance of each beat of the first sequence, expanded from its
+        profile on first access.
+        """
+        if self._sequence_area_a is None:
+            self._sequence_area_a = self.profile_a.expand()
+        return self._sequence_area_a
+
+    @property
+    def sequence_area_b(self) -> list[float]:
+        """
+        The TPS distance of each beat of the second sequence, expanded from its
+        profile on first access.
+        """
+        if self._sequence_area_b is None:
+            self._sequence_area_b = self.profile_b.expand()
+        return self._sequence_area_b
+
+    @property
+    def longest_sequence(self) -> list[float]:
+        """
+        The TPS distance of each beat of the longest sequence.
+        """
+        return self.sequence_area_a if self._a_longest else \
+            self.sequence_area_b
+
+    @property
+    def shortest_sequence(self) -> list[float]:
+        """
+        The TPS distance of each beat of the shortest sequence.
+        """
+        return self.sequence_area_b if self._a_longest else \
+            self.sequence_area_a
 
     def plot_area(self) -> None:
         """
@@ -70,49 +203,124 @@ class TpsdComparison:
         between the two areas
         :return: None, but plots a matplotlib graph
         """
-        sequence_a = self.sequence_area_a
-        sequence_b = self.sequence_area_b
+        # loaded on first use, so that the numeric core does not need it
+        import matplotlib.pyplot as plt  # pylint: disable=import-outside-toplevel
+
+        beats_a, sequence_a = self.profile_a.step_points()
+        beats_b, sequence_b = self.profile_b.step_points()
 
-        plt.step(range(len(sequence_a)), sequence_a, 'orange',
-                 label='sequence_1')
-        plt.step(range(len(sequence_b)), sequence_b, 'red', label='sequence_2')
+        plt.step(beats_a, sequence_a, 'orange', label='sequence_1')
+        plt.step(beats_b, sequence_b, 'red', label='sequence_2')
         plt.yticks(np.arange(0, 14))
-        plt.xticks(np.linspace(0, len(self.longest_sequence), 15, dtype=int))
+        plt.xticks(np.linspace(0, len(self.longest_profile), 15, dtype=int))
         plt.ylabel('TPS score')
         plt.xlabel('Beats')
         plt.legend(loc='upper left')
-        plt.fill_between(range(len(sequence_a)), sequence_a, step='pre',
+        plt.fill_between(beats_a, sequence_a, step='pre',
                          color='orange', alpha=0.4)
-        plt.fill_between(range(len(sequence_b)), sequence_b, step='pre',
+        plt.fill_between(beats_b, sequence_b, step='pre',
                          color='red', alpha=0.4)
 
         plt.show()
 
-    def minimum_area(self) -> float:
+    def coarse_to_fine_minimum_area(
+            self, resolution: Union[int, str] = 'bar', beats_per_bar: int = 4,
+            candidates: Optional[int] = None,
+            return_offset: bool = False) -> Union[
+                tuple[float, float], tuple[float, int, float]]:
+        """
+        Calculates the minimum area between the step functions calculated over
+        two chord sequences, bounding the area of every shift at a coarse
+        resolution and computing the exact area of the most promising shifts
+        only
+        :param resolution: the resolution of the coarse stage: "beat",
+        "half-bar", "bar" or a number of beats
+        :type resolution: Union[int, str]
+        :param beats_per_bar: the number of beats of each bar
+        :type beats_per_bar: int
+        :param candidates: the maximum number of shifts whose exact area is
+        computed, or None to obtain the exact minimum area
+        :type candidates: Optional[int]
+        :param return_offset: whether to return also the beat of the longest
+        sequence at which the shortest one is aligned
+        :type return_offset: bool
+        :return: the minimum area found, the offset if return_offset is True,
+        and the maximum difference from the exact minimum area (0 if exact)
+        """
+        minimum_area, offset, error = area.sequence_coarse_to_fine_minimum_area(
+            self.longest_profile.to_array(), self.shortest_profile.to_array(),
+            resolution_beats(resolution, beats_per_bar), candidates)
+        if return_offset:
+            return minimum_area, offset, error
+        return minimum_area, error
+
+    def _formed(self, first: bool) -> FormedProfile:
+        """
+        Gets the profile of a sequence without expanding its repetitions.
+        """
+        formed = self.formed_a if first else self.formed_b
+        if formed is not None:
+            return formed
+        return FormedProfile.from_profile(self.profile_a if first else
+                                          self.profile_b)
+
+    def shift_areas(self, method: str = 'auto') -> np.ndarray:
+        """
+        Calculates the area between the step functions at each shift of the
+        shortest sequence over the longest one
+        :param method: the engine used to compare all the shifts
+        :type method: str
+        :return: an array containing, for each beat of the longest sequence at
+        which the shortest one can start, the area normalised by the length of
+        the shortest sequence
+        """
+        return area.compute_shift_areas(
+            self.shortest_profile.to_array(), self.longest_profile.to_array(),
+            method) / len(self.shortest_profile)
+
+    def minimum_area(self, return_offset: bool = False, method: str = 'auto',
+                     upper_bound: Optional[float] = None) -> Union[
+            float, tuple[float, int]]:
         """
         Calculates the minimum area between the step functions calculated over
         two chord sequences
+        :param return_offset: whether to return also the beat of the longest
+        sequence at which the shortest one is aligned when the minimum is
+        reached
+        :type return_offset: bool
+        :param method: the engine used to compare all the shifts: "sliding",
+        "runs" (for long sequences made of long chords), "fft" (exact, for very
+        long sequences) or "auto" to choose according to the length of the
+        sequences, comparing long sequences having a form without expanding
+        their repetitions
+        :type method: str
+        :param upper_bound: if given, the maximum minimum area of interest:
+        each shift is abandoned as soon as its partial area exceeds it (or the
+        best area found so far), and inf is returned (with offset -1) if the
+        minimum area is above it
+        :type upper_bound: Optional[float]
         :return: a floating number which corresponds to the value of minimum
-        area between the two areas
-        """
-        minimum_area = 0
-        longest = self.longest_sequence[:]
-        for step in range(
-                len(self.longest_sequence) - len(self.shortest_sequence) + 1):
-            if step != 0:
-                longest.pop(0)
-            area = 0
-            for beat in range(len(self.shortest_sequence)):
-                lower = self.shortest_sequence[beat] if self.shortest_sequence[
-                                                            beat] <= longest[
-                                                            beat] else \
-                    longest[beat]
-                higher = self.shortest_sequence[beat] if self.shortest_sequence[
-                                                             beat] > longest[
-                                                             beat] else \
-                    longest[beat]
-
-                area += higher - lower
-            if minimum_area > area or step == 0:
-                minimum_area = area
-        return minimum_area / len(self.shortest_sequence)
+        area between the two areas, and the offset if return_offset is True
+        """
+        shortest, longest = sorted((self.length_a, self.length_b))
+        if (self.formed_a is not None or self.formed_b is not None) and \
+                method == 'auto' and \
+                (longest - shortest + 1) * shortest >= area.RUNS_CUTOFF:
+            # the repetitions are not expanded
+            minimum_area, offset = form.formed_minimum_area(
+                self._formed(self._a_longest),
+                self._formed(not self._a_longest))
+            if upper_bound is not None and minimum_area > upper_bound:
+                minimum_area, offset = math.inf, -1
+        elif self.compact_pair is not None:
+            minimum_area, offset = compact_minimum_area(
+                *self.compact_pair, method, self.cache)
+            if upper_bound is not None and minimum_area > upper_bound:
+                minimum_area, offset = math.inf, -1
+        else:
+            minimum_area, offset = area.sequence_minimum_area(
+                self.longest_profile.to_array(),
+                self.shortest_profile.to_array(), method, upper_bound)
+        if return_offset:
+            return minimum_area, offset
+        return minimum_area
@@ -12,13 +12,20 @@ Author: Andrea Poltronieri (University of Bologna) and Jacopo de Berardinis
 Copyright: 2022 Andrea Poltronieri and Jacopo de Berardinis
 License: MIT license
 """
-from typing import Union
+from typing import TYPE_CHECKING, Optional, Union
 
-import matplotlib.pyplot as plt
 import numpy as np
 
+from tpsd.cache import DEFAULT_CACHE, TpsCache
+from tpsd.compact import CompactSong
+from tpsd.form import FormedProfile, SongForm
+from tpsd.instrumentation import INSTRUMENTATION
+from tpsd.profile import TpsdProfile, resolution_beats
 from tpsd.tps_comparison import TpsComparison
 
+if TYPE_CHECKING:
+    import matplotlib.pyplot as plt
+
 
 class Tpsd:
     """
@@ -27,23 +34,110 @@ class Tpsd:
 
     # pylint: disable=line-too-long
     # pylint: disable=consider-using-enumerate
-    def __init__(self, chord_sequence: list[str], keys: Union[str, list[str]],
-                 timing_information: list[int]) -> None:
+    def __init__(self, chord_sequence: Union[list[str], CompactSong],
+                 keys: Optional[Union[str, list[str]]] = None,
+                 timing_information: Optional[list[int]] = None,
+                 cache: Optional[TpsCache] = DEFAULT_CACHE,
+                 form: Optional[SongForm] = None) -> None:
         """
         Initialises the parameters needed for calculating the TPSD distance
         :param chord_sequence: a list of chords expressed using the Harte
-        notation
+        notation, or a compact song (in which case the keys and the timing
+        information are taken from the song)
         :param keys: the keys of the chord sequence to which calculate the
         sequence distance.
+        :param timing_information: the duration (in beats) of each chord
+        :param cache: the cache of the TPS distances between chords and keys,
+        shared among all instances by default. If None, each distance is
+        computed from scratch.
+        :param form: the form of the song, if its chorus (listed once in the
+        chord sequence) is played more than once
         """
+        self.cache = cache
+        self.form = form
+        self._profile = None
+        # a compact song is kept as it is, and only decoded on demand
+        self.compact = None
+        if isinstance(chord_sequence, CompactSong):
+            if form is not None and form.intro + form.chorus > len(
+                    chord_sequence):
+                raise ValueError("The form exceeds the chord sequence")
+            self.compact = chord_sequence
+            self._chord_sequence = self._keys = self._timing_information = \
+                None
+            return
+        if keys is None or timing_information is None:
+            raise ValueError("The keys and the timing information are needed")
         if isinstance(keys, str):  # creating a local key vector
             keys = [keys] * len(chord_sequence)
         if len(chord_sequence) != len(timing_information) != len(keys):
             raise ValueError("Size mismatch: cannot compute TSPD profile")
+        if form is not None and form.intro + form.chorus > len(chord_sequence):
+            raise ValueError("The form exceeds the chord sequence")
+
+        self._keys = list(keys)
+        self._chord_sequence = list(chord_sequence)
+        self._timing_information = list(timing_information)
+
+    # the sequence is read-only, so that the cached profile cannot become
+    # stale: the properties return copies, and only append() modifies it
+
+    @property
+    def chord_sequence(self) -> list[str]:
+        """
+        A copy of the chords of the sequence, decoded on access from a compact
+        song.
+        """
+        if self.compact is not None:
+            return self.compact.chord_sequence
+        return list(self._chord_sequence)
+
+    @property
+    def keys(self) -> list[str]:
+        """
+        A copy of the key of each chord, decoded on access from a compact song.
+        """
+        if self.compact is not None:
+            return self.compact.keys
+        return list(self._keys)
+
+    @property
+    def timing_information(self) -> list[int]:
+        """
+        A copy of the duration (in beats) of each chord, decoded on access from
+        a compact song.
+        """
+        if self.compact is not None:
+            return self.compact.timing_information
+        return list(self._timing_information)
+
+    def _decode(self) -> None:
+        """
+        Replaces the compact song by the lists of labels, before they are
+        modified.
+        """
+        if self.compact is not None:
+            self._chord_sequence = self.compact.chord_sequence
+            self._keys = self.compact.keys
+            self._timing_information = self.compact.timing_information
+            self.compact = None
 
-        self.keys = keys
-        self.chord_sequence = chord_sequence
-        self.timing_information = timing_information
+    def append(self, chord: str, key: str, beats: int) -> None:
+        """
+        Appends a chord at the end of the sequence, updating the profile (if
+        already computed) in constant time, so that chords can be added as
+        they arrive.
+        :param chord: a chord expressed using the Harte notation
+        :param key: the key of the chord
+        :param beats: the duration (in beats) of the chord
+        :return: None
+        """
+        self._decode()
+        self._chord_sequence.append(chord)
+        self._keys.append(key)
+        self._timing_information.append(beats)
+        if self._profile is not None:
+            self._profile.append(self.chord_distance(chord, key), beats)
 
     def sequence_area(self) -> list[float]:
         """
@@ -53,31 +147,96 @@ class Tpsd:
         chord in the input sequence and the triad
         of the global key.
         """
-        tpsd = []
-        for idx, (chord, key) in enumerate(zip(self.chord_sequence, self.keys)):
-            chord_tpsd = TpsComparison(chord_a=chord, key_a=key, chord_b=key,
-                                       key_b=key)
-            for _ in range(self.timing_information[idx]):
-                tpsd.append(chord_tpsd.distance())
+        profile = self.profile()
+        with INSTRUMENTATION.stage('profile_expansion'):
+            return profile.expand()
+
+    def profile(self, resolution: Union[int, str] = 'beat',
+                beats_per_bar: int = 4) -> TpsdProfile:
+        """
+        Calculates the TPS distance between all chords of a given sequence and
+        the triad chord of a given key, as a run-length step function.
+        :param resolution: the duration of each sample of the profile: "beat",
+        "half-bar", "bar" or a number of beats. Samples not aligned with the
+        chords take the mean distance of the chords they overlap.
+        :param beats_per_bar: the number of beats of each bar
+        :return: the profile of the sequence, containing a segment for each
+        chord (or run of chords) having the same TPS distance. The profile at
+        beat resolution is computed once and then kept up to date by append().
+        """
+        if self._profile is None:
+            with INSTRUMENTATION.stage('profile'):
+                if self.form is not None:
+                    self._profile = self.formed_profile().expand()
+                elif self.compact is not None:
+                    self._profile = self.compact.profile(self.cache)
+                else:
+                    self._profile = TpsdProfile(self.distances(),
+                                                self._timing_information)
+        beats = resolution_beats(resolution, beats_per_bar)
+        if beats != 1:
+            return self._profile.resample(beats)
+        return self._profile
 
-        return tpsd
+    def formed_profile(self) -> FormedProfile:
+        """
+        Calculates the profile of the song without expanding the repetitions
+        of its chorus.
+        :return: the profiles of the intro, of the chorus and of the outro.
+        """
+        if self.form is None:
+            return FormedProfile.from_profile(self.profile())
+        distances = self.distances()
+        timings = self.timing_information
+        intro, chorus = self.form.intro, self.form.intro + self.form.chorus
+        return FormedProfile(
+            TpsdProfile(distances[intro:chorus], timings[intro:chorus]),
+            self.form.repeats,
+            TpsdProfile(distances[:intro], timings[:intro]),
+            TpsdProfile(distances[chorus:], timings[chorus:]))
 
-    def plot_area(self, **fig_kwargs) -> tuple[plt.Figure, plt.Axes]:
+    def distances(self) -> list[float]:
+        """
+        Calculates the TPS distance between each chord and the triad of its key.
+        :return: a list containing the distance of each chord.
+        """
+        if self.compact is not None:
+            return (self.compact.doubled_distances(self.cache) / 2).tolist()
+        return [self.chord_distance(chord, key) for chord, key in
+                zip(self._chord_sequence, self._keys)]
+
+    def chord_distance(self, chord: str, key: str) -> float:
+        """
+        Calculates the TPS distance between a chord and the triad of its key,
+        using the cache if available.
+        :param chord: a chord expressed using the Harte notation
+        :param key: the key of the chord
+        :return: the TPS distance between the chord and the key.
+        """
+        if self.cache is not None:
+            return self.cache.distance(chord, key)
+        return TpsComparison(chord_a=chord, key_a=key, chord_b=key,
+                             key_b=key).distance()
+
+    def plot_area(self, **fig_kwargs) -> 'tuple[plt.Figure, plt.Axes]':
         """
         Plots the area calculated applying the TPS algorithm on a chord sequence
         :return: None but plots the area defined by the TPSD.
         """
-        sequence = self.sequence_area()
-        # sequence.insert(0, sequence[0])
+        # loaded on first use, so that the numeric core does not need it
+        import matplotlib.pyplot as plt  # pylint: disable=import-outside-toplevel
+
+        profile = self.profile()
+        beats, sequence = profile.step_points()
         fig, axis = plt.subplots(**fig_kwargs)
 
-        axis.step(range(len(sequence)), sequence, 'orange')
+        axis.step(beats, sequence, 'orange')
         axis.set_yticks(np.arange(0, 13 + 1))
-        axis.set_xticks(np.linspace(0, len(sequence), 15, dtype=int))
+        axis.set_xticks(np.linspace(0, len(profile), 15, dtype=int))
         axis.set_ylabel('TPS score')
         axis.set_xlabel('Beat')
 
-        axis.fill_between(range(len(sequence)), sequence,
+        axis.fill_between(beats, sequence,
                         step='pre', color='orange', alpha=0.4)
         plt.show()
 
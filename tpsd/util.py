@@ -16,9 +16,138 @@ Copyright: 2022 Andrea Poltronieri and Jacopo de Berardinis
 License: MIT license
 """
 import os
+from typing import Iterable, Iterator, Optional
 
 from biab import biab_chords
 
+from tpsd.instrumentation import INSTRUMENTATION
+
+BIAB_EXTENSIONS = ('.MGU', '.MG1')
+
+
+class BiabNotFoundError(FileNotFoundError, IndexError):
+    """
+    Raised when no Band-in-a-Box file corresponds to an annotation file. It is
+    also an IndexError, which was raised by previous versions.
+    """
+
+
+class DatasetIndex:
+    """
+    Index of the Band-in-a-Box files contained in a dataset, scanned once and
+    mapping the names of the annotation files to the corresponding files.
+    """
+
+    def __init__(self, dataset_path: str, recursive: bool = True) -> None:
+        """
+        Scans the dataset.
+        :param dataset_path: the directory containing the Band-in-a-Box files
+        :type dataset_path: str
+        :param recursive: whether to scan also the nested directories
+        :type recursive: bool
+        :return: None
+        """
+        self.dataset_path = dataset_path
+        self.recursive = recursive
+        self.files = {}
+        self._directories = {}
+        self.rescan()
+
+    def __len__(self) -> int:
+        return len(self._paths())
+
+    def _paths(self) -> set:
+        """
+        Gets the paths of all the indexed files.
+        """
+        return {path for paths in self.files.values() for path in paths}
+
+    def rescan(self) -> None:
+        """
+        Updates the index, listing again only the directories whose
+        modification time changed since the last scan.
+        :return: None
+        """
+        directories = {}
+        pending = [self.dataset_path]
+        while pending:
+            directory = pending.pop()
+            mtime = os.stat(directory).st_mtime_ns
+            previous = self._directories.get(directory)
+            if previous is not None and previous[0] == mtime:
+                files, subdirectories = previous[1], previous[2]
+            else:
+                files, subdirectories = [], []
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if entry.is_dir():
+                            subdirectories.append(entry.path)
+                        elif os.path.splitext(entry.name)[1].upper() in \
+                                BIAB_EXTENSIONS:
+                            files.append(entry.name)
+            directories[directory] = (mtime, files, subdirectories)
+            if self.recursive:
+                pending.extend(subdirectories)
+        self._directories = directories
+
+        self.files = {}
+        # files in the top directory come first, then those in nested ones
+        for directory in sorted(directories, key=lambda path: (
+                path != self.dataset_path, path)):
+            for name in sorted(directories[directory][1]):
+                path = f'{directory}/{name}'
+                self.files.setdefault(name, []).append(path)
+                stem = os.path.splitext(name)[0]
+                if stem != name:
+                    self.files.setdefault(stem, []).append(path)
+
+    def resolve(self, file_name: str) -> str:
+        """
+        Gets the Band-in-a-Box file corresponding to an annotation file, which
+        is named after it (e.g. "song.MGU.txt" for "song.MGU") or after its stem
+        (e.g. "song.txt" for "song.MGU" or "song.MG1").
+        :param file_name: the name or the path of the annotation file
+        :type file_name: str
+        :return: the path of the Band-in-a-Box file.
+        """
+        path = self.find(file_name)
+        if path is None:
+            raise BiabNotFoundError(
+                f'No Band-in-a-Box file corresponds to "{file_name}" in '
+                f'{self.dataset_path}')
+        return path
+
+    def find(self, file_name: str) -> Optional[str]:
+        """
+        Gets the Band-in-a-Box file corresponding to an annotation file, if
+        any.
+        :param file_name: the name or the path of the annotation file
+        :type file_name: str
+        :return: the path of the Band-in-a-Box file, or None.
+        """
+        name = os.path.splitext(os.path.basename(file_name))[0]
+        paths = self.files.get(name)
+        return paths[0] if paths else None
+
+    def resolve_all(self, file_names: Iterable[str],
+                    strict: bool = True) -> dict[str, Optional[str]]:
+        """
+        Gets the Band-in-a-Box files corresponding to many annotation files.
+        :param file_names: the names or the paths of the annotation files
+        :type file_names: Iterable[str]
+        :param strict: whether to raise an error if a file cannot be resolved,
+        otherwise it is mapped to None
+        :type strict: bool
+        :return: a dictionary mapping each annotation file to its Band-in-a-Box
+        file.
+        """
+        return {file_name: self.resolve(file_name) if strict else
+                self.find(file_name) for file_name in file_names}
+
+
+# indices of the datasets already scanned by get_corresponding_biab
+_DATASET_INDICES = {}
+
 
 def open_harte(harte_file_path: str) -> (list[str], str):
     """
@@ -28,7 +157,9 @@ def open_harte(harte_file_path: str) -> (list[str], str):
     :param harte_file_path: the path where the file is stored
     :return: a list of string, where each string corresponds to a chord.
     """
-    with open(harte_file_path, 'r', encoding='utf-8') as harte_file:
+    INSTRUMENTATION.count('harte_files')
+    with INSTRUMENTATION.stage('harte_files'), \
+            open(harte_file_path, 'r', encoding='utf-8') as harte_file:
         chords = [
             line.replace(
                 '\n', ''
@@ -51,15 +182,28 @@ def open_harte(harte_file_path: str) -> (list[str], str):
 def get_corresponding_biab(file_name: str, dataset_path: str) -> str:
     # pylint: disable=line-too-long
     """
+    Gets the Band-in-a-Box file corresponding to an annotation file. The
+    dataset is scanned once and its index is reused by the following calls;
+    it is scanned again when a file cannot be found or when the indexed file
+    no longer exists (e.g. it was deleted or renamed).
 
-    :param file_name:
-    :param dataset_path:
-    :return:
+    Unlike previous versions, which listed the top directory only and matched
+    any file named after the annotation, the lookup goes through a
+    DatasetIndex: only .MGU and .MG1 files are matched, nested directories are
+    searched too, and an annotation named after the stem of a file (e.g.
+    "song.txt" for "song.MGU") also matches it.
+    :param file_name: the name or the path of the annotation file
+    :param dataset_path: the directory containing the Band-in-a-Box files
+    :return: the path of the Band-in-a-Box file.
     """
-    biab_file_name = \
-        [file for file in os.listdir(dataset_path) if
-         file == os.path.splitext(os.path.basename(file_name))[0]][0]
-    return f'{dataset_path}/{biab_file_name}'
+    index = _DATASET_INDICES.get(dataset_path)
+    if index is None:
+        index = _DATASET_INDICES[dataset_path] = DatasetIndex(dataset_path)
+    else:
+        path = index.find(file_name)
+        if path is None or not os.path.exists(path):
+            index.rescan()
+    return index.resolve(file_name)
 
 
 def parse_mgu(biab_path) -> list[int]:
@@ -72,5 +216,24 @@ def parse_mgu(biab_path) -> list[int]:
     :param biab_path: tha path of the Band-in-a-box file
     :return: ???
     """
-    biab = biab_chords(biab_path)
+    INSTRUMENTATION.count('biab_files')
+    with INSTRUMENTATION.stage('biab'):
+        biab = biab_chords(biab_path)
     return [int(stamp[1]) for stamp in biab]
+
+
+def chunked(items: Iterable, chunk_size: int) -> Iterator[list]:
+    """
+    Groups the items of an iterable in lists, consuming it lazily.
+    :param items: the items to be grouped
+    :param chunk_size: the maximum number of items of each chunk
+    :return: an iterator over the chunks, the last one possibly shorter.
+    """
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
@@ -0,0 +1,152 @@
+"""
+This file contains the computation of the TPS distances between all the pairs
+of chords (in the context of their keys) of a vocabulary, for the Tonal Pitch
+Step Distance (TPSD) algorithm as presented in:
+
+De Haas, W.B., Veltkamp, R.C., Wiering, F.: Tonal pitch step distance: a
+similarity measure for chord progressions.
+In: ISMIR. pp. 51–56 (2008)
+
+Author: Andrea Poltronieri (University of Bologna) and Jacopo de Berardinis
+(King's College of London)
+Copyright: 2022 Andrea Poltronieri and Jacopo de Berardinis
+License: MIT license
+"""
+from typing import Iterable, Iterator, Optional
+
+import numpy as np
+
+from tpsd.canonical import parse_chord, parse_key
+from tpsd.instrumentation import INSTRUMENTATION
+from tpsd.tps import POPCOUNT, SCALE_MASKS, level_masks
+from tpsd.tps_comparison import circle_fifth_distance
+
+POPCOUNT_TABLE = np.asarray(POPCOUNT, dtype=np.uint8)
+# circle of fifths rule for each difference between two roots, from -11 to 11
+CIRCLE_FIFTH_TABLE = np.asarray([circle_fifth_distance(0, difference)
+                                 for difference in range(-11, 12)],
+                                dtype=np.uint8)
+
+
+class ChordVocabulary:
+    """
+    Vocabulary of chords, each one in the context of a key, encoded as arrays
+    of TPS level masks so that the TPS distances between all the pairs are
+    computed at once.
+    """
+
+    def __init__(self, items: Iterable[tuple[str, str]]) -> None:
+        """
+        Encodes the TPS levels of the chords of the vocabulary.
+        :param items: the (chord, key) pairs of the vocabulary, the chords
+        being expressed using the Harte notation
+        :type items: Iterable[tuple[str, str]]
+        :return: None
+        """
+        self.items = list(items)
+        masks, roots = [], []
+        # each label is parsed once
+        chords, keys = {}, {}
+        for chord, key in self.items:
+            if key not in keys:
+                keys[key] = parse_key(key)
+            if chord not in chords:
+                chords[chord] = parse_chord(chord)
+            tonic, mode = keys[key]
+            root, tones = chords[chord]
+            masks.append(level_masks(SCALE_MASKS[(tonic, mode[:3].lower())],
+                                     tones, root))
+            roots.append(root)
+        # one column per level: diatonic, triadic, fifth and root
+        self.masks = np.asarray(masks, dtype=np.uint16).reshape(-1, 4)
+        self.roots = np.asarray(roots, dtype=np.int8)
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def chord_distance_rule(self, start: int = 0,
+                            stop: Optional[int] = None) -> np.ndarray:
+        """
+        Computes the chord distance rule between some rows of the vocabulary
+        and all its items, as done by TpsComparison.chord_distance_rule().
+        :param start: the first row
+        :type start: int
+        :param stop: the last row (excluded), defaulting to the end
+        :type stop: Optional[int]
+        :return: a matrix containing the number of grades that do not
+        correspond between the levels of each pair.
+        """
+        rows = self.masks[start:stop]
+        distance = np.zeros((len(rows), len(self)), dtype=np.uint8)
+        for level in range(4):
+            distance += POPCOUNT_TABLE[
+                rows[:, level, np.newaxis] ^ self.masks[np.newaxis, :, level]]
+        return distance
+
+    def circle_fifth_rule(self, start: int = 0,
+                          stop: Optional[int] = None) -> np.ndarray:
+        """
+        Computes the circle of fifths rule between some rows of the vocabulary
+        and all its items, as done by TpsComparison.circle_fifth_rule().
+        :param start: the first row
+        :type start: int
+        :param stop: the last row (excluded), defaulting to the end
+        :type stop: Optional[int]
+        :return: a matrix containing the circle of fifths rule of each pair.
+        """
+        rows = self.roots[start:stop]
+        return CIRCLE_FIFTH_TABLE[
+            self.roots[np.newaxis, :] - rows[:, np.newaxis] + 11]
+
+    def distances(self, start: int = 0,
+                  stop: Optional[int] = None) -> np.ndarray:
+        """
+        Computes the TPS distance between some rows of the vocabulary and all
+        its items.
+        :param start: the first row
+        :type start: int
+        :param stop: the last row (excluded), defaulting to the end
+        :type stop: Optional[int]
+        :return: a matrix whose element (i, j) is the distance computed by
+        TpsComparison with the item start + i as first chord and the item j as
+        second chord.
+        """
+        INSTRUMENTATION.count('tps_evaluations',
+                              len(self.roots[start:stop]) * len(self))
+        return self.chord_distance_rule(start, stop) / 2 + \
+            self.circle_fifth_rule(start, stop)
+
+    def iter_blocks(self, block_size: int = 1024) -> Iterator[
+            tuple[int, int, np.ndarray]]:
+        """
+        Computes the distance matrix in blocks of rows, so that the memory used
+        is bounded by the size of a block.
+        :param block_size: the number of rows of each block
+        :type block_size: int
+        :return: an iterator over the first and last (excluded) row of each
+        block, and the distances of the block.
+        """
+        if block_size < 1:
+            raise ValueError('The size of the blocks must be positive.')
+        for start in range(0, len(self), block_size):
+            stop = min(start + block_size, len(self))
+            yield start, stop, self.distances(start, stop)
+
+    def distance_matrix(self, block_size: int = 1024,
+                        out: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Computes the TPS distance between all the pairs of the vocabulary.
+        :param block_size: the number of rows computed at once
+        :type block_size: int
+        :param out: if given, the (possibly memory-mapped) square array in
+        which the distances are written
+        :type out: Optional[np.ndarray]
+        :return: the matrix of the distances.
+        """
+        if out is None:
+            out = np.empty((len(self), len(self)))
+        elif out.shape != (len(self), len(self)):
+            raise ValueError('The output array does not match the vocabulary.')
+        for start, stop, block in self.iter_blocks(block_size):
+            out[start:stop] = block
+        return out